@@ -0,0 +1,31 @@
+'''Measures occupancy grid update rate using synthetic scans'''
+import time
+import numpy as np
+from hokuyolx import Scan, ScanConfig
+from hokuyolx.occupancy import OccupancyGrid
+
+N = 400
+
+def make_scans(config, n):
+    angles = config.angles
+    rng = np.random.RandomState(0)
+    base = 3000 + 2000*np.abs(np.sin(3*angles))
+    noise = rng.randint(-20, 20, (n, len(angles)))
+    return [Scan((base + noise[i]).astype(np.uint32), 25*i, config, seq=i)
+            for i in range(n)]
+
+def run():
+    config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080)
+    scans = make_scans(config, N)
+    for dtype in (np.float32, np.int16):
+        grid = OccupancyGrid((800, 800), resolution=50, dtype=dtype,
+                             auto_scroll=True)
+        t = time.time()
+        for i, scan in enumerate(scans):
+            grid.update(scan, pose=(10.*i, 5.*i, 0.001*i))
+        dt = time.time() - t
+        print('%s: %.2f ms per scan, %.1f scans/s' %
+              (np.dtype(dtype).name, 1000*dt/N, N/dt))
+
+if __name__ == '__main__':
+    run()
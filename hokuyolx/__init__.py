@@ -14,9 +14,28 @@ Usage example:
 >>> laser = HokuyoLX()
 >>> timestamp, scan = laser.get_dist() # Single measurment mode
 >>> # Continous measurment mode
->>> for timestamp, scan in laser.iter_dist(10):
-...     print(timestamp)
+>>> for scan in laser.iter_dist(10):
+...     print(scan.timestamp, scan.points)
 
 For further information please refer to HokuyoLX class documentation
 '''
 from .hokuyo import HokuyoLX
+from .echoes import MultiEcho
+from .scan import Scan, ScanConfig
+from .archive import ScanArchiveWriter, ScanArchiveReader
+from .batch import ScanBatch, process_recordings
+from .occupancy import OccupancyGrid
+from .segmentation import Segments, segment
+from .features import LineFeatures, extract_lines
+from .icp import ICPMatcher, ICPResult
+from .background import BackgroundModel, Foreground
+from .fusion import ScanFusion, FusedScan, iter_fused
+from .broker import ScanBroker, ScanClient
+from .stats import BeamStatistics
+from .downsample import Downsampler
+from .deskew import Trajectory, deskew
+from .fleet import Fleet, start_fleet
+from .zones import Zone, ZoneEngine
+from .pyramid import RangePyramid, SectorMinimum
+from .reflectors import Reflectors, detect_reflectors
+from .subscription import Subscription
@@ -0,0 +1,394 @@
+'''Columnar compressed scan archive with time index for random access.
+
+Archive file consists of the header with the scan config, sequence of
+independently compressed chunks and the chunk index placed at the end of
+the file. Each chunk stores timestamps, sequence numbers, distances and
+intensities of up to `chunk_size` scans column by column. Columns are
+delta-encoded against the previous scan (the first scan of the chunk is
+stored as is) and bytes of the distance and intensity deltas are shuffled
+before compression, which substantially improves compression ratio.
+
+Usage example:
+
+>>> with ScanArchiveWriter('scans.hlx', laser.get_config(cmd='ME')) as arc:
+...     for scan in laser.iter_intens(1000):
+...         arc.write(scan)
+>>> reader = ScanArchiveReader('scans.hlx')
+>>> data, timestamps, seqs = reader.query(t0, t1)
+'''
+import io
+import json
+import mmap
+import struct
+import zlib
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, ScanConfig
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+MAGIC = b'HLXARC1\n' #: Magic bytes at the start of the archive
+FOOTER_MAGIC = b'HLXIDX1\n' #: Magic bytes at the end of the archive
+_FOOTER = struct.Struct('<QQ8s')
+_HEADER_LEN = struct.Struct('<I')
+
+#: Dtype of the chunk index entries
+index_dtype = np.dtype([
+    ('offset', '<u8'), ('size', '<u8'), ('count', '<u4'),
+    ('t_first', '<i8'), ('t_last', '<i8'),
+    ('seq_first', '<i8'), ('seq_last', '<i8'),
+])
+
+
+def _compressors(name, level):
+    '''Returns compression and decompression functions for the given
+    compression method name'''
+    if name == 'zlib':
+        level = 6 if level is None else level
+        return (lambda data: zlib.compress(data, level)), zlib.decompress
+    if name == 'lzma':
+        if lzma is None:
+            raise HokuyoException('lzma module is not available')
+        preset = 6 if level is None else level
+        return (lambda data: lzma.compress(data, preset=preset)), \
+            lzma.decompress
+    if name == 'none':
+        return bytes, bytes
+    raise HokuyoException('Unknown compression method: %s' % name)
+
+
+def _shuffle(arr):
+    '''Delta-encodes array along the first axis and shuffles bytes of
+    the result'''
+    arr = arr.astype(np.int32)
+    delta = arr.copy()
+    delta[1:] -= arr[:-1]
+    return delta.view(np.uint8).reshape((-1, 4)).T.tobytes()
+
+
+def _unshuffle(raw, shape):
+    '''Inverse of the `_shuffle`'''
+    n = int(np.prod(shape))
+    delta = np.frombuffer(raw, np.uint8).reshape((4, n)).T.copy()
+    delta = delta.view(np.int32).reshape(shape)
+    return np.cumsum(delta, axis=0, dtype=np.int32).view(np.uint32)
+
+
+def decode_chunk(raw, count, beams, with_intensity):
+    '''Decodes decompressed chunk
+
+    Parameters
+    ----------
+    raw : bytes
+        Decompressed chunk data
+    count : int
+        Number of scans in the chunk
+    beams : int
+        Number of beams in each scan
+    with_intensity : bool
+        Does chunk contain intensities?
+
+    Returns
+    -------
+    data : ndarray
+        Array of shape `(count, beams)` with distances or of shape
+        `(count, beams, 2)` with distances and intensities
+    timestamps : ndarray
+        Array of timestamps
+    seqs : ndarray
+        Array of sequence numbers
+    '''
+    pos = 8*count
+    timestamps = np.cumsum(np.frombuffer(raw[:pos], '<i8'))
+    seqs = np.cumsum(np.frombuffer(raw[pos:2*pos], '<i8'))
+    pos *= 2
+    size = 4*count*beams
+    dist = _unshuffle(raw[pos:pos + size], (count, beams))
+    if not with_intensity:
+        return dist, timestamps, seqs
+    intens = _unshuffle(raw[pos + size:pos + 2*size], (count, beams))
+    return np.stack((dist, intens), axis=2), timestamps, seqs
+
+
+class ScanArchiveWriter(object):
+    '''Writes scans measured with the same config into the archive file'''
+
+    def __init__(self, path, config, chunk_size=1024, compression='zlib',
+                 level=None):
+        '''Creates new archive file
+
+        Parameters
+        ----------
+        path : str
+            Path to the archive file
+        config : `ScanConfig`
+            Config of the measurment, e.g. `HokuyoLX.get_config(...)`
+        chunk_size : int, optional
+            Number of scans in one chunk (the default is 1024)
+        compression : str, optional
+            Compression method: 'zlib', 'lzma' or 'none'
+            (the default is 'zlib')
+        level : int, optional
+            Compression level (the default is None, which implies
+            the compression method default)
+        '''
+        super(ScanArchiveWriter, self).__init__()
+        self.config = config
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self._compress = _compressors(compression, level)[0]
+        self.beams = config.beams
+        self.with_intensity = config.with_intensity
+        shape = (chunk_size, self.beams)
+        if self.with_intensity:
+            shape += (2, )
+        self._data = np.empty(shape, np.uint32)
+        self._timestamps = np.empty(chunk_size, np.int64)
+        self._seqs = np.empty(chunk_size, np.int64)
+        self._n = 0
+        self._next_seq = 0
+        self._index = []
+        self._file = io.open(path, 'wb')
+        header = json.dumps({
+            'config': list(config.key),
+            'compression': compression,
+            'chunk_size': chunk_size,
+        }).encode('utf-8')
+        self._file.write(MAGIC + _HEADER_LEN.pack(len(header)) + header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, scan, timestamp=None, seq=None):
+        '''Appends scan to the archive
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances (and intensities)
+        timestamp : int, optional
+            Timestamp of the measurment, required if `scan` is an array
+        seq : int, optional
+            Sequence number of the scan (the default is None, which implies
+            `Scan.seq` or the previous sequence number plus one)
+        '''
+        if isinstance(scan, Scan):
+            timestamp = scan.timestamp if timestamp is None else timestamp
+            seq = scan.seq if seq is None else seq
+            scan = scan.data
+        if timestamp is None:
+            raise HokuyoException('Timestamp is required')
+        seq = self._next_seq if seq is None else seq
+        self._data[self._n] = scan
+        self._timestamps[self._n] = timestamp
+        self._seqs[self._n] = seq
+        self._next_seq = seq + 1
+        self._n += 1
+        if self._n == self.chunk_size:
+            self.flush()
+
+    def write_batch(self, scans, timestamps, seqs=None):
+        '''Appends batch of scans to the archive, e.g. yielded by
+        `HokuyoLX.iter_dist_batches`
+
+        Parameters
+        ----------
+        scans : ndarray
+            Array of shape `(B, beams)` or `(B, beams, 2)`
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps
+        seqs : ndarray, optional
+            Array of shape `(B, )` with sequence numbers (the default is
+            None, which implies consecutive numbers)
+        '''
+        if seqs is None:
+            seqs = self._next_seq + np.arange(len(scans))
+        pos = 0
+        while pos < len(scans):
+            n = min(self.chunk_size - self._n, len(scans) - pos)
+            sl = slice(self._n, self._n + n)
+            self._data[sl] = scans[pos:pos + n]
+            self._timestamps[sl] = timestamps[pos:pos + n]
+            self._seqs[sl] = seqs[pos:pos + n]
+            self._n += n
+            pos += n
+            self._next_seq = int(seqs[pos - 1]) + 1
+            if self._n == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        '''Compresses and writes buffered scans as a new chunk'''
+        n = self._n
+        if n == 0:
+            return
+        timestamps = self._timestamps[:n]
+        seqs = self._seqs[:n]
+        data = self._data[:n]
+        parts = [np.diff(timestamps, prepend=0).astype('<i8').tobytes(),
+                 np.diff(seqs, prepend=0).astype('<i8').tobytes()]
+        if self.with_intensity:
+            parts += [_shuffle(data[:, :, 0]), _shuffle(data[:, :, 1])]
+        else:
+            parts.append(_shuffle(data))
+        blob = self._compress(b''.join(parts))
+        offset = self._file.tell()
+        self._file.write(blob)
+        self._index.append((offset, len(blob), n,
+                            timestamps.min(), timestamps.max(),
+                            seqs[0], seqs[-1]))
+        self._n = 0
+
+    def close(self):
+        '''Flushes buffered scans, writes chunk index and closes the file'''
+        if self._file is None:
+            return
+        self.flush()
+        offset = self._file.tell()
+        index = np.array(self._index, index_dtype)
+        self._file.write(index.tobytes())
+        self._file.write(_FOOTER.pack(offset, len(index), FOOTER_MAGIC))
+        self._file.close()
+        self._file = None
+
+
+class ScanArchiveReader(object):
+    '''Reads scans from the archive file. Only chunks overlapping with
+    the requested time interval are decompressed.'''
+
+    def __init__(self, path):
+        '''Opens the archive file
+
+        Parameters
+        ----------
+        path : str
+            Path to the archive file
+        '''
+        super(ScanArchiveReader, self).__init__()
+        self.path = path
+        self._file = io.open(path, 'rb')
+        self._buf = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+        if self._buf[:len(MAGIC)] != MAGIC:
+            raise HokuyoException('Not a scan archive: %s' % path)
+        pos = len(MAGIC)
+        size, = _HEADER_LEN.unpack(self._buf[pos:pos + _HEADER_LEN.size])
+        pos += _HEADER_LEN.size
+        self.header = json.loads(self._buf[pos:pos + size].decode('utf-8'))
+        offset, count, magic = _FOOTER.unpack(self._buf[-_FOOTER.size:])
+        if magic != FOOTER_MAGIC:
+            raise HokuyoException('Archive was not closed properly: %s' % path)
+        end = offset + count*index_dtype.itemsize
+        self.index = np.frombuffer(self._buf[offset:end], index_dtype)
+        self.config = ScanConfig.get(*self.header['config'])
+        self.beams = self.config.beams
+        self.with_intensity = self.config.with_intensity
+        self._decompress = _compressors(self.header['compression'], None)[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return int(self.index['count'].sum())
+
+    def close(self):
+        '''Closes the archive file'''
+        if self._file is None:
+            return
+        self._buf.close()
+        self._file.close()
+        self._file = None
+
+    def chunks(self, t0=None, t1=None):
+        '''Returns indices of chunks overlapping with the given time interval
+
+        Parameters
+        ----------
+        t0 : int, optional
+            Start of the interval (the default is None, which means
+            unbounded)
+        t1 : int, optional
+            End of the interval (the default is None, which means unbounded)
+        '''
+        mask = np.ones(len(self.index), bool)
+        if t0 is not None:
+            mask &= self.index['t_last'] >= t0
+        if t1 is not None:
+            mask &= self.index['t_first'] <= t1
+        return np.flatnonzero(mask)
+
+    def read_chunk(self, i):
+        '''Decompresses and decodes chunk with the given index
+
+        Returns
+        -------
+        data : ndarray
+            Array with distances (and intensities)
+        timestamps : ndarray
+            Array of timestamps
+        seqs : ndarray
+            Array of sequence numbers
+        '''
+        entry = self.index[i]
+        offset, size = int(entry['offset']), int(entry['size'])
+        raw = self._decompress(self._buf[offset:offset + size])
+        return decode_chunk(raw, int(entry['count']), self.beams,
+                            self.with_intensity)
+
+    def iter_chunks(self, t0=None, t1=None):
+        '''Yields decoded chunks restricted to the given time interval, see
+        `read_chunk` for the format'''
+        for i in self.chunks(t0, t1):
+            data, timestamps, seqs = self.read_chunk(i)
+            mask = np.ones(len(timestamps), bool)
+            if t0 is not None:
+                mask &= timestamps >= t0
+            if t1 is not None:
+                mask &= timestamps <= t1
+            if not mask.all():
+                data, timestamps, seqs = \
+                    data[mask], timestamps[mask], seqs[mask]
+            yield data, timestamps, seqs
+
+    def query(self, t0=None, t1=None):
+        '''Returns all scans with timestamps inside the given time interval
+
+        Parameters
+        ----------
+        t0 : int, optional
+            Start of the interval (the default is None, which means
+            unbounded)
+        t1 : int, optional
+            End of the interval (the default is None, which means unbounded)
+
+        Returns
+        -------
+        data : ndarray
+            Array of shape `(N, beams)` with distances or of shape
+            `(N, beams, 2)` with distances and intensities
+        timestamps : ndarray
+            Array of shape `(N, )` with timestamps
+        seqs : ndarray
+            Array of shape `(N, )` with sequence numbers
+        '''
+        chunks = list(self.iter_chunks(t0, t1))
+        if not chunks:
+            shape = (0, self.beams) + ((2, ) if self.with_intensity else ())
+            return (np.empty(shape, np.uint32), np.empty(0, np.int64),
+                    np.empty(0, np.int64))
+        return tuple(np.concatenate(col) for col in zip(*chunks))
+
+    def iter_scans(self, t0=None, t1=None):
+        '''Yields `Scan` records with timestamps inside the given
+        time interval'''
+        for data, timestamps, seqs in self.iter_chunks(t0, t1):
+            for i in range(len(timestamps)):
+                yield Scan(data[i], int(timestamps[i]), self.config,
+                           seq=int(seqs[i]))
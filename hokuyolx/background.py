@@ -0,0 +1,363 @@
+'''Static background model for fixed-mount sensors.
+
+Per-beam range distributions of the static scene are learned over
+a training window of scans: for each beam lower and upper percentiles of
+valid ranges form the background band. Percentiles are estimated while
+scans arrive with the P-square algorithm of Jain and Chlamtac, so memory
+does not depend on the length of the window. After training each new scan is
+reduced to the sparse foreground: indices and values of beams whose
+measurments lie outside of the band (widened by the tolerance) or which
+have returns where the background has none. In quiet scenes foreground
+contains only few beams, so downstream processing and transmission become
+much cheaper.
+
+Usage example:
+
+>>> model = BackgroundModel(train_scans=100)
+>>> for fg in model.iter_foreground(laser.iter_dist()):
+...     print(fg.timestamp, fg.indices, fg.dist)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+class Foreground(object):
+    '''Sparse foreground of the scan'''
+
+    __slots__ = ('indices', 'values', 'timestamp', 'seq', 'beams', 'config')
+
+    def __init__(self, indices, values, timestamp=None, seq=0, beams=None,
+                 config=None):
+        '''Creates new sparse foreground record
+
+        Parameters
+        ----------
+        indices : ndarray
+            Indices of foreground beams
+        values : ndarray
+            Array of shape `(K, )` with distances or of shape `(K, 2)` with
+            distances and intensities of foreground beams
+        timestamp : int, optional
+            Timestamp of the scan
+        seq : int, optional
+            Sequence number of the scan
+        beams : int, optional
+            Number of beams in the full scan
+        config : `ScanConfig`, optional
+            Config of the measurment
+        '''
+        self.indices = indices
+        self.values = values
+        self.timestamp = timestamp
+        self.seq = seq
+        self.beams = beams
+        self.config = config
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __repr__(self):
+        return '%s(timestamp=%s, beams=%d/%s)' % (
+            type(self).__name__, self.timestamp, len(self), self.beams)
+
+    @property
+    def dist(self):
+        '''Distances of foreground beams'''
+        return self.values if self.values.ndim == 1 else self.values[:, 0]
+
+    @property
+    def intens(self):
+        '''Intensities of foreground beams or None'''
+        return None if self.values.ndim == 1 else self.values[:, 1]
+
+    @property
+    def angles(self):
+        '''Angles of foreground beams, requires `config`'''
+        if self.config is None:
+            raise HokuyoException('Config is not available')
+        return self.config.angles[self.indices]
+
+    @property
+    def points(self):
+        '''Array of shape `(K, 2)` with Cartesian coordinates of foreground
+        beams, requires `config`'''
+        if self.config is None:
+            raise HokuyoException('Config is not available')
+        dist = self.dist
+        return np.column_stack((dist*self.config.cos[self.indices],
+                                dist*self.config.sin[self.indices]))
+
+    def dense(self, fill=0):
+        '''Expands foreground into full scan array, background beams are
+        set to `fill`'''
+        if self.beams is None:
+            raise HokuyoException('Number of beams is not available')
+        shape = (self.beams, ) + self.values.shape[1:]
+        data = np.full(shape, fill, self.values.dtype)
+        data[self.indices] = self.values
+        return data
+
+
+class _P2Percentile(object):
+    '''Streaming estimator of the given percentile of each beam using
+    the P-square algorithm. Each beam keeps five markers, whose heights
+    approximate minimum, `p/2`, `p`, `(1 + p)/2` percentiles and maximum
+    of the values seen so far.'''
+
+    def __init__(self, beams, percentile):
+        p = percentile/100.
+        self.count = np.zeros(beams, np.int64) #: Number of values of beams
+        self._q = np.zeros((5, beams))
+        self._n = np.repeat(np.arange(5.)[:, None], beams, axis=1)
+        self._nd = np.repeat(np.array([0., 2*p, 4*p, 2 + 2*p, 4])[:, None],
+                             beams, axis=1)
+        self._dn = np.array([0., p/2, p, (1 + p)/2, 1.])[:, None]
+        self._percentile = percentile
+
+    def update(self, values, valid):
+        '''Adds values of valid beams'''
+        init = valid & (self.count < 5)
+        if init.any():
+            idx = np.flatnonzero(init)
+            self._q[self.count[idx], idx] = values[idx]
+            ready = idx[self.count[idx] == 4]
+            self._q[:, ready] = np.sort(self._q[:, ready], axis=0)
+        idx = np.flatnonzero(valid & ~init)
+        self.count[valid] += 1
+        if len(idx):
+            self._step(idx, values[idx])
+
+    def _step(self, idx, x):
+        '''Updates markers of the given beams with new values'''
+        q, n, nd = self._q[:, idx], self._n[:, idx], self._nd[:, idx]
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        cell = (x >= q[1:4]).sum(axis=0)
+        n += np.arange(5)[:, None] > cell
+        nd += self._dn
+        for i in (1, 2, 3):
+            d = nd[i] - n[i]
+            up = (d >= 1) & (n[i + 1] - n[i] > 1)
+            down = (d <= -1) & (n[i - 1] - n[i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            sign = np.where(up, 1., -1.)
+            # piecewise-parabolic prediction of the marker height
+            parabolic = q[i] + sign/(n[i + 1] - n[i - 1])*(
+                (n[i] - n[i - 1] + sign)*(q[i + 1] - q[i])/(n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - sign)*(q[i] - q[i - 1])/(n[i] - n[i - 1]))
+            q_adj = np.where(up, q[i + 1], q[i - 1])
+            n_adj = np.where(up, n[i + 1], n[i - 1])
+            linear = q[i] + sign*(q_adj - q[i])/(n_adj - n[i])
+            ok = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(ok, parabolic, linear), q[i])
+            n[i] += np.where(move, sign, 0.)
+        self._q[:, idx], self._n[:, idx], self._nd[:, idx] = q, n, nd
+
+    def estimate(self):
+        '''Returns estimated percentiles, NaN for beams without values'''
+        result = self._q[2].copy()
+        result[self.count == 0] = np.nan
+        # beams with few values are estimated directly
+        for beam in np.flatnonzero((self.count > 0) & (self.count < 5)):
+            result[beam] = np.percentile(self._q[:self.count[beam], beam],
+                                         self._percentile)
+        return result
+
+
+class BackgroundModel(object):
+    '''Per-beam background range model learned from the static scene'''
+
+    def __init__(self, train_scans=100, percentiles=(2., 98.), tolerance=50.,
+                 rel_tolerance=0.01, min_valid=0.5, dmin=None, dmax=None):
+        '''Creates new untrained model
+
+        Parameters
+        ----------
+        train_scans : int, optional
+            Number of scans in the training window (the default is 100)
+        percentiles : tuple, optional
+            Lower and upper percentiles of valid training ranges which form
+            the background band (the default is (2, 98))
+        tolerance : float, optional
+            Constant widening of the band in millimeters (the default is 50)
+        rel_tolerance : float, optional
+            Widening of the band relative to the range (the default is 0.01)
+        min_valid : float, optional
+            Minimal fraction of valid training measurments of the beam,
+            beams with less returns are treated as having no background
+            and any valid return on them is foreground (the default is 0.5)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `scan.config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `scan.config.dmax`)
+        '''
+        super(BackgroundModel, self).__init__()
+        self.train_scans = train_scans
+        self.percentiles = percentiles
+        self.tolerance = tolerance
+        self.rel_tolerance = rel_tolerance
+        self.min_valid = min_valid
+        self.dmin = dmin
+        self.dmax = dmax
+        self.lower = None #: Lower bounds of the background band
+        self.upper = None #: Upper bounds of the background band
+        self._estimators = None
+        self._count = 0
+
+    @property
+    def trained(self):
+        '''Is model trained?'''
+        return self.lower is not None
+
+    @property
+    def progress(self):
+        '''Fraction of the training window filled with scans'''
+        return 1. if self.trained else self._count/float(self.train_scans)
+
+    def reset(self):
+        '''Discards learned background and starts training again'''
+        self.lower = self.upper = None
+        self._estimators = None
+        self._count = 0
+
+    def _unpack(self, scan):
+        '''Returns data, distances, validity mask, timestamp, seq and config
+        of the scan'''
+        if isinstance(scan, Scan):
+            config = scan.config
+            data, timestamp, seq = scan.data, scan.timestamp, scan.seq
+            dmin, dmax = config.limits(self.dmin, self.dmax)
+        else:
+            config, timestamp, seq = None, None, 0
+            data = np.asarray(scan)
+            dmin, dmax = self.dmin, self.dmax
+        dist = data if data.ndim == 1 else data[:, 0]
+        return data, dist, filter_mask(dist, None, dmin, dmax), timestamp, \
+            seq, config
+
+    def train(self, scan):
+        '''Adds scan to the training window, when the window is full
+        background band is computed
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+
+        Returns
+        -------
+        bool
+            Is model trained?
+        '''
+        if self.trained:
+            return True
+        self._accumulate(scan)
+        if self._count >= self.train_scans:
+            self._fit()
+        return self.trained
+
+    def fit(self, scans):
+        '''Trains model on all given scans at once regardless of
+        `train_scans`
+
+        Parameters
+        ----------
+        scans : iterable
+            Scan records or arrays with measured distances, array of shape
+            `(B, beams)` is accepted as well
+        '''
+        self.reset()
+        for scan in scans:
+            self._accumulate(scan)
+        if not self._count:
+            raise HokuyoException('No scans to fit background model')
+        self._fit()
+
+    def _accumulate(self, scan):
+        '''Updates percentile estimators with the scan'''
+        _, dist, valid, _, _, _ = self._unpack(scan)
+        if self._estimators is None:
+            self._estimators = [_P2Percentile(len(dist), percentile)
+                                for percentile in self.percentiles]
+        elif len(dist) != len(self._estimators[0].count):
+            raise HokuyoException('Number of beams changed during training')
+        dist = dist.astype(np.float64)
+        for estimator in self._estimators:
+            estimator.update(dist, valid)
+        self._count += 1
+
+    def _fit(self):
+        '''Computes background band from the percentile estimates'''
+        lower_est, upper_est = self._estimators
+        known = lower_est.count >= self.min_valid*self._count
+        lower = np.full(len(known), np.inf)
+        upper = np.full(len(known), np.inf)
+        if known.any():
+            low = lower_est.estimate()[known]
+            high = upper_est.estimate()[known]
+            lower[known] = low - self.tolerance - self.rel_tolerance*low
+            upper[known] = high + self.tolerance + self.rel_tolerance*high
+        self.lower, self.upper = lower, upper
+        self._estimators = None
+
+    def foreground_mask(self, scan):
+        '''Returns boolean mask of foreground beams of the scan'''
+        if not self.trained:
+            raise HokuyoException('Background model is not trained')
+        _, dist, valid, _, _, _ = self._unpack(scan)
+        return valid & ((dist < self.lower) | (dist > self.upper))
+
+    def apply(self, scan):
+        '''Extracts sparse foreground of the scan
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+
+        Returns
+        -------
+        `Foreground`
+            Sparse foreground
+        '''
+        if not self.trained:
+            raise HokuyoException('Background model is not trained')
+        data, dist, valid, timestamp, seq, config = self._unpack(scan)
+        if len(dist) != len(self.lower):
+            raise HokuyoException('Scan does not match background model')
+        mask = valid & ((dist < self.lower) | (dist > self.upper))
+        indices = np.flatnonzero(mask).astype(np.uint16)
+        return Foreground(indices, data[indices], timestamp, seq, len(dist),
+                          config)
+
+    def update(self, scan):
+        '''Trains model with the scan until it is trained, afterwards
+        extracts its foreground. Returns None during training.'''
+        if not self.trained:
+            self.train(scan)
+            return None
+        return self.apply(scan)
+
+    def iter_foreground(self, scans):
+        '''Trains model on the first scans of the iterable and yields sparse
+        foregrounds of the following ones
+
+        Parameters
+        ----------
+        scans : iterable
+            Scan records, e.g. yielded by `HokuyoLX.iter_dist`
+
+        Yields
+        ------
+        `Foreground`
+            Sparse foreground of each scan after the training
+        '''
+        for scan in scans:
+            foreground = self.update(scan)
+            if foreground is not None:
+                yield foreground
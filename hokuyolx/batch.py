@@ -0,0 +1,171 @@
+'''Parallel offline processing of scans stored in archive files.
+
+Work is sharded by contiguous chunk (and so time) ranges of recordings
+written by `ScanArchiveWriter`. Worker processes recieve only file paths and
+chunk indices, memory-map the files themselves and decode the chunks, so no
+scan arrays are pickled on the way to the workers.
+
+Usage example:
+
+>>> def mean_range(batch):
+...     return batch.dist.mean(axis=0)
+>>> results = process_recordings(['day1.hlx', 'day2.hlx'], mean_range)
+'''
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+import numpy as np
+from .archive import ScanArchiveReader
+from .scan import Scan, filter_mask, filter_scan
+
+
+class ScanBatch(object):
+    '''Batch of consecutive scans measured with the same config'''
+
+    __slots__ = ('data', 'timestamps', 'seqs', 'config', 'path')
+
+    def __init__(self, data, timestamps, seqs, config, path=None):
+        '''Creates new batch
+
+        Parameters
+        ----------
+        data : ndarray
+            Array of shape `(B, beams)` with distances or of shape
+            `(B, beams, 2)` with distances and intensities
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps
+        seqs : ndarray
+            Array of shape `(B, )` with sequence numbers
+        config : `ScanConfig`
+            Config of the measurment
+        path : str, optional
+            Path to the recording
+        '''
+        self.data = data
+        self.timestamps = timestamps
+        self.seqs = seqs
+        self.config = config
+        self.path = path
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        '''Yields `Scan` records'''
+        for i in range(len(self)):
+            yield Scan(self.data[i], int(self.timestamps[i]), self.config,
+                       seq=int(self.seqs[i]))
+
+    @property
+    def dist(self):
+        '''Array of shape `(B, beams)` with distances'''
+        return self.data if self.data.ndim == 2 else self.data[:, :, 0]
+
+    @property
+    def intens(self):
+        '''Array of shape `(B, beams)` with intensities or None'''
+        return None if self.data.ndim == 2 else self.data[:, :, 1]
+
+    @property
+    def angles(self):
+        '''Array of beam angles in radians'''
+        return self.config.angles
+
+    def valid_mask(self, dmin=None, dmax=None, imin=None, imax=None):
+        '''Returns boolean mask of shape `(B, beams)` of measurments which
+        pass filtering with the same semantics as `Scan.filtered`'''
+        dmin, dmax = self.config.limits(dmin, dmax)
+        return filter_mask(self.dist, self.intens, dmin, dmax, imin, imax)
+
+    def filtered(self, dmin=None, dmax=None, imin=None, imax=None):
+        '''Returns list of filtered scans, each of them in the same form as
+        yielded by `HokuyoLX.iter_filtered_dist` and
+        `HokuyoLX.iter_filtered_intens`'''
+        dmin, dmax = self.config.limits(dmin, dmax)
+        return [filter_scan(self.angles, scan, dmin, dmax, imin, imax)
+                for scan in self.data]
+
+
+def _plan(paths, t0, t1, chunks_per_task, max_workers):
+    '''Splits chunks of the given recordings overlapping with the time
+    interval into tasks'''
+    shards = []
+    for path in paths:
+        with ScanArchiveReader(path) as reader:
+            shards.append((path, reader.chunks(t0, t1)))
+    if chunks_per_task is None:
+        total = sum(len(chunks) for _, chunks in shards)
+        chunks_per_task = max(1, total//(4*(max_workers or cpu_count())))
+    tasks = []
+    for path, chunks in shards:
+        for i in range(0, len(chunks), chunks_per_task):
+            tasks.append((path, chunks[i:i + chunks_per_task]))
+    return tasks
+
+
+def _run_task(args):
+    '''Applies function to chunks of one task, executed in workers'''
+    path, chunks, t0, t1, func = args
+    results = []
+    with ScanArchiveReader(path) as reader:
+        for i in chunks:
+            data, timestamps, seqs = reader.read_chunk(i)
+            mask = np.ones(len(timestamps), bool)
+            if t0 is not None:
+                mask &= timestamps >= t0
+            if t1 is not None:
+                mask &= timestamps <= t1
+            if not mask.all():
+                data, timestamps, seqs = \
+                    data[mask], timestamps[mask], seqs[mask]
+            if not len(timestamps):
+                continue
+            batch = ScanBatch(data, timestamps, seqs, reader.config, path)
+            results.append(func(batch))
+    return results
+
+
+def process_recordings(paths, func, t0=None, t1=None, max_workers=None,
+                       chunks_per_task=None, executor=None):
+    '''Applies `func` to every chunk of scans stored in the given recordings
+    in parallel and returns results in the recording and time order.
+
+    Parameters
+    ----------
+    paths : str or list of str
+        Paths to the archive files written by `ScanArchiveWriter`
+    func : callable
+        Function which accepts `ScanBatch`, must be picklable (e.g. defined
+        at the module level)
+    t0 : int, optional
+        Start of the processed time interval (the default is None, which
+        means unbounded)
+    t1 : int, optional
+        End of the processed time interval (the default is None, which
+        means unbounded)
+    max_workers : int, optional
+        Number of worker processes (the default is None, which implies
+        number of CPUs). If equal to 0 chunks are processed serially
+        in the current process.
+    chunks_per_task : int, optional
+        Number of chunks processed by one task (the default is None, which
+        splits work into approximately 4 tasks per worker)
+    executor : `concurrent.futures.Executor`, optional
+        Executor to use instead of creating new `ProcessPoolExecutor`
+
+    Returns
+    -------
+    list
+        Results of `func` for each chunk
+    '''
+    if isinstance(paths, str):
+        paths = [paths]
+    tasks = [(path, chunks, t0, t1, func) for path, chunks in
+             _plan(paths, t0, t1, chunks_per_task, max_workers)]
+    if max_workers == 0 and executor is None:
+        results = map(_run_task, tasks)
+    elif executor is not None:
+        results = executor.map(_run_task, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers) as pool:
+            results = list(pool.map(_run_task, tasks))
+    return [result for task_results in results for result in task_results]
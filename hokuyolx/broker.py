@@ -0,0 +1,561 @@
+'''Broker which rebroadcasts decoded scans of one sensor to many clients.
+
+Only one `HokuyoLX` instance owns the sensor connection, `ScanBroker`
+republishes its scans over TCP to connected subscribers and over UDP to
+the configured unicast or multicast destinations. Scans are sent in
+a compact binary framing: each message starts with the fixed header
+
+    magic (2s), type (B), flags (B), payload length (I),
+    broker sequence number (Q), scan sequence number (Q),
+    timestamp (q), host time (d)
+
+in little-endian byte order. Payload of the config message is JSON list
+with `ScanConfig.key`, payload of the scan message is array of distances
+(or interleaved distances and intensities) as 16-bit unsigned integers if
+all values fit, otherwise as 32-bit ones. Broker sequence numbers allow
+clients to detect dropped scans.
+
+Every TCP subscriber has its own bounded queue and sender thread, so slow
+subscribers can not stall the producer. When the queue is full the
+subscriber policy is applied: `'oldest'` drops the oldest queued scan,
+`'newest'` drops the new one and `'disconnect'` closes the connection.
+Config messages share the queue with scans, so scans are always sent after
+the config they were measured with, and they are never dropped.
+Clients choose policy and queue size in the hello line sent on connect.
+
+Usage example:
+
+>>> broker = ScanBroker()
+>>> broker.start()
+>>> broker.serve(laser.iter_dist())
+
+and on the other machine:
+
+>>> client = ScanClient(('192.168.1.5', 10950), policy='oldest')
+>>> for scan in client.iter_dist(10):
+...     print(scan.seq, scan.timestamp, scan.points)
+'''
+import json
+import errno
+import socket
+import struct
+import logging
+import threading
+from collections import deque
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, ScanConfig
+
+BROKER_PORT = 10950 #: Default port of the broker
+MAGIC = b'HX' #: Magic bytes at the start of each message
+MSG_CONFIG = 0 #: Type of the config message
+MSG_SCAN = 1 #: Type of the scan message
+FLAG_INTENS = 1 #: Scan data contains intensities
+FLAG_16BIT = 2 #: Scan data is stored as 16-bit integers
+POLICIES = ('oldest', 'newest', 'disconnect') #: Supported drop policies
+_HEADER = struct.Struct('<2sBBIQQqd')
+
+
+def encode_config(config, seq=0):
+    '''Encodes config message'''
+    payload = json.dumps(list(config.key)).encode('ascii')
+    return _HEADER.pack(MAGIC, MSG_CONFIG, 0, len(payload), seq, 0, 0, 0.) + \
+        payload
+
+
+def encode_scan(scan, seq):
+    '''Encodes scan message
+
+    Parameters
+    ----------
+    scan : `Scan`
+        Scan record
+    seq : int
+        Broker sequence number
+
+    Returns
+    -------
+    bytes
+        Encoded message
+    '''
+    data = scan.data
+    flags = FLAG_INTENS if data.ndim == 2 else 0
+    if data.size and data.max() < (1 << 16):
+        flags |= FLAG_16BIT
+        payload = data.astype('<u2').tobytes()
+    else:
+        payload = data.astype('<u4').tobytes()
+    host_time = scan.host_time if scan.host_time is not None else 0.
+    return _HEADER.pack(MAGIC, MSG_SCAN, flags, len(payload), seq, scan.seq,
+                        scan.timestamp, host_time) + payload
+
+
+def decode_header(raw):
+    '''Decodes message header, returns tuple `(type, flags, length, seq,
+    scan_seq, timestamp, host_time)`'''
+    magic, kind, flags, length, seq, scan_seq, timestamp, host_time = \
+        _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise HokuyoException('Wrong message magic bytes')
+    return kind, flags, length, seq, scan_seq, timestamp, host_time
+
+
+def decode_data(payload, flags):
+    '''Decodes scan data from the message payload'''
+    dtype = '<u2' if flags & FLAG_16BIT else '<u4'
+    data = np.frombuffer(payload, dtype).astype(np.uint32)
+    if flags & FLAG_INTENS:
+        data = data.reshape((-1, 2))
+    return data
+
+
+class _Subscriber(object):
+    '''TCP subscriber with its own queue and sender thread'''
+
+    def __init__(self, sock, addr, policy, size, logger):
+        self.sock = sock
+        self.addr = addr
+        self.policy = policy
+        self.size = size
+        self.dropped = 0 #: Number of scans dropped for this subscriber
+        self.alive = True
+        self._logger = logger
+        self._queue = deque()
+        self._scans = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def push(self, packet, config=False):
+        '''Queues message, drop policy is applied only to scan messages,
+        never blocks'''
+        with self._cond:
+            if config:
+                if self._queue and self._queue[-1][1]:
+                    # previous config has no scans to describe
+                    self._queue.pop()
+            elif self._scans >= self.size:
+                self.dropped += 1
+                if self.policy == 'newest':
+                    return
+                if self.policy == 'disconnect':
+                    self._logger.warning('Disconnecting slow subscriber %s',
+                                         self.addr)
+                    self.alive = False
+                    self._cond.notify()
+                    return
+                self._drop_oldest()
+            self._queue.append((packet, config))
+            if not config:
+                self._scans += 1
+            self._cond.notify()
+
+    def _drop_oldest(self):
+        '''Removes the oldest queued scan message'''
+        for i, (_, config) in enumerate(self._queue):
+            if not config:
+                del self._queue[i]
+                self._scans -= 1
+                return
+
+    def close(self):
+        with self._cond:
+            self.alive = False
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while self.alive and not self._queue:
+                        self._cond.wait()
+                    if not self.alive:
+                        break
+                    packet, config = self._queue.popleft()
+                    if not config:
+                        self._scans -= 1
+                self.sock.sendall(packet)
+        except socket.error as err:
+            self._logger.info('Subscriber %s disconnected: %s',
+                              self.addr, err)
+        finally:
+            self.alive = False
+            self.sock.close()
+
+
+class ScanBroker(object):
+    '''Republishes scans to TCP subscribers and UDP destinations'''
+
+    def __init__(self, addr=('', BROKER_PORT), udp=(), queue_size=4,
+                 policy='oldest', ttl=1, config_interval=40, logger=None):
+        '''Creates new broker
+
+        Parameters
+        ----------
+        addr : tuple, optional
+            Address on which TCP subscribers are accepted, None disables
+            TCP server (the default is `('', 10950)`)
+        udp : list, optional
+            UDP destinations `(host, port)`, multicast groups are supported
+            (the default is empty list)
+        queue_size : int, optional
+            Default size of the subscriber queue (the default is 4)
+        policy : str, optional
+            Default drop policy of subscribers, one of: 'oldest', 'newest',
+            'disconnect' (the default is 'oldest')
+        ttl : int, optional
+            Time-to-live of multicast datagrams (the default is 1)
+        config_interval : int, optional
+            Config message is resent to UDP destinations after this number
+            of scans, so late clients can start decoding (the default is 40)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        '''
+        super(ScanBroker, self).__init__()
+        if policy not in POLICIES:
+            raise HokuyoException('Unknown drop policy: %s' % policy)
+        self.addr = addr
+        self.udp = list(udp)
+        self.queue_size = queue_size
+        self.policy = policy
+        self.config_interval = config_interval
+        self.seq = 0 #: Sequence number of the last published scan
+        self._logger = logging.getLogger('hokuyo.broker') \
+            if logger is None else logger
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_packet = None
+        self._server = None
+        self._accept_thread = None
+        self._serve_thread = None
+        self._running = False
+        self._udp_sock = None
+        if self.udp:
+            self._udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._udp_sock.setsockopt(socket.IPPROTO_IP,
+                                      socket.IP_MULTICAST_TTL, ttl)
+            self._udp_sock.setblocking(False)
+
+    @property
+    def subscribers(self):
+        '''List of `(address, dropped)` pairs of connected subscribers'''
+        with self._lock:
+            return [(sub.addr, sub.dropped) for sub in self._subscribers
+                    if sub.alive]
+
+    def start(self, scans=None):
+        '''Starts accepting subscribers in the background thread
+
+        Parameters
+        ----------
+        scans : iterable, optional
+            If given, scans are published by `serve` in another background
+            thread (the default is None)
+        '''
+        self._running = True
+        if self.addr is not None and self._server is None:
+            self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._server.bind(self.addr)
+            self._server.listen(8)
+            self.addr = self._server.getsockname()
+            self._accept_thread = threading.Thread(target=self._accept)
+            self._accept_thread.daemon = True
+            self._accept_thread.start()
+            self._logger.info('Broker is listening on %s:%d', *self.addr)
+        if scans is not None:
+            self._serve_thread = threading.Thread(target=self.serve,
+                                                  args=(scans, ))
+            self._serve_thread.daemon = True
+            self._serve_thread.start()
+
+    def _accept(self):
+        '''Accepts subscribers and reads their hello lines'''
+        while self._running:
+            try:
+                sock, addr = self._server.accept()
+            except socket.error:
+                break
+            policy, size = self.policy, self.queue_size
+            sock.settimeout(1.)
+            try:
+                hello = b''
+                while not hello.endswith(b'\n'):
+                    chunk = sock.recv(256)
+                    if not chunk:
+                        break
+                    hello += chunk
+                params = json.loads(hello.decode('ascii') or '{}')
+                policy = params.get('policy') or policy
+                size = int(params.get('queue') or size)
+            except (socket.error, ValueError):
+                pass
+            if policy not in POLICIES:
+                self._logger.warning('Unknown drop policy %s from %s',
+                                     policy, addr)
+                sock.close()
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._logger.info('New subscriber %s (policy: %s, queue: %d)',
+                              addr, policy, size)
+            sub = _Subscriber(sock, addr, policy, size, self._logger)
+            with self._lock:
+                if self._config_packet is not None:
+                    sub.push(self._config_packet, config=True)
+                self._subscribers = [s for s in self._subscribers
+                                     if s.alive] + [sub]
+
+    def _send_udp(self, packet):
+        '''Sends message to UDP destinations, datagrams which can not be
+        sent immediately are dropped'''
+        for dest in self.udp:
+            try:
+                self._udp_sock.sendto(packet, dest)
+            except socket.error as err:
+                if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                     errno.ENOBUFS):
+                    raise
+
+    def publish(self, scan):
+        '''Publishes scan to all subscribers and destinations, message is
+        encoded once and never blocks on slow subscribers
+
+        Parameters
+        ----------
+        scan : `Scan`
+            Scan record, e.g. yielded by `HokuyoLX.iter_dist`
+        '''
+        self.seq += 1
+        new_config = scan.config is not self._config
+        if new_config:
+            self._config = scan.config
+            self._config_packet = encode_config(scan.config, self.seq)
+        packet = encode_scan(scan, self.seq)
+        with self._lock:
+            subscribers = self._subscribers
+            if new_config:
+                for sub in subscribers:
+                    sub.push(self._config_packet, config=True)
+        for sub in subscribers:
+            if sub.alive:
+                sub.push(packet)
+        if self._udp_sock is not None:
+            if new_config or self.seq % self.config_interval == 0:
+                self._send_udp(self._config_packet)
+            self._send_udp(packet)
+
+    def serve(self, scans):
+        '''Publishes all scans from the given iterable
+
+        Parameters
+        ----------
+        scans : iterable
+            Scan records, e.g. `HokuyoLX.iter_dist()` generator
+        '''
+        for scan in scans:
+            if not self._running:
+                break
+            self.publish(scan)
+
+    def close(self):
+        '''Stops the broker and disconnects all subscribers'''
+        self._running = False
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            self._server.close()
+            self._server = None
+        with self._lock:
+            for sub in self._subscribers:
+                sub.close()
+            self._subscribers = []
+        if self._udp_sock is not None:
+            self._udp_sock.close()
+            self._udp_sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ScanClient(object):
+    '''Client which recieves scans republished by `ScanBroker`'''
+
+    def __init__(self, addr=('127.0.0.1', BROKER_PORT), udp=False,
+                 group=None, policy=None, queue_size=None, timeout=5,
+                 logger=None):
+        '''Creates new client and connects to the broker
+
+        Parameters
+        ----------
+        addr : tuple, optional
+            Address of the broker for TCP or local address to bind for
+            UDP (the default is `('127.0.0.1', 10950)`)
+        udp : bool, optional
+            Recieve UDP datagrams instead of connecting over TCP
+            (the default is False)
+        group : str, optional
+            Multicast group to join in the UDP mode (the default is None)
+        policy : str, optional
+            Drop policy requested from the broker, one of: 'oldest',
+            'newest', 'disconnect' (the default is None, which implies
+            broker default)
+        queue_size : int, optional
+            Size of the subscriber queue requested from the broker
+            (the default is None, which implies broker default)
+        timeout : int, optional
+            Timeout of recieving in seconds (the default is 5)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        '''
+        super(ScanClient, self).__init__()
+        self.addr = addr
+        self.udp = udp
+        self.config = None #: Config of the recieved scans
+        self.dropped = 0 #: Number of scans lost on the way from the broker
+        self._last_seq = None
+        self._logger = logging.getLogger('hokuyo.client') \
+            if logger is None else logger
+        if udp:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._sock.bind(('', addr[1]) if group else addr)
+            if group is not None:
+                mreq = struct.pack('4s4s', socket.inet_aton(group),
+                                   socket.inet_aton('0.0.0.0'))
+                self._sock.setsockopt(socket.IPPROTO_IP,
+                                      socket.IP_ADD_MEMBERSHIP, mreq)
+        else:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            try:
+                self._sock.connect(addr)
+            except socket.timeout:
+                raise HokuyoException('Failed to connect to the broker')
+            params = {}
+            if policy is not None:
+                params['policy'] = policy
+            if queue_size is not None:
+                params['queue'] = queue_size
+            self._sock.sendall(json.dumps(params).encode('ascii') + b'\n')
+        self._sock.settimeout(timeout)
+
+    def _recv_exact(self, n):
+        '''Recieves exactly `n` bytes from the TCP connection'''
+        buf = bytearray(n)
+        view = memoryview(buf)
+        pos = 0
+        while pos < n:
+            try:
+                k = self._sock.recv_into(view[pos:], n - pos)
+            except socket.timeout:
+                raise HokuyoException('Connection timeout')
+            if not k:
+                raise HokuyoException('Connection closed by the broker')
+            pos += k
+        return bytes(buf)
+
+    def _recv_message(self):
+        '''Recieves one message, returns decoded header and payload'''
+        if self.udp:
+            try:
+                packet = self._sock.recv(65536)
+            except socket.timeout:
+                raise HokuyoException('Connection timeout')
+            header = decode_header(packet[:_HEADER.size])
+            payload = packet[_HEADER.size:]
+            if len(payload) != header[2]:
+                raise HokuyoException('Truncated datagram')
+        else:
+            header = decode_header(self._recv_exact(_HEADER.size))
+            payload = self._recv_exact(header[2])
+        return header, payload
+
+    def recv(self):
+        '''Recieves the next scan
+
+        Returns
+        -------
+        `Scan`
+            Scan record, `seq` is the sequence number assigned by the sensor
+            and `host_time` is the time of recieving by the broker host
+        '''
+        while True:
+            header, payload = self._recv_message()
+            kind, flags, _, seq, scan_seq, timestamp, host_time = header
+            if kind == MSG_CONFIG:
+                self.config = ScanConfig.get(*json.loads(
+                    payload.decode('ascii')))
+                continue
+            if kind != MSG_SCAN:
+                self._logger.warning('Unknown message type: %d', kind)
+                continue
+            if self._last_seq is not None and seq > self._last_seq + 1:
+                self.dropped += seq - self._last_seq - 1
+            self._last_seq = seq
+            if self.config is None:
+                # UDP clients wait for the periodic config message
+                continue
+            return Scan(decode_data(payload, flags), timestamp, self.config,
+                        seq=scan_seq, host_time=host_time or None)
+
+    def iter_scans(self, scans=0):
+        '''Yields recieved scans
+
+        Parameters
+        ----------
+        scans : int, optional
+            Number of scans to recieve (the default is 0, which means
+            infinite number of scans)
+
+        Yields
+        ------
+        `Scan`
+            Scan records in the same form as `HokuyoLX.iter_dist` and
+            `HokuyoLX.iter_intens`
+        '''
+        n = 0
+        while scans == 0 or n < scans:
+            yield self.recv()
+            n += 1
+
+    def iter_dist(self, scans=0):
+        '''Yields recieved scans with distances only, intensities are
+        stripped if the broker publishes them and config of such scans is
+        replaced by the config of the distance-only command'''
+        config = dist_config = None
+        for scan in self.iter_scans(scans):
+            if scan.data.ndim == 2:
+                if scan.config is not config:
+                    config = scan.config
+                    dist_config = ScanConfig.get(
+                        *(config.key[:-1] + (config.cmd[0] + 'D', )))
+                scan.data = scan.data[:, 0]
+                scan.config = dist_config
+            yield scan
+
+    def iter_intens(self, scans=0):
+        '''Yields recieved scans with distances and intensities'''
+        for scan in self.iter_scans(scans):
+            if scan.data.ndim != 2:
+                raise HokuyoException('Broker does not publish intensities')
+            yield scan
+
+    def close(self):
+        '''Closes connection to the broker'''
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
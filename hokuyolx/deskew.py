@@ -0,0 +1,146 @@
+'''Motion deskewing of scans using per-beam timestamps.
+
+Beams of one scan are measured during the whole rotation (25 ms for
+the 40 Hz sensor), so on a moving robot points of a single scan are
+measured from different poses. Using per-beam times
+(`ScanConfig.time_offsets`) and the pose trajectory interpolated for each
+beam, points are transformed into the frame of the robot at the single
+reference time. All operations are vectorized over beams.
+
+Usage example:
+
+>>> trajectory = Trajectory()
+>>> for scan in laser.iter_dist():
+...     trajectory.append(odometry_time, odometry_pose)
+...     points = deskew(scan, trajectory)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan
+
+
+class Trajectory(object):
+    '''Sequence of timestamped poses `(x, y, theta)` with linear
+    interpolation, angles are unwrapped before interpolation'''
+
+    def __init__(self, times=None, poses=None, maxlen=None):
+        '''Creates new trajectory
+
+        Parameters
+        ----------
+        times : array_like, optional
+            Increasing timestamps in milliseconds
+        poses : array_like, optional
+            Array of shape `(N, 3)` with poses in millimeters and radians
+        maxlen : int, optional
+            Maximal number of stored poses, older poses are discarded by
+            `append` (the default is None, which means unlimited)
+        '''
+        super(Trajectory, self).__init__()
+        self.maxlen = maxlen
+        self.times = np.empty(0)
+        self.poses = np.empty((0, 3))
+        if times is not None:
+            self.extend(times, poses)
+
+    def __len__(self):
+        return len(self.times)
+
+    def extend(self, times, poses):
+        '''Appends several poses, timestamps must be increasing'''
+        times = np.asarray(times, np.float64).reshape(-1)
+        poses = np.asarray(poses, np.float64).reshape((-1, 3))
+        if len(times) != len(poses):
+            raise HokuyoException('Number of times and poses does not match')
+        if not len(times):
+            return
+        if np.any(np.diff(times) <= 0) or \
+                (len(self.times) and times[0] <= self.times[-1]):
+            raise HokuyoException('Timestamps must be increasing')
+        poses = poses.copy()
+        # unwrap angles so linear interpolation does not jump at +-pi
+        prev = self.poses[-1, 2] if len(self.poses) else poses[0, 2]
+        theta = np.concatenate(([prev], poses[:, 2]))
+        poses[:, 2] = np.unwrap(theta)[1:]
+        self.times = np.concatenate((self.times, times))
+        self.poses = np.concatenate((self.poses, poses))
+        if self.maxlen is not None and len(self.times) > self.maxlen:
+            self.times = self.times[-self.maxlen:]
+            self.poses = self.poses[-self.maxlen:]
+
+    def append(self, t, pose):
+        '''Appends one pose'''
+        self.extend([t], [pose])
+
+    def __call__(self, t):
+        '''Returns poses interpolated for the given times, times outside of
+        the trajectory are clamped to its ends
+
+        Parameters
+        ----------
+        t : float or ndarray
+            Timestamps in milliseconds
+
+        Returns
+        -------
+        ndarray
+            Array of shape `(..., 3)` with poses
+        '''
+        if not len(self.times):
+            raise HokuyoException('Trajectory is empty')
+        t = np.asarray(t, np.float64)
+        return np.stack([np.interp(t, self.times, self.poses[:, i])
+                         for i in range(3)], axis=-1)
+
+
+def deskew(scan, trajectory, ref_time=None, extrinsic=None, world=False):
+    '''Returns motion-corrected Cartesian points of the scan
+
+    Parameters
+    ----------
+    scan : `Scan`
+        Scan record, its timestamp must be in the time base of
+        the trajectory (e.g. converted sensor time)
+    trajectory : `Trajectory` or callable
+        Robot poses, callable must return array of shape `(N, 3)` for
+        array of `N` timestamps
+    ref_time : float, optional
+        Time of the frame in which points are returned (the default is None,
+        which implies scan timestamp)
+    extrinsic : tuple, optional
+        Sensor pose `(x, y, theta)` in the robot frame (the default is None,
+        which means that sensor frame coincides with the robot frame)
+    world : bool, optional
+        Return points in the trajectory (world) frame instead of the robot
+        frame at `ref_time` (the default is False)
+
+    Returns
+    -------
+    ndarray
+        Array of shape `(beams, 2)` with corrected points aligned with
+        beams, use `scan.valid_mask` to select valid ones
+    '''
+    if not isinstance(scan, Scan):
+        raise HokuyoException('Deskewing requires Scan records')
+    config = scan.config
+    dist = scan.dist
+    poses = np.asarray(trajectory(scan.timestamp + config.time_offsets))
+    if extrinsic is None:
+        ex, ey, et = 0., 0., 0.
+    else:
+        ex, ey, et = extrinsic
+    # points in the sensor frame rotated by the mount angle
+    ce, se = np.cos(et), np.sin(et)
+    px = dist*(ce*config.cos - se*config.sin) + ex
+    py = dist*(se*config.cos + ce*config.sin) + ey
+    # robot frame at beam times -> world frame
+    c, s = np.cos(poses[:, 2]), np.sin(poses[:, 2])
+    wx = c*px - s*py + poses[:, 0]
+    wy = s*px + c*py + poses[:, 1]
+    if world:
+        return np.column_stack((wx, wy))
+    t = scan.timestamp if ref_time is None else ref_time
+    rx, ry, rt = np.asarray(trajectory(np.array([t])))[0]
+    dx, dy = wx - rx, wy - ry
+    c, s = np.cos(rt), np.sin(rt)
+    return np.column_stack((c*dx + s*dy, -s*dx + c*dy))
@@ -0,0 +1,280 @@
+'''Frame dispatcher which owns reading from the sensor socket and routes
+recieved frames by their echoed headers'''
+import time
+import socket
+import select
+import logging
+import threading
+from codecs import decode
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from .exceptions import HokuyoException
+
+
+def split_frames(data):
+    '''Splits recieved bytes into complete frames (each frame is terminated
+    by an empty line) and returns list of frames together with the remaining
+    incomplete tail.
+
+    Parameters
+    ----------
+    data : bytes
+        Recieved data
+
+    Returns
+    -------
+    frames : list of bytes
+        Complete frames without terminating `\\n\\n`
+    rest : bytes
+        Incomplete tail of the data
+    '''
+    frames = data.split(b'\n\n')
+    return frames[:-1], frames[-1]
+
+
+class Reply(object):
+    '''Future-like handle for a reply on the sent command. Optional
+    post-processing function is executed lazily in the thread which
+    retrieves the result, so it is allowed to perform other requests.'''
+
+    def __init__(self, future, process=None, timeout=None):
+        self._future = future
+        self._process = process
+        self._timeout = timeout
+        self._done = False
+        self._value = None
+
+    def done(self):
+        '''Was the reply already recieved?'''
+        return self._future.done()
+
+    def cancel(self):
+        '''Cancels waiting for the reply, the reply will be discarded'''
+        return self._future.cancel()
+
+    def result(self, timeout=None):
+        '''Waits for the reply and returns processed result
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time to wait in seconds (the default is None, which implies
+            timeout given on creation)
+        '''
+        if not self._done:
+            timeout = self._timeout if timeout is None else timeout
+            try:
+                resp = self._future.result(timeout)
+            except FutureTimeout:
+                raise HokuyoException('Connection timeout')
+            self._value = resp if self._process is None else \
+                self._process(resp)
+            self._done = True
+        return self._value
+
+
+class Stream(queue.Queue):
+    '''Queue of stream frames which allows waiting for a frame without
+    taking it from the queue'''
+
+    def wait(self, timeout=None):
+        '''Waits until the queue is not empty, returns False on timeout'''
+        with self.not_empty:
+            if timeout is None:
+                while not self._qsize():
+                    self.not_empty.wait()
+                return True
+            deadline = time.time() + timeout
+            while not self._qsize():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.not_empty.wait(remaining)
+            return True
+
+
+class Dispatcher(object):
+    '''Reads frames from the sensor socket in the background thread and
+    routes them by the echoed header. Frames with header equal to the one of
+    the pending request are passed to the request future (requests with
+    the same header are served in the FIFO order, which allows pipelining),
+    frames with header starting with the registered stream prefix are put
+    into the stream queue, other frames are discarded.'''
+
+    def __init__(self, sock, buf=512, logger=None, poll=0.1):
+        '''Creates dispatcher for the given connected socket
+
+        Parameters
+        ----------
+        sock : socket
+            Connected socket
+        buf : int, optional
+            Buffer size for recieving messages from the sensor
+            (the default is 512)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        poll : float, optional
+            Polling interval of the reader thread in seconds, defines how
+            fast dispatcher stops (the default is 0.1)
+        '''
+        super(Dispatcher, self).__init__()
+        self._sock = sock
+        self.buf = buf
+        self.poll = poll
+        self._logger = logging.getLogger('hokuyo') if logger is None \
+            else logger
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._streams = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+        self.leftover = b'' #: Unprocessed data left after stopping
+
+    @property
+    def running(self):
+        '''Is reader thread running?'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, data=b''):
+        '''Starts the reader thread
+
+        Parameters
+        ----------
+        data : bytes, optional
+            Already recieved but unprocessed data
+        '''
+        if self.running:
+            return
+        self._stop.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(data,),
+                                        name='hokuyo-dispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        '''Stops the reader thread, pending requests and streams are failed
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time to wait for the reader thread in seconds
+        '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._fail(HokuyoException('Dispatcher stopped'))
+
+    def request(self, header):
+        '''Registers pending request with the given header. Must be called
+        before sending the command to the sensor.
+
+        Returns
+        -------
+        Future
+            Future resolved with list of the reply lines
+        '''
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                future.set_exception(self._error)
+                return future
+            self._pending.setdefault(header, deque()).append(future)
+        return future
+
+    def open_stream(self, prefix):
+        '''Registers stream for frames with header starting with `prefix`
+
+        Returns
+        -------
+        `Stream`
+            Queue which recieves pairs of frame lines and host time of
+            recieving in milliseconds, or exception instances if reading
+            failed
+        '''
+        stream = Stream()
+        with self._lock:
+            if self._error is not None:
+                stream.put(self._error)
+            self._streams[prefix] = stream
+        return stream
+
+    def close_stream(self, prefix):
+        '''Unregisters stream with the given prefix'''
+        with self._lock:
+            self._streams.pop(prefix, None)
+
+    def backlog(self):
+        '''Returns number of recieved frames waiting in stream queues'''
+        with self._lock:
+            return sum(stream.qsize() for stream in self._streams.values())
+
+    def _route(self, lines, recv_time=None):
+        '''Passes frame to the pending request or to the stream'''
+        header = lines[0]
+        future = stream = None
+        with self._lock:
+            pending = self._pending.get(header)
+            if pending:
+                future = pending.popleft()
+                if not pending:
+                    del self._pending[header]
+            else:
+                for prefix, queue_ in self._streams.items():
+                    if header.startswith(prefix):
+                        stream = queue_
+                        break
+        if future is not None:
+            if future.set_running_or_notify_cancel():
+                future.set_result(lines)
+        elif stream is not None:
+            stream.put((lines, recv_time))
+        else:
+            self._logger.warning(
+                'Discarded data due header mismatch: %s' % lines)
+
+    def _fail(self, error):
+        '''Fails all pending requests and notifies all streams'''
+        with self._lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+            streams = list(self._streams.values())
+        for futures in pending.values():
+            for future in futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+        for stream in streams:
+            stream.put(error)
+
+    def _run(self, data):
+        '''Reader thread loop'''
+        self._logger.info('Dispatcher started')
+        recv_time = time.time()*1000
+        try:
+            while not self._stop.is_set():
+                frames, data = split_frames(data)
+                for frame in frames:
+                    self._logger.debug('Recieved data: %s' % frame)
+                    self._route(decode(frame, 'ascii').split('\n'),
+                                recv_time)
+                ready, _, _ = select.select([self._sock], [], [], self.poll)
+                if not ready:
+                    continue
+                chunk = self._sock.recv(self.buf)
+                recv_time = time.time()*1000
+                if not chunk:
+                    raise HokuyoException('Connection closed by the sensor')
+                data += chunk
+        except (socket.error, ValueError, HokuyoException) as err:
+            self._logger.error('Dispatcher failed: %s' % err)
+            if not isinstance(err, HokuyoException):
+                err = HokuyoException('Connection failure: %s' % err)
+            self._fail(err)
+        self.leftover = data
+        self._logger.info('Dispatcher stopped')
@@ -0,0 +1,227 @@
+'''Downsampling of Cartesian scan points.
+
+Three reductions are available: grid-hash voxel downsampling (points are
+quantized into square cells and unique cell keys are found with
+`np.unique`), angular binning which keeps the nearest return in each group
+of consecutive beams, and the hard point budget which selects points
+uniformly along the scan polyline, so the result covers the scene evenly
+and never exceeds the given size. `Downsampler` chains them for streaming
+and reuses preallocated buffers.
+
+Usage example:
+
+>>> down = Downsampler(voxel=50, budget=256)
+>>> for scan in laser.iter_dist():
+...     points = down(scan)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+def voxel_downsample(points, voxel, centroid=True):
+    '''Reduces points to one point per occupied square cell
+
+    Parameters
+    ----------
+    points : ndarray
+        Array of shape `(N, 2)` with Cartesian coordinates
+    voxel : float
+        Cell size in millimeters
+    centroid : bool, optional
+        Return centroids of cell points, otherwise the first point of each
+        cell in the scan order is returned (the default is True)
+
+    Returns
+    -------
+    ndarray
+        Array of shape `(M, 2)` with points ordered by the first occurrence
+        of their cells in the scan
+    '''
+    if not len(points):
+        return points[:0]
+    cells = np.floor(points/voxel).astype(np.int64)
+    keys = cells[:, 0]*(1 << 32) + (cells[:, 1] & 0xffffffff)
+    _, first, inverse = np.unique(keys, return_index=True,
+                                  return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(first, kind='stable')
+    if not centroid:
+        return points[first[order]]
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    ids = rank[inverse]
+    counts = np.bincount(ids, minlength=len(order)).astype(np.float64)
+    result = np.empty((len(order), 2))
+    result[:, 0] = np.bincount(ids, points[:, 0], len(order))/counts
+    result[:, 1] = np.bincount(ids, points[:, 1], len(order))/counts
+    return result
+
+
+def angular_min(dist, group, valid=None):
+    '''Keeps the minimal valid distance in each group of consecutive beams
+
+    Parameters
+    ----------
+    dist : ndarray
+        Array with measured distances
+    group : int
+        Number of beams in the group
+    valid : ndarray, optional
+        Boolean mask of valid distances (the default is None, which means
+        that all distances are valid)
+
+    Returns
+    -------
+    index : ndarray
+        Index of the selected beam of each group with at least one valid
+        distance
+    dist : ndarray
+        Selected distances
+    '''
+    n = len(dist)
+    values = dist.astype(np.float64)
+    if valid is not None:
+        values[~valid] = np.inf
+    pad = (-n) % group
+    if pad:
+        values = np.concatenate((values, np.full(pad, np.inf)))
+    values = values.reshape((-1, group))
+    best = np.argmin(values, axis=1)
+    rows = np.arange(len(values))
+    keep = np.isfinite(values[rows, best])
+    index = rows[keep]*group + best[keep]
+    return index, dist[index]
+
+
+def limit_points(points, budget):
+    '''Selects at most `budget` points distributed uniformly along the scan
+    polyline, jumps between distant points are counted as ordinary
+    segments, so separate objects get shares proportional to their length
+
+    Parameters
+    ----------
+    points : ndarray
+        Array of shape `(N, 2)` with points in the scan order
+    budget : int
+        Maximal number of points
+
+    Returns
+    -------
+    ndarray
+        Indices of the selected points
+    '''
+    n = len(points)
+    if n <= budget:
+        return np.arange(n)
+    if budget < 1:
+        return np.arange(0)
+    step = np.hypot(*np.diff(points, axis=0).T)
+    length = np.empty(n)
+    length[0] = 0.
+    np.cumsum(step, out=length[1:])
+    targets = np.linspace(0., length[-1], budget)
+    index = np.searchsorted(length, targets)
+    np.minimum(index, n - 1, out=index)
+    # several targets can fall between two points on long jumps
+    keep = np.ones(budget, bool)
+    keep[1:] = index[1:] != index[:-1]
+    return index[keep]
+
+
+class Downsampler(object):
+    '''Streaming downsampling stage producing bounded-size point sets'''
+
+    def __init__(self, voxel=None, group=None, budget=None, centroid=True,
+                 dmin=None, dmax=None):
+        '''Creates new downsampler, reductions are applied in the order:
+        angular binning, voxel downsampling, point budget
+
+        Parameters
+        ----------
+        voxel : float, optional
+            Cell size in millimeters (the default is None, which disables
+            voxel downsampling)
+        group : int, optional
+            Number of consecutive beams reduced to the nearest return
+            (the default is None, which disables angular binning)
+        budget : int, optional
+            Maximal number of points (the default is None, which disables
+            limiting)
+        centroid : bool, optional
+            Use cell centroids in voxel downsampling (the default is True)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `scan.config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `scan.config.dmax`)
+        '''
+        super(Downsampler, self).__init__()
+        self.voxel = voxel
+        self.group = group
+        self.budget = budget
+        self.centroid = centroid
+        self.dmin = dmin
+        self.dmax = dmax
+        self._size = 0
+        self._points = None
+        self._out = None
+
+    def _buffers(self, size):
+        '''Returns preallocated buffers for the given number of beams'''
+        if size > self._size:
+            self._size = size
+            self._points = np.empty((size, 2))
+            self._out = np.empty((size, 2))
+        return self._points, self._out
+
+    def __call__(self, scan, angles=None, copy=False):
+        '''Downsamples the scan
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        angles : ndarray, optional
+            Beam angles, required if `scan` is an array
+        copy : bool, optional
+            Return copy instead of the view into reused buffer
+            (the default is False)
+
+        Returns
+        -------
+        ndarray
+            Array of shape `(M, 2)` with Cartesian coordinates, `M` does not
+            exceed `budget`
+        '''
+        if isinstance(scan, Scan):
+            config = scan.config
+            dist, cos, sin = scan.dist, config.cos, config.sin
+            dmin, dmax = config.limits(self.dmin, self.dmax)
+        else:
+            if angles is None:
+                raise HokuyoException('Angles are required for raw scans')
+            dist = np.asarray(scan)
+            if dist.ndim == 2:
+                dist = dist[:, 0]
+            cos, sin = np.cos(angles), np.sin(angles)
+            dmin, dmax = self.dmin, self.dmax
+        valid = filter_mask(dist, None, dmin, dmax)
+        if self.group:
+            index, values = angular_min(dist, self.group, valid)
+        else:
+            index = np.flatnonzero(valid)
+            values = dist[index]
+        buf, out = self._buffers(len(dist))
+        n = len(index)
+        points = buf[:n]
+        np.multiply(values, cos[index], out=points[:, 0])
+        np.multiply(values, sin[index], out=points[:, 1])
+        if self.voxel:
+            points = voxel_downsample(points, self.voxel, self.centroid)
+        if self.budget is not None and len(points) > self.budget:
+            points = points[limit_points(points, self.budget)]
+        n = len(points)
+        out[:n] = points
+        return out[:n].copy() if copy else out[:n]
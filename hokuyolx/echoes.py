@@ -0,0 +1,103 @@
+'''Compact representation of multi-echo scans'''
+import numpy as np
+from .exceptions import HokuyoException
+
+
+class MultiEcho(object):
+    '''Multi-echo scan stored in the CSR-style form: flat arrays with
+    distances and intensities of all echoes and array of per-beam offsets,
+    so echoes of the beam `i` are stored in `dist[offsets[i]:offsets[i+1]]`.
+    Echoes of each beam are stored in the order they were recieved from
+    the sensor.'''
+
+    __slots__ = ('dist', 'intens', 'offsets')
+
+    def __init__(self, dist, offsets, intens=None):
+        '''Creates new multi-echo scan
+
+        Parameters
+        ----------
+        dist : ndarray
+            Flat array with distances of all echoes
+        offsets : ndarray
+            Array of beam offsets with length equal to number of beams plus 1
+        intens : ndarray, optional
+            Flat array with intensities of all echoes
+        '''
+        self.dist = dist
+        self.offsets = offsets
+        self.intens = intens
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return '%s(beams=%d, echoes=%d, intens=%s)' % (
+            type(self).__name__, len(self), len(self.dist),
+            self.intens is not None)
+
+    @property
+    def counts(self):
+        '''Number of echoes for each beam'''
+        return np.diff(self.offsets)
+
+    @property
+    def beam_ids(self):
+        '''Beam index for each echo'''
+        return np.repeat(np.arange(len(self)), self.counts)
+
+    def _select(self, idx):
+        '''Returns echoes with given indices in the same form as
+        single echo scans'''
+        if self.intens is None:
+            return self.dist[idx]
+        return np.vstack((self.dist[idx], self.intens[idx])).T
+
+    def first(self):
+        '''Returns first echo for each beam
+
+        Returns
+        -------
+        ndarray
+            Array with distances (and intensities if available) in the same
+            form as returned by `HokuyoLX.get_dist` or `HokuyoLX.get_intens`
+        '''
+        return self._select(self.offsets[:-1])
+
+    def last(self):
+        '''Returns last echo for each beam
+
+        Returns
+        -------
+        ndarray
+            Array with distances (and intensities if available) in the same
+            form as returned by `HokuyoLX.get_dist` or `HokuyoLX.get_intens`
+        '''
+        return self._select(self.offsets[1:] - 1)
+
+    def strongest(self):
+        '''Returns echo with the highest intensity for each beam, available
+        only for scans with intensities
+
+        Returns
+        -------
+        ndarray
+            Array with distances and intensities in the same form as
+            returned by `HokuyoLX.get_intens`
+        '''
+        if self.intens is None:
+            raise HokuyoException('Scan does not contain intensities')
+        order = np.lexsort((self.intens, self.beam_ids))
+        return self._select(order[self.offsets[1:] - 1])
+
+    def all(self):
+        '''Returns all echoes together with their beam indices
+
+        Returns
+        -------
+        beam_ids : ndarray
+            Beam index for each echo
+        scan : ndarray
+            Array with distances (and intensities if available) for each echo
+        '''
+        return self.beam_ids, self._select(slice(None))
@@ -0,0 +1,205 @@
+'''Line and corner feature extraction from segmented scans.
+
+Lines are extracted with split-and-merge using iterative end-point fit,
+which is applied to all segments at once: on each iteration every interval
+is split at its point farthest from the chord between its end points if
+the distance exceeds the threshold. Resulting intervals are fitted with
+total least squares using cumulative sums of point moments. Lines are
+represented in the normal form `x*cos(alpha) + y*sin(alpha) = r`.
+
+Usage example:
+
+>>> for scan in laser.iter_dist():
+...     lines = extract_lines(segment(scan))
+...     print(lines.alpha, lines.r, lines.corners)
+'''
+import numpy as np
+
+
+class LineFeatures(object):
+    '''Extracted lines and corners stored as flat arrays'''
+
+    __slots__ = ('alpha', 'r', 'cov', 'endpoints', 'counts', 'segment',
+                 'first', 'last', 'corners', 'corner_lines')
+
+    def __init__(self, alpha, r, cov, endpoints, counts, segment, first,
+                 last, corners, corner_lines):
+        self.alpha = alpha #: Angle of the line normal
+        self.r = r #: Distance from the origin to the line
+        self.cov = cov #: Covariance matrices of `(alpha, r)`, shape `(K, 2, 2)`
+        #: End points of line segments projected onto lines, `(K, 2, 2)`
+        self.endpoints = endpoints
+        self.counts = counts #: Number of points used for fitting each line
+        self.segment = segment #: Index of the segment containing each line
+        self.first = first #: Index of the first point of each line
+        self.last = last #: Index of the last point of each line
+        self.corners = corners #: Array of shape `(M, 2)` with corner positions
+        #: Array of shape `(M, 2)` with indices of lines forming each corner
+        self.corner_lines = corner_lines
+
+    def __len__(self):
+        return len(self.alpha)
+
+    def __repr__(self):
+        return '%s(lines=%d, corners=%d)' % (
+            type(self).__name__, len(self), len(self.corners))
+
+
+def _expand(first, last):
+    '''Returns interval index and point index for every point of
+    the given intervals'''
+    lengths = last - first + 1
+    ids = np.repeat(np.arange(len(first)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    return ids, np.arange(lengths.sum()) - offsets[ids] + first[ids]
+
+
+def _split(points, first, last, threshold, min_points, max_iter=32):
+    '''Iterative end-point fit applied to all intervals at once'''
+    done_first, done_last = [], []
+    for _ in range(max_iter):
+        if not len(first):
+            break
+        ids, idx = _expand(first, last)
+        pa, pb = points[first], points[last]
+        chord = pb - pa
+        norm = np.hypot(chord[:, 0], chord[:, 1])
+        norm[norm == 0] = 1.
+        rel = points[idx] - pa[ids]
+        dist = np.abs(rel[:, 0]*chord[ids, 1] - rel[:, 1]*chord[ids, 0])
+        dist /= norm[ids]
+        # farthest point of each interval, the first one in case of ties
+        order = np.lexsort((-dist, ids))
+        starts = np.cumsum(last - first + 1) - (last - first + 1)
+        far = order[starts]
+        dmax, split = dist[far], idx[far]
+        can_split = (dmax > threshold) & (split - first + 1 >= min_points) & \
+            (last - split + 1 >= min_points)
+        done_first.append(first[~can_split])
+        done_last.append(last[~can_split])
+        sf, sl, sp = first[can_split], last[can_split], split[can_split]
+        first = np.concatenate((sf, sp))
+        last = np.concatenate((sp, sl))
+    done_first.append(first)
+    done_last.append(last)
+    first = np.concatenate(done_first)
+    last = np.concatenate(done_last)
+    order = np.lexsort((last, first))
+    return first[order], last[order]
+
+
+def _fit(points, first, last, sigma):
+    '''Total least squares fit of lines to the given intervals'''
+    n = (last - first + 1).astype(np.float64)
+    x, y = points[:, 0], points[:, 1]
+    moments = np.column_stack((x, y, x*x, y*y, x*y))
+    csum = np.zeros((len(points) + 1, 5))
+    np.cumsum(moments, axis=0, out=csum[1:])
+    sx, sy, sxx, syy, sxy = (csum[last + 1] - csum[first]).T
+    xm, ym = sx/n, sy/n
+    cxx = sxx - n*xm*xm
+    cyy = syy - n*ym*ym
+    cxy = sxy - n*xm*ym
+    alpha = 0.5*np.arctan2(-2*cxy, cyy - cxx)
+    r = xm*np.cos(alpha) + ym*np.sin(alpha)
+    neg = r < 0
+    r[neg] = -r[neg]
+    alpha[neg] += np.pi
+    alpha = (alpha + np.pi) % (2*np.pi) - np.pi
+
+    disc = np.sqrt((cxx - cyy)**2 + 4*cxy*cxy)
+    l_perp = np.maximum(0.5*(cxx + cyy - disc), 0.)
+    l_along = 0.5*(cxx + cyy + disc)
+    if sigma is None:
+        var = l_perp/np.maximum(n - 2, 1.)
+    else:
+        var = np.full(len(n), float(sigma)**2)
+    var_alpha = var/np.maximum(l_along, 1e-9)
+    d = -xm*np.sin(alpha) + ym*np.cos(alpha)
+    cov = np.empty((len(n), 2, 2))
+    cov[:, 0, 0] = var_alpha
+    cov[:, 0, 1] = cov[:, 1, 0] = d*var_alpha
+    cov[:, 1, 1] = var/n + d*d*var_alpha
+    return alpha, r, cov
+
+
+def _project(points, alpha, r):
+    '''Projects points onto the corresponding lines'''
+    normal = np.column_stack((np.cos(alpha), np.sin(alpha)))
+    offset = np.sum(points*normal, axis=1) - r
+    return points - offset[:, None]*normal
+
+
+def _intersect(alpha1, r1, alpha2, r2):
+    '''Intersects pairs of lines given in the normal form'''
+    c1, s1, c2, s2 = np.cos(alpha1), np.sin(alpha1), np.cos(alpha2), \
+        np.sin(alpha2)
+    det = c1*s2 - s1*c2
+    return np.column_stack(((r1*s2 - r2*s1)/det, (c1*r2 - c2*r1)/det))
+
+
+def _angle_diff(a, b):
+    '''Absolute difference of two angles wrapped into [0, pi]'''
+    return np.abs((a - b + np.pi) % (2*np.pi) - np.pi)
+
+
+def extract_lines(segments, threshold=30., min_points=5,
+                  merge_angle=np.radians(3.), min_corner_angle=np.radians(30.),
+                  sigma=None):
+    '''Extracts lines and corners from the segmented scan
+
+    Parameters
+    ----------
+    segments : `Segments`
+        Segmented scan, see `segmentation.segment`
+    threshold : float, optional
+        Maximal distance from the point to the line in millimeters
+        (the default is 30)
+    min_points : int, optional
+        Minimal number of points in the line (the default is 5)
+    merge_angle : float, optional
+        Neighbouring lines of the same segment with normal angles closer than
+        this value and distances closer than `threshold` are merged
+        (the default is 3 degrees)
+    min_corner_angle : float, optional
+        Minimal angle between neighbouring lines of the same segment to
+        produce a corner (the default is 30 degrees)
+    sigma : float, optional
+        Range noise in millimeters used for covariance estimation (the default
+        is None, which implies estimation from fitting residuals)
+
+    Returns
+    -------
+    `LineFeatures`
+        Extracted lines and corners
+    '''
+    points = segments.points
+    keep = segments.counts >= min_points
+    first, last = _split(points, segments.first[keep], segments.last[keep],
+                         threshold, min_points)
+
+    seg_ids = np.searchsorted(segments.first, first, side='right') - 1
+    alpha, r, cov = _fit(points, first, last, sigma)
+    # merge collinear neighbours, chains of them are merged together
+    neighbours = (seg_ids[1:] == seg_ids[:-1]) & (first[1:] <= last[:-1])
+    similar = neighbours & \
+        (_angle_diff(alpha[1:], alpha[:-1]) < merge_angle) & \
+        (np.abs(r[1:] - r[:-1]) < threshold)
+    if similar.any():
+        group = np.concatenate(([0], np.cumsum(~similar)))
+        starts = np.flatnonzero(np.diff(np.concatenate(([-1], group))))
+        ends = np.concatenate((starts[1:], [len(group)])) - 1
+        first, last, seg_ids = first[starts], last[ends], seg_ids[starts]
+        alpha, r, cov = _fit(points, first, last, sigma)
+
+    endpoints = np.stack((_project(points[first], alpha, r),
+                          _project(points[last], alpha, r)), axis=1)
+
+    adjacent = (seg_ids[1:] == seg_ids[:-1]) & (first[1:] <= last[:-1]) & \
+        (_angle_diff(alpha[1:], alpha[:-1]) >= min_corner_angle)
+    left = np.flatnonzero(adjacent)
+    corner_lines = np.column_stack((left, left + 1))
+    corners = _intersect(alpha[left], r[left], alpha[left + 1], r[left + 1])
+
+    return LineFeatures(alpha, r, cov, endpoints, last - first + 1, seg_ids,
+                        first, last, corners, corner_lines)
@@ -0,0 +1,160 @@
+'''Concurrent startup of several sensors.
+
+Constructing `HokuyoLX` performs the connection handshake, time
+synchronization (about 1 second), information update and activation. For
+a fleet of sensors these steps are executed concurrently on a thread pool,
+so the startup time is defined by the slowest sensor instead of the sum
+of all of them. Timing of each step and failures are reported per sensor.
+
+Usage example:
+
+>>> fleet = start_fleet([('192.168.0.10', 10940), ('192.168.0.11', 10940)])
+>>> for report in fleet.reports:
+...     print(report)
+>>> front, rear = fleet.lasers
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import HokuyoException
+from .hokuyo import HokuyoLX
+
+
+class StartupReport(object):
+    '''Startup result of one sensor'''
+
+    __slots__ = ('addr', 'laser', 'error', 'timings')
+
+    def __init__(self, addr, laser=None, error=None, timings=None):
+        self.addr = addr #: Address of the sensor
+        self.laser = laser #: Connected `HokuyoLX` instance or None on failure
+        self.error = error #: Exception raised during startup or None
+        #: Durations of startup steps in seconds: 'connect', 'time_sync',
+        #: 'info', 'activate' and 'total'
+        self.timings = {} if timings is None else timings
+
+    @property
+    def ok(self):
+        '''Was the sensor started successfully?'''
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '%s(addr=%s, total=%.3f s)' % (
+                type(self).__name__, self.addr, self.timings.get('total', 0))
+        return '%s(addr=%s, error=%r)' % (type(self).__name__, self.addr,
+                                           self.error)
+
+
+class Fleet(object):
+    '''Started sensors together with their startup reports'''
+
+    def __init__(self, reports, duration):
+        self.reports = reports #: List of `StartupReport` in the input order
+        self.duration = duration #: Wall time of the whole startup in seconds
+
+    @property
+    def lasers(self):
+        '''List of `HokuyoLX` instances in the input order, None for
+        sensors which failed to start'''
+        return [report.laser for report in self.reports]
+
+    @property
+    def failed(self):
+        '''Reports of sensors which failed to start'''
+        return [report for report in self.reports if not report.ok]
+
+    def close(self):
+        '''Closes connections to all started sensors'''
+        for laser in self.lasers:
+            if laser is not None:
+                laser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return '%s(started=%d, failed=%d, duration=%.3f s)' % (
+            type(self).__name__, len(self.reports) - len(self.failed),
+            len(self.failed), self.duration)
+
+
+def _start_one(addr, activate, info, tsync, kwargs):
+    '''Performs startup steps for one sensor measuring their durations'''
+    timings = {}
+    laser = None
+    t_start = t = time.time()
+    try:
+        laser = HokuyoLX(activate=False, info=False, tsync=False, addr=addr,
+                         **kwargs)
+        timings['connect'] = time.time() - t
+        if tsync:
+            t = time.time()
+            laser.time_sync()
+            timings['time_sync'] = time.time() - t
+        if info:
+            t = time.time()
+            laser.update_info()
+            timings['info'] = time.time() - t
+        if activate:
+            t = time.time()
+            laser.activate()
+            timings['activate'] = time.time() - t
+    except Exception as err:
+        if laser is not None:
+            try:
+                laser.close()
+            except Exception:
+                pass
+        timings['total'] = time.time() - t_start
+        return StartupReport(addr, None, err, timings)
+    timings['total'] = time.time() - t_start
+    return StartupReport(addr, laser, None, timings)
+
+
+def start_fleet(addrs, activate=True, info=True, tsync=True,
+                max_workers=None, raise_errors=False, **kwargs):
+    '''Connects to several sensors and performs their startup concurrently
+
+    Parameters
+    ----------
+    addrs : list
+        Addresses `(ip, port)` of the sensors
+    activate : bool, optional
+        Switch sensors to the measurment state? (the default is True)
+    info : bool, optional
+        Update sensor information? (the default is True)
+    tsync : bool, optional
+        Perform time synchronization? (the default is True)
+    max_workers : int, optional
+        Number of threads (the default is None, which implies one thread
+        per sensor)
+    raise_errors : bool, optional
+        Close started sensors and raise `HokuyoException` if any sensor
+        failed to start (the default is False)
+    **kwargs
+        Other arguments passed to `HokuyoLX` constructor (e.g. `timeout`,
+        `multiplex`)
+
+    Returns
+    -------
+    `Fleet`
+        Started sensors and startup reports
+    '''
+    addrs = list(addrs)
+    if not addrs:
+        return Fleet([], 0.)
+    t = time.time()
+    with ThreadPoolExecutor(max_workers or len(addrs)) as pool:
+        futures = [pool.submit(_start_one, addr, activate, info, tsync,
+                               kwargs) for addr in addrs]
+        reports = [future.result() for future in futures]
+    fleet = Fleet(reports, time.time() - t)
+    if raise_errors and fleet.failed:
+        fleet.close()
+        raise HokuyoException('Failed to start sensors: %s' % ', '.join(
+            '%s (%s)' % (report.addr, report.error)
+            for report in fleet.failed))
+    return fleet
@@ -0,0 +1,349 @@
+'''Fusion of scans from several sensors into a common frame.
+
+Each sensor is described by its extrinsic pose `(x, y, theta)` in the common
+(robot) frame. Scans are aligned in time using their (converted) sensor
+timestamps: for the reference time the nearest scan of each sensor is taken
+from the short history. Optionally motion of the robot between measurment
+times is compensated using the pose interpolated by the user supplied
+function. Rotated direction tables are cached per sensor configuration and
+merged points are written into preallocated buffers in one vectorized pass.
+
+Usage example:
+
+>>> fusion = ScanFusion([(200, 0, 0), (-200, 0, np.pi)])
+>>> for fused in iter_fused([front.iter_dist(), rear.iter_dist()], fusion):
+...     print(fused.timestamp, fused.points.shape, fused.polar())
+'''
+import time
+import threading
+from collections import deque
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import numpy as np
+from .exceptions import HokuyoException
+from .icp import compose
+from .scan import Scan, filter_mask
+
+
+def _invert(pose):
+    '''Returns inverse of the pose'''
+    x, y, theta = pose
+    c, s = np.cos(theta), np.sin(theta)
+    return np.array([-c*x - s*y, s*x - c*y, -theta])
+
+
+class FusedScan(object):
+    '''Merged points of several sensors in the common frame. Arrays are
+    views into buffers of `ScanFusion` and are overwritten by the next
+    fusion unless it was called with `copy=True`.'''
+
+    __slots__ = ('points', 'dist', 'sensors', 'beams', 'timestamp',
+                 'timestamps', 'missing')
+
+    def __init__(self, points, dist, sensors, beams, timestamp, timestamps,
+                 missing):
+        self.points = points #: Array of shape `(N, 2)` with merged points
+        self.dist = dist #: Measured distances of the points
+        self.sensors = sensors #: Index of the sensor of each point
+        self.beams = beams #: Beam index of each point in its scan
+        self.timestamp = timestamp #: Reference time of the fusion
+        #: Timestamps of the used scans, None for missing sensors
+        self.timestamps = timestamps
+        self.missing = missing #: Indices of sensors without suitable scans
+
+    def __len__(self):
+        return len(self.points)
+
+    def __repr__(self):
+        return '%s(timestamp=%s, points=%d, missing=%s)' % (
+            type(self).__name__, self.timestamp, len(self), self.missing)
+
+    def polar(self, resolution=np.radians(0.25), origin=(0., 0.),
+              fill=0):
+        '''Converts merged points into the virtual 360 degree range scan
+        centred at `origin`, the nearest point is kept in every bin
+
+        Parameters
+        ----------
+        resolution : float, optional
+            Angular size of bins in radians (the default is 0.25 degrees)
+        origin : tuple, optional
+            Origin of the virtual scan in the common frame
+            (the default is `(0, 0)`)
+        fill : float, optional
+            Value of the empty bins (the default is 0)
+
+        Returns
+        -------
+        angles : ndarray
+            Angles of bin centres from -pi to pi
+        ranges : ndarray
+            Ranges of the virtual scan
+        '''
+        bins = int(np.ceil(2*np.pi/resolution))
+        rel = self.points - origin
+        ranges = np.full(bins, np.inf)
+        idx = ((np.arctan2(rel[:, 1], rel[:, 0]) + np.pi)/resolution)
+        idx = np.minimum(idx.astype(np.intp), bins - 1)
+        np.minimum.at(ranges, idx, np.hypot(rel[:, 0], rel[:, 1]))
+        ranges[np.isinf(ranges)] = fill
+        angles = -np.pi + (np.arange(bins) + 0.5)*resolution
+        return angles, ranges
+
+
+class ScanFusion(object):
+    '''Time-aligned fusion of scans from several sensors'''
+
+    def __init__(self, extrinsics, tolerance=None, history=4, motion=None,
+                 dmin=None, dmax=None):
+        '''Creates new fusion
+
+        Parameters
+        ----------
+        extrinsics : list
+            Poses `(x, y, theta)` of the sensors in the common frame,
+            millimeters and radians
+        tolerance : float, optional
+            Maximal difference between scan timestamp and reference time in
+            milliseconds, sensors without suitable scans are reported as
+            missing (the default is None, which disables the check)
+        history : int, optional
+            Number of the latest scans stored for each sensor
+            (the default is 4)
+        motion : callable, optional
+            Function which returns robot pose `(x, y, theta)` for the given
+            timestamp, e.g. interpolated odometry. If set, points are
+            compensated for the robot motion between measurment time and
+            reference time (the default is None, which disables
+            compensation)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `scan.config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `scan.config.dmax`)
+        '''
+        super(ScanFusion, self).__init__()
+        self.extrinsics = [np.array(pose, np.float64) for pose in extrinsics]
+        self.tolerance = tolerance
+        self.motion = motion
+        self.dmin = dmin
+        self.dmax = dmax
+        self._scans = [deque(maxlen=history) for _ in self.extrinsics]
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._size = 0
+        self._alloc(0)
+
+    def _alloc(self, size):
+        '''Allocates output buffers for the given number of points'''
+        self._size = size
+        self._points = np.empty((size, 2))
+        self._dist = np.empty(size)
+        self._sensors = np.empty(size, np.int16)
+        self._beams = np.empty(size, np.int32)
+
+    def _directions(self, sensor, config):
+        '''Returns cached beam directions rotated into the common frame'''
+        key = (sensor, config)
+        table = self._tables.get(key)
+        if table is None:
+            theta = self.extrinsics[sensor][2]
+            angles = config.angles + theta
+            table = self._tables[key] = (np.cos(angles), np.sin(angles))
+        return table
+
+    def add(self, sensor, scan):
+        '''Stores scan of the sensor for the following fusions
+
+        Parameters
+        ----------
+        sensor : int
+            Index of the sensor
+        scan : `Scan`
+            Scan record with converted timestamp
+        '''
+        if not isinstance(scan, Scan):
+            raise HokuyoException('Fusion requires Scan records')
+        with self._lock:
+            self._scans[sensor].append(scan)
+
+    def _select(self, t):
+        '''Returns the nearest scan of each sensor for the given time'''
+        selected = []
+        with self._lock:
+            if t is None:
+                stamps = [scans[-1].timestamp for scans in self._scans
+                          if scans]
+                if not stamps:
+                    raise HokuyoException('No scans to fuse')
+                t = max(stamps)
+            for scans in self._scans:
+                best = None
+                if scans:
+                    best = min(scans, key=lambda s: abs(s.timestamp - t))
+                    if self.tolerance is not None and \
+                            abs(best.timestamp - t) > self.tolerance:
+                        best = None
+                selected.append(best)
+        return t, selected
+
+    def fuse(self, t=None, copy=False):
+        '''Merges the nearest in time scans of all sensors
+
+        Parameters
+        ----------
+        t : int, optional
+            Reference time (the default is None, which implies timestamp of
+            the latest stored scan)
+        copy : bool, optional
+            Copy resulting arrays instead of returning views into reused
+            buffers (the default is False)
+
+        Returns
+        -------
+        `FusedScan`
+            Merged points in the common frame
+        '''
+        t, selected = self._select(t)
+        total = sum(len(scan.dist) for scan in selected if scan is not None)
+        if total > self._size:
+            self._alloc(total)
+        ref = None if self.motion is None else _invert(self.motion(t))
+        n = 0
+        timestamps, missing = [], []
+        for sensor, scan in enumerate(selected):
+            if scan is None:
+                timestamps.append(None)
+                missing.append(sensor)
+                continue
+            timestamps.append(scan.timestamp)
+            config = scan.config
+            dist = scan.dist
+            beams = np.flatnonzero(filter_mask(
+                dist, None, *config.limits(self.dmin, self.dmax)))
+            k = len(beams)
+            cos, sin = self._directions(sensor, config)
+            pose = self.extrinsics[sensor]
+            out = self._points[n:n + k]
+            d = self._dist[n:n + k]
+            d[:] = dist[beams]
+            if ref is not None:
+                rel = compose(ref, self.motion(scan.timestamp))
+                pose = compose(rel, pose)
+                dtheta = pose[2] - self.extrinsics[sensor][2]
+                c, s = np.cos(dtheta), np.sin(dtheta)
+                x = d*(c*cos[beams] - s*sin[beams])
+                y = d*(s*cos[beams] + c*sin[beams])
+                np.add(x, pose[0], out=out[:, 0])
+                np.add(y, pose[1], out=out[:, 1])
+            else:
+                np.multiply(d, cos[beams], out=out[:, 0])
+                np.multiply(d, sin[beams], out=out[:, 1])
+                out += pose[:2]
+            self._sensors[n:n + k] = sensor
+            self._beams[n:n + k] = beams
+            n += k
+        arrays = (self._points[:n], self._dist[:n], self._sensors[:n],
+                  self._beams[:n])
+        if copy:
+            arrays = [a.copy() for a in arrays]
+        return FusedScan(*(tuple(arrays) + (t, timestamps, missing)))
+
+
+def iter_fused(iterators, fusion, reference=0, copy=False, on_stop=None,
+               timeout=1.):
+    '''Reads scans from the given iterators in background threads and
+    yields fused scans each time the reference sensor produces a scan.
+
+    When the consumer stops iteration (closes the generator or raises),
+    reader threads finish after recieving the next scan of their sensor,
+    close their iterators and call `on_stop` handlers. The generator waits
+    for them at most `timeout` seconds; sensors must not be used until
+    their readers have finished, i.e. until their handlers are called
+
+    Parameters
+    ----------
+    iterators : list
+        Scan iterators of the sensors in the order of `fusion.extrinsics`,
+        e.g. `HokuyoLX.iter_dist` generators
+    fusion : `ScanFusion`
+        Fusion instance
+    reference : int, optional
+        Index of the sensor which triggers fusion (the default is 0)
+    copy : bool, optional
+        Copy resulting arrays (the default is False)
+    on_stop : list, optional
+        Callables (or None) for each sensor called by its reader after
+        the interrupted iteration, e.g. `HokuyoLX.standby` to stop
+        the measurment (the default is None)
+    timeout : float, optional
+        Time to wait for reader threads in seconds on exit (the default is
+        1, None means infinite waiting)
+
+    Yields
+    ------
+    `FusedScan`
+        Merged points with the reference time equal to the timestamp of
+        the reference scan
+    '''
+    if len(iterators) != len(fusion.extrinsics):
+        raise HokuyoException('Number of iterators does not match sensors')
+    if on_stop is not None and len(on_stop) != len(iterators):
+        raise HokuyoException('Number of stop handlers does not match '
+                              'sensors')
+    ready = queue.Queue()
+    stop = threading.Event()
+
+    def reader(sensor, iterator):
+        interrupted = False
+        try:
+            for scan in iterator:
+                if stop.is_set():
+                    interrupted = True
+                    break
+                fusion.add(sensor, scan)
+                if sensor == reference:
+                    ready.put(scan.timestamp)
+        except Exception as err:
+            ready.put(err)
+            return
+        finally:
+            # generators are closed in their own thread, closing them from
+            # the consumer thread fails while they are blocked in reading
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            handler = None if on_stop is None else on_stop[sensor]
+            if interrupted and handler is not None:
+                handler()
+        if sensor == reference:
+            ready.put(None)
+
+    threads = [threading.Thread(target=reader, args=(i, it))
+               for i, it in enumerate(iterators)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        while True:
+            t = ready.get()
+            if t is None:
+                break
+            if isinstance(t, Exception):
+                raise t
+            # skip stale triggers if fusion lags behind the reference sensor
+            while not ready.empty():
+                item = ready.queue[0]
+                if item is None or isinstance(item, Exception):
+                    break
+                t = ready.get()
+            yield fusion.fuse(t, copy)
+    finally:
+        stop.set()
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else
+                        max(deadline - time.time(), 0))
@@ -1,12 +1,26 @@
 '''HokuyoLX class code'''
+import re
 import socket
+import select
 import logging
 import time
+import threading
 import numpy as np
 from codecs import encode, decode
+from collections import deque
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from .exceptions import HokuyoException, HokuyoStatusException
 from .exceptions import HokuyoChecksumMismatch
+from .dispatcher import Dispatcher, Reply, split_frames
+from .echoes import MultiEcho
+from .scan import Scan, ScanConfig, filter_mask, filter_scan
+from .scan import DMAX_2CHAR, clip_dmax
+from .subscription import Subscription
 from .statuses import activation_statuses, laser_states, tsync_statuses
+from .statuses import motor_speed_statuses, sensitivity_statuses
 
 class HokuyoLX(object):
     '''Class for working with Hokuyo laser rangefinders, specifically
@@ -24,13 +38,21 @@ class HokuyoLX(object):
     tzero = 0 #: Sensor start time
     tn = 0 #: Sensor timestamp overflow counter
     convert_time = True #: To convert timestamps to UNIX time or not?
+    two_char = True #: Use 2-char encoding when filtering parameters allow it?
+    #: Maximum distance which fits into 2-char encoding
+    dmax_2char = DMAX_2CHAR
+    multiplex = False #: Route recieved frames using background dispatcher?
+    #: Decimation levels `(grouping, skips)` used by `iter_adaptive`
+    adaptive_levels = ((0, 0), (0, 1), (2, 1), (2, 3), (4, 3))
 
     _sock = None #: TCP connection socket to the sensor
     _logger = None #: Logger instance for performing logging operations
+    _dispatcher = None #: Dispatcher instance used in the multiplexing mode
+    _recv_time = None #: Host time of recieving the last read frame
 
     def __init__(self, activate=True, info=True, tsync=True, addr=None,
                  buf=512, timeout=5, time_tolerance=300, logger=None,
-                 convert_time=True):
+                 convert_time=True, multiplex=False):
         '''Creates new object for communications with the sensor.
 
         Parameters
@@ -57,6 +79,10 @@ class HokuyoLX(object):
             Logger instance, if none is provided new instance is created
         convert_time : bool
             Convert timestamps to UNIX time?
+        multiplex : bool, optional
+            Enable multiplexing mode in which background dispatcher owns
+            the socket reader, this allows to perform requests while
+            continous measurment is running (the default is False)
         '''
         super(HokuyoLX, self).__init__()
         if addr is not None:
@@ -66,6 +92,12 @@ class HokuyoLX(object):
         self._logger = logging.getLogger('hokuyo') if logger is None else logger
         self.time_tolerance = time_tolerance
         self.convert_time = convert_time
+        self.multiplex = multiplex
+        self._send_lock = threading.Lock()
+        self._frames = deque()
+        self._frame_times = deque()
+        self._rbuf = b''
+        self._meas_stream = None
         self._connect_to_laser(False)
         if tsync:
             self.time_sync()
@@ -100,6 +132,17 @@ class HokuyoLX(object):
         return sum([(ord(char) - 0x30) << (6*(len(chars) - i - 1))
                     for i, char in enumerate(chars)])
 
+    @staticmethod
+    def _convert2array(raw, chars=3):
+        '''Converts given bytes to array of integers using 6 bit encoding
+        with `chars` characters per value'''
+        codes = (np.frombuffer(raw, np.uint8) - 0x30).reshape((-1, chars))
+        values = codes[:, 0].astype(np.uint32)
+        for i in range(1, chars):
+            values <<= 6
+            values |= codes[:, i]
+        return values
+
     def _convert2ts(self, chars, convert=None):
         '''Converts sensor timestamp in the form of chars to
         the UNIX timestamp. If resulting timestamp differs from local timestamp
@@ -140,9 +183,46 @@ class HokuyoLX(object):
             self._sock.connect(self.addr)
         except socket.timeout:
             raise HokuyoException('Failed to connect to the sensor')
+        self._frames.clear()
+        self._frame_times.clear()
+        self._rbuf = b''
+        if self.multiplex:
+            self.start_multiplex()
+
+    def start_multiplex(self):
+        '''Starts background dispatcher which owns the socket reader and
+        routes each recieved frame by its echoed header: scan frames are
+        passed to the running continous measurment, command replies to
+        the pending requests. This allows to perform requests (e.g.
+        `laser_state` or `get_dist`) while continous measurment is running
+        and to pipeline several requests using `submit_req`, `submit_dist`
+        and `submit_intens` methods.'''
+        if self._sock is None:
+            raise HokuyoException('Not connected to the laser')
+        self.multiplex = True
+        if self._dispatcher is not None and self._dispatcher.running:
+            return
+        self._logger.info('Starting multiplexing mode')
+        self._dispatcher = Dispatcher(self._sock, self.buf, self._logger)
+        data = b''.join(frame + b'\n\n' for frame in self._frames)
+        self._frames.clear()
+        self._frame_times.clear()
+        self._dispatcher.start(data + self._rbuf)
+        self._rbuf = b''
+
+    def stop_multiplex(self):
+        '''Stops background dispatcher and switches back to the direct
+        reading from the socket'''
+        self.multiplex = False
+        if self._dispatcher is None:
+            return
+        self._logger.info('Stopping multiplexing mode')
+        self._dispatcher.stop()
+        self._rbuf = self._dispatcher.leftover + self._rbuf
+        self._dispatcher = None
 
-    def _send_cmd(self, cmd, params='', string=''):
-        '''Sends given command to the sensor'''
+    def _format_cmd(self, cmd, params='', string=''):
+        '''Checks given command and formats request string'''
         if not (len(cmd) == 2 or (cmd[0] == '%' and len(cmd) == 3)):
             raise HokuyoException(
                 'Command must be two chars string '
@@ -153,13 +233,46 @@ class HokuyoLX(object):
         req = cmd + params
         if string:
             req += ';' + string
+        return req
+
+    def _send_cmd(self, cmd, params='', string=''):
+        '''Sends given command to the sensor'''
+        return self._send_raw(self._format_cmd(cmd, params, string))
+
+    def _send_raw(self, req):
+        '''Sends formatted request string to the sensor'''
         if self._sock is None:
             raise HokuyoException('Not connected to the laser')
-        n = self._sock.send(encode(req, 'ascii') + b'\n')
+        with self._send_lock:
+            n = self._sock.send(encode(req, 'ascii') + b'\n')
         if len(req) + 1 != n:
             raise HokuyoException('Failed to send all data to the sensor')
         return req
 
+    def _read_frame(self):
+        '''Reads one complete frame from the socket, frames which were
+        recieved together with the previous one are returned first. Host
+        time of recieving the frame end is stored in `self._recv_time`.'''
+        while not self._frames:
+            self._feed(self._sock.recv(self.buf))
+        self._recv_time = self._frame_times.popleft()
+        return self._frames.popleft()
+
+    def _feed(self, data):
+        '''Splits recieved data into frames and queues them'''
+        if not data:
+            raise HokuyoException('Connection closed by the sensor')
+        recv_time = time.time()*1000
+        frames, self._rbuf = split_frames(self._rbuf + data)
+        self._frames.extend(frames)
+        self._frame_times.extend([recv_time]*len(frames))
+
+    def _read_buffered(self):
+        '''Queues frames from data already waiting in the socket buffer
+        without blocking'''
+        while select.select([self._sock], [], [], 0)[0]:
+            self._feed(self._sock.recv(self.buf))
+
     def _recv(self, header=None):
         '''Recieves data from the sensor and checks recieved data block
         using given header.'''
@@ -168,11 +281,9 @@ class HokuyoLX(object):
             raise HokuyoException('Not connected to the laser')
         try:
             while True:
-                data = b''
-                while not data.endswith(b'\n\n'):
-                    data += self._sock.recv(self.buf)
+                data = self._read_frame()
                 self._logger.debug('Recieved data: %s' % data)
-                split_data = decode(data[:-2], 'ascii').split('\n')
+                split_data = decode(data, 'ascii').split('\n')
                 if header is not None and split_data[0] != header:
                     self._logger.warning(
                         'Discarded data due header mismatch: %s' % data)
@@ -182,25 +293,113 @@ class HokuyoLX(object):
             raise HokuyoException('Connection timeout')
         return split_data
 
+    def _process_resp(self, header, resp):
+        '''Checks header of the recieved response and extracts its status'''
+        resp = list(resp)
+        if resp.pop(0) != header:
+            raise HokuyoException('Response header mismatch')
+        status_str = resp.pop(0)
+        status = self._check_sum(status_str)
+        self._logger.debug('Got response with status %s', status)
+        return status, resp
+
     def _send_req(self, cmd, params='', string=''):
         '''Sends given command to the sensor and awaits response to it.'''
         self._logger.debug(
             'Performing request; cmd: %s, params: %s, string: %s',
             cmd, params, string)
+        if self._dispatcher is not None:
+            return self.submit_req(cmd, params, string).result()
         header = self._send_cmd(cmd, params, string)
         resp = self._recv(header)
-        if resp.pop(0) != header:
-            raise HokuyoException('Response header mismatch')
-        status_str = resp.pop(0)
-        status = self._check_sum(status_str)
-        self._logger.debug('Got response with status %s', status)
-        return status, resp
+        return self._process_resp(header, resp)
+
+    def submit_req(self, cmd, params='', string=''):
+        '''Sends given command to the sensor without waiting for the response.
+        Valid only in the multiplexing mode.
+
+        Parameters
+        ----------
+        cmd : str
+            Command name
+        params : str, optional
+            Command parameters
+        string : str, optional
+            Command string part
+
+        Returns
+        -------
+        `Reply`
+            Future-like object, its `result()` returns status and
+            response lines
+        '''
+        if self._dispatcher is None:
+            raise HokuyoException('Multiplexing mode is not enabled')
+        header = self._format_cmd(cmd, params, string)
+        future = self._dispatcher.request(header)
+        try:
+            self._send_raw(header)
+        except Exception:
+            future.cancel()
+            raise
+        return Reply(future, lambda resp: self._process_resp(header, resp),
+                     self.timeout)
+
+    def _open_stream(self, prefix):
+        '''Registers stream of frames with the given header prefix in
+        the multiplexing mode, returns None otherwise'''
+        if self._dispatcher is None:
+            return None
+        return self._dispatcher.open_stream(prefix)
+
+    def _close_stream(self, prefix, stream):
+        '''Unregisters stream opened by `_open_stream`'''
+        if stream is not None and self._dispatcher is not None:
+            self._dispatcher.close_stream(prefix)
+
+    def _recv_stream(self, stream):
+        '''Recieves next frame of the continous measurment, returns its
+        lines and host time of recieving'''
+        if stream is None:
+            data = self._recv()
+            return data, self._recv_time
+        try:
+            data = stream.get(timeout=self.timeout)
+        except queue.Empty:
+            raise HokuyoException('Connection timeout')
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    def _frame_buffered(self, stream):
+        '''Checks if the next frame of the continous measurment is already
+        recieved (or at least its beginning is waiting in the socket buffer)'''
+        if stream is not None:
+            return not stream.empty()
+        if self._frames:
+            return True
+        ready, _, _ = select.select([self._sock], [], [], 0)
+        return bool(ready)
+
+    def _wait_frame(self, timeout):
+        '''Waits until the next frame of the running continous measurment is
+        recieved (or at least its beginning is waiting in the socket buffer),
+        returns False if nothing was recieved in `timeout` seconds'''
+        stream = self._meas_stream
+        if stream is not None:
+            return stream.wait(timeout)
+        if self._frames:
+            return True
+        ready, _, _ = select.select([self._sock], [], [], max(timeout, 0))
+        return bool(ready)
 
     #Processing and filtering scan data
 
     def get_angles(self, start=None, end=None, grouping=0):
         '''Returns array of angles for given `start`, `end` and `grouping`
         parameters and according to the sensor parameters stored inside object.
+        Returned array is a copy of the cached table, which is available
+        read-only as `get_config(start, end, grouping).angles`.
 
         Parameters
         ----------
@@ -224,49 +423,119 @@ class HokuyoLX(object):
         array([-1.17809725, -1.17591558, -1.17373392, ...,  1.17373392,
             1.17591558,  1.17809725])
         '''
-        start = self.amin if start is None else start
-        end = self.amax if end is None else end
-        grouping = 1 if grouping == 0 else grouping
+        return self.get_config(start, end, grouping).angles.copy()
+
+    def get_time_offsets(self, start=None, end=None, grouping=0):
+        '''Returns array of beam measurment times in milliseconds relative
+        to the scan timestamp for given `start`, `end` and `grouping`
+        parameters. Offsets are derived from the scanning frequency and
+        the angular resolution, returned array is cached and read-only.
+
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+
+        Returns
+        -------
+        ndarray
+            Time offsets of beams in milliseconds
+        '''
+        return self.get_config(start, end, grouping).time_offsets
 
-        num = self.amax - self.amin + 1
-        space = np.linspace(self.amin, self.amax, num) - self.aforw
-        angles = 2*np.pi*space/self.ares
-        # TODO remake grouping
-        return angles[start:end+1:grouping]
+    def get_config(self, start=None, end=None, grouping=0, skips=0,
+                   cmd='MD'):
+        '''Returns `ScanConfig` for given measurment parameters and according
+        to the sensor parameters stored inside object. Scans with the same
+        config share cached angle tables.
 
-    def _process_scan_data(self, data, with_intensity):
-        '''Converts raw scan data into ndarray with neccecary shape'''
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of skipped scans (the default is 0)
+        cmd : str, optional
+            Measurment command (the default is 'MD')
+
+        Returns
+        -------
+        `ScanConfig`
+            Measurment config
+        '''
+        return ScanConfig.from_laser(self, start, end, grouping, skips, cmd)
+
+    def _process_scan_data(self, data, with_intensity, chars=3, multi=False):
+        '''Converts raw scan data into ndarray with neccecary shape. For
+        2-char encoding distances larger than `self.dmax_2char` are saturated
+        to `self.dmax_2char + 1`.'''
         raw_data = ''.join([self._check_sum(block) for block in data])
-        if len(raw_data) % 3 != 0:
+        if multi:
+            return self._process_echoes(encode(raw_data, 'ascii'),
+                                        with_intensity)
+        if len(raw_data) % chars != 0:
             raise HokuyoException('Wrong length of scan data')
-        scan = np.array([
-            self._convert2int(raw_data[3*i:3*i+3])
-            for i in range(len(raw_data)//3)], np.uint32)
+        scan = self._convert2array(encode(raw_data, 'ascii'), chars)
         if with_intensity:
             return scan.reshape((len(scan)//2, 2))
         return scan
 
+    def _process_echoes(self, raw, with_intensity):
+        '''Converts raw multi-echo scan data into `MultiEcho` instance.
+        Echoes of one step are separated by the '&' character.'''
+        arr = np.frombuffer(raw, np.uint8)
+        sep = arr == ord('&')
+        idx = np.flatnonzero(~sep)
+        chars = 6 if with_intensity else 3
+        if len(idx) % chars != 0:
+            raise HokuyoException('Wrong length of scan data')
+        starts = idx[::chars]
+        new_beam = np.ones(len(starts), bool)
+        new_beam[starts > 0] = ~sep[starts[starts > 0] - 1]
+        offsets = np.append(np.flatnonzero(new_beam), len(starts))
+        values = self._convert2array(arr[idx].tobytes(), 3)
+        if with_intensity:
+            values = values.reshape((-1, 2))
+            return MultiEcho(values[:, 0], offsets, values[:, 1])
+        return MultiEcho(values, offsets)
+
     def _filter(self, scan, start=None, end=None, grouping=0,
                 dmin=None, dmax=None, imin=None, imax=None):
         '''Filters scan measured for given parameters and filters it for
         given `dmin`, `dmax`, `imin` and `imax`. Note that `imin` and `imax`
         should be only used for scans with intensities'''
-        angles = self.get_angles(start, end, grouping)
-        if scan.ndim == 1:
-            tpl = (angles, scan)
-        elif scan.ndim == 2:
-            tpl = (angles, scan[:, 0], scan[:, 1])
-        else:
-            raise HokuyoException('Unexpected scan dimensions')
-        data = np.vstack(tpl).T
+        angles = self.get_config(start, end, grouping).angles
         dmin = self.dmin if dmin is None else dmin
         dmax = self.dmax if dmax is None else dmax
-        data = data[(data[:, 1] >= dmin) & (data[:, 1] <= dmax)]
-        if imin is not None:
-            data = data[data[:, 2] >= imin]
-        if imax is not None:
-            data = data[data[:, 2] <= imax]
-        return data
+        return filter_scan(angles, scan, dmin, dmax, imin, imax)
+
+    def _filter_mask(self, dist, intens=None, dmin=None, dmax=None,
+                     imin=None, imax=None):
+        '''Returns boolean mask of measurments which pass filtering for
+        given `dmin`, `dmax`, `imin` and `imax`. Works with arrays
+        of any shape.'''
+        dmin = self.dmin if dmin is None else dmin
+        dmax = self.dmax if dmax is None else dmax
+        return filter_mask(dist, intens, dmin, dmax, imin, imax)
+
+    def _beams_num(self, start=None, end=None, grouping=0):
+        '''Returns number of beams in the scan measured for given parameters'''
+        start = self.amin if start is None else start
+        end = self.amax if end is None else end
+        grouping = 1 if grouping == 0 else grouping
+        return (end - start)//grouping + 1
 
     #Control of sensor state
 
@@ -352,21 +621,84 @@ class HokuyoLX(object):
 
     #Single measurments
 
-    def _single_measurment(self, with_intensity, start, end, grouping):
-        '''Generic function for taking single measurment.
-        Valid only in the measurment state.'''
+    @staticmethod
+    def _meas_cmd(single, with_intensity, chars, multi=False):
+        '''Returns measurment command for the given mode and encoding'''
+        if multi:
+            if chars != 3:
+                raise HokuyoException('Multi-echo measurments are available '
+                                      'only with 3-char encoding')
+            if single:
+                return 'HE' if with_intensity else 'HD'
+            return 'NE' if with_intensity else 'ND'
+        if chars not in (2, 3):
+            raise HokuyoException('Unsupported encoding: %s chars' % chars)
+        if with_intensity:
+            if chars != 3:
+                raise HokuyoException('Intensities are available only with '
+                                      '3-char encoding')
+            return 'GE' if single else 'ME'
+        if chars == 2:
+            return 'GS' if single else 'MS'
+        return 'GD' if single else 'MD'
+
+    def _auto_chars(self, dmax):
+        '''Chooses 2-char encoding if all distances up to `dmax` fit into it
+        and it was not found unsupported by the sensor'''
+        if self.two_char and dmax is not None and dmax <= self.dmax_2char:
+            return 2
+        return 3
+
+    def _unsupported_2char(self, err):
+        '''Checks if the given exception means that 2-char encoding commands
+        are not supported by the sensor and disables their automatic use'''
+        if err.code not in ('0E', '0F'):
+            return False
+        self._logger.warning('2-char encoding is not supported by the sensor, '
+                             'falling back to 3-char encoding')
+        self.two_char = False
+        return True
+
+    def _single_params(self, with_intensity, start, end, grouping, chars=3,
+                       multi=False):
+        '''Returns command and parameters for taking single measurment'''
         start = self.amin if start is None else start
         end = self.amax if end is None else end
         params = '%0.4d%0.4d%0.2d' % (start, end, grouping)
-        cmd = 'GE' if with_intensity else 'GD'
-        status, data = self._send_req(cmd, params)
+        cmd = self._meas_cmd(True, with_intensity, chars, multi)
+        return cmd, params
+
+    def _process_single(self, with_intensity, status, data, chars=3,
+                        multi=False):
+        '''Processes response on the single measurment request. Response
+        lines are not modified, as they can be cached by `Reply`.'''
         if status != '00':
             raise HokuyoStatusException(status)
-        timestamp = self._convert2ts(data.pop(0))
-        scan = self._process_scan_data(data, with_intensity)
+        timestamp = self._convert2ts(data[0])
+        scan = self._process_scan_data(data[1:], with_intensity, chars, multi)
         return timestamp, scan
 
-    def get_dist(self, start=None, end=None, grouping=0):
+    def _single_measurment(self, with_intensity, start, end, grouping,
+                           chars=3, multi=False):
+        '''Generic function for taking single measurment.
+        Valid only in the measurment state.'''
+        cmd, params = self._single_params(with_intensity, start, end,
+                                          grouping, chars, multi)
+        status, data = self._send_req(cmd, params)
+        return self._process_single(with_intensity, status, data, chars,
+                                    multi)
+
+    def _submit_single(self, with_intensity, start, end, grouping, chars=3,
+                       multi=False):
+        '''Generic function for requesting single measurment without waiting
+        for the response. Valid only in the multiplexing mode.'''
+        cmd, params = self._single_params(with_intensity, start, end,
+                                          grouping, chars, multi)
+        reply = self.submit_req(cmd, params)
+        return Reply(reply, lambda resp: self._process_single(
+            with_intensity, resp[0], resp[1], chars, multi), self.timeout)
+
+    def get_dist(self, start=None, end=None, grouping=0, chars=3):
         '''Measure distances for the given parameters
 
         Parameters
@@ -379,6 +711,11 @@ class HokuyoLX(object):
             which implies `self.amax`)
         grouping : int, optional
             Number of grouped steps (the default is 0, which regarded as 1)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 (`GD` command) or
+            2 (`GS` command). The latter reduces amount of transfered data
+            by a third, but distances larger than `self.dmax_2char` are
+            saturated (the default is 3)
 
         Returns
         -------
@@ -387,7 +724,7 @@ class HokuyoLX(object):
         scan : ndarray
             Array with measured distances
         '''
-        return self._single_measurment(False, start, end, grouping)
+        return self._single_measurment(False, start, end, grouping, chars)
 
     def get_intens(self, start=None, end=None, grouping=0):
         '''Measure distances and intensities for the given parameters
@@ -412,8 +749,121 @@ class HokuyoLX(object):
         '''
         return self._single_measurment(True, start, end, grouping)
 
+    def get_multi_dist(self, start=None, end=None, grouping=0):
+        '''Measure distances of all echoes for the given parameters
+        (`HD` command). Supported only by sensors with multi-echo
+        capability (e.g. UTM-30LX-EW).
+
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+
+        Returns
+        -------
+        timestamp : int
+            Timestamp of the measurment
+        scan : `MultiEcho`
+            Measured distances of all echoes
+
+        Examples
+        --------
+        >>> timestamp, scan = laser.get_multi_dist()
+        >>> last = scan.last()
+        '''
+        return self._single_measurment(False, start, end, grouping,
+                                       multi=True)
+
+    def get_multi_intens(self, start=None, end=None, grouping=0):
+        '''Measure distances and intensities of all echoes for the given
+        parameters (`HE` command). Supported only by sensors with
+        multi-echo capability (e.g. UTM-30LX-EW).
+
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+
+        Returns
+        -------
+        timestamp : int
+            Timestamp of the measurment
+        scan : `MultiEcho`
+            Measured distances and intensities of all echoes
+        '''
+        return self._single_measurment(True, start, end, grouping,
+                                       multi=True)
+
+    def submit_dist(self, start=None, end=None, grouping=0, chars=3):
+        '''Requests distances measurment for the given parameters without
+        waiting for the response, which allows to pipeline several requests.
+        Valid only in the multiplexing mode.
+
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 or 2
+            (the default is 3)
+
+        Returns
+        -------
+        `Reply`
+            Future-like object, its `result()` returns timestamp and array
+            with measured distances
+
+        Examples
+        --------
+        >>> replies = [laser.submit_dist() for _ in range(3)]
+        >>> scans = [reply.result() for reply in replies]
+        '''
+        return self._submit_single(False, start, end, grouping, chars)
+
+    def submit_intens(self, start=None, end=None, grouping=0):
+        '''Requests distances and intensities measurment for the given
+        parameters without waiting for the response. Valid only in
+        the multiplexing mode.
+
+        Parameters
+        ----------
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+
+        Returns
+        -------
+        `Reply`
+            Future-like object, its `result()` returns timestamp and array
+            with measured distances and intensities
+        '''
+        return self._submit_single(True, start, end, grouping)
+
     def get_filtered_dist(self, start=None, end=None, grouping=0,
-                          dmin=None, dmax=None):
+                          dmin=None, dmax=None, chars=None):
         '''Measure distances for the given parameters and perform basic
         filtering. Returns array with angles and distances.
 
@@ -433,6 +883,10 @@ class HokuyoLX(object):
         dmax : int,  optional
             Maximum distance for filtering (the default is None,
             which implies `self.dmax`)
+        chars : int, optional
+            Number of chars used for encoding distances (the default is None,
+            which implies 2 if `dmax` does not exceed `self.dmax_2char`
+            and 3 otherwise)
 
         Returns
         -------
@@ -441,9 +895,24 @@ class HokuyoLX(object):
         scan : ndarray
             Array with measured distances and angles
         '''
-        ts, scan = self.get_dist(start, end, grouping)
+        auto = chars is None
+        chars = self._auto_chars(dmax) if auto else chars
+        try:
+            ts, scan = self.get_dist(start, end, grouping, chars)
+        except HokuyoStatusException as err:
+            if not (auto and chars == 2 and self._unsupported_2char(err)):
+                raise
+            chars = 3
+            ts, scan = self.get_dist(start, end, grouping, chars)
+        dmax = self._clip_dmax(dmax, chars)
         return ts, self._filter(scan, start, end, grouping, dmin, dmax)
 
+    def _clip_dmax(self, dmax, chars):
+        '''Clips maximum distance for filtering, so saturated values of
+        2-char encoding will be filtered out'''
+        dmax = self.dmax if dmax is None else dmax
+        return clip_dmax(dmax, chars, self.dmax_2char)
+
     def get_filtered_intens(self, start=None, end=None, grouping=0,
                             dmin=None, dmax=None, imin=None, imax=None):
         '''Measure distances and intensities for the given parameters and
@@ -486,7 +955,8 @@ class HokuyoLX(object):
 
     #Continous measurments
 
-    def _iter_meas(self, with_intensity, scans, start, end, grouping, skips):
+    def _iter_meas(self, with_intensity, scans, start, end, grouping, skips,
+                   chars=3, multi=False, max_age=None):
         '''Generic generator for taking continous measurment. If `scan` is
         equal to 0 infinite number of scans will be taken until laser is
         switched to the standby state.'''
@@ -495,18 +965,60 @@ class HokuyoLX(object):
         end = self.amax if end is None else end
         params = '%0.4d%0.4d%0.2d%0.1d%0.2d' % (start, end, grouping,
                                                 skips, scans)
-        cmd = 'ME' if with_intensity else 'MD'
+        cmd = self._meas_cmd(False, with_intensity, chars, multi)
+        req = cmd + params[:-2]
+        config = self.get_config(start, end, grouping, skips, cmd)
+        stream = self._open_stream(req)
+        self._meas_stream = stream
+        try:
+            for scan in self._scan_cycle(stream, cmd, params, req, config,
+                                         with_intensity, scans, chars, multi,
+                                         max_age):
+                yield scan
+        finally:
+            self._meas_stream = None
+            self._close_stream(req, stream)
+
+    def _iter_auto(self, dmax, chars, make_gen):
+        '''Yields scans from the generator created by `make_gen(chars)`.
+        If `chars` is None chooses encoding automatically using `dmax`
+        and falls back to 3-char encoding if 2-char is not supported.'''
+        auto = chars is None
+        chars = self._auto_chars(dmax) if auto else chars
+        gen = make_gen(chars)
+        try:
+            first = next(gen)
+        except HokuyoStatusException as err:
+            if not (auto and chars == 2 and self._unsupported_2char(err)):
+                raise
+            chars = 3
+            gen = make_gen(chars)
+            first = None
+        except StopIteration:
+            return
+        dmax = self._clip_dmax(dmax, chars)
+        if first is not None:
+            yield first, dmax
+        for scan in gen:
+            yield scan, dmax
+
+    def _scan_cycle(self, stream, cmd, params, req, config, with_intensity,
+                    scans, chars, multi, max_age=None):
+        '''Sends continous measurment request and processes scan response
+        cycle. If `max_age` is given, scans older than it are skipped
+        without decoding while newer frames are already buffered.'''
         status, _ = self._send_req(cmd, params)
         if status != '00':
             raise HokuyoStatusException(status)
         self._logger.info('Starting scan response cycle')
+        seq = 0
+        skipped = 0
         while True:
-            data = self._recv()
+            data, host_time = self._recv_stream(stream)
             self._logger.debug('Recieved data in the scan response cycle: %s' %
                               data)
             header = data.pop(0)
             # TODO add string part check for header
-            req = cmd + params[:-2]
             if not header.startswith(req):
                 raise HokuyoException('Header mismatch in the scan '
                                       'response message')
@@ -520,15 +1032,33 @@ class HokuyoLX(object):
                 raise HokuyoStatusException(status)
             timestamp = self._convert2ts(data.pop(0))
 
-            scan = self._process_scan_data(data, with_intensity)
+            last = pending == 0 and scans != 0
+            if max_age is not None and not last:
+                now = time.time()*1000
+                age = now - (timestamp if self.convert_time else host_time)
+                if age > max_age and self._frame_buffered(stream):
+                    self._logger.debug('Skipping stale scan, age: %d ms',
+                                       age)
+                    skipped += 1
+                    seq += 1
+                    continue
+
+            scan = self._process_scan_data(data, with_intensity, chars, multi)
             self._logger.info('Got new scan, yielding...')
-            yield (scan, timestamp, pending)
+            if multi:
+                yield (scan, timestamp, pending)
+            else:
+                yield Scan(scan, timestamp, config, pending, seq, host_time,
+                           time.time()*1000, skipped)
+            skipped = 0
+            seq += 1
 
-            if pending == 0 and scans != 0:
+            if last:
                 self._logger.info('Last scan recieved, exiting generator')
                 break
 
-    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0):
+    def iter_dist(self, scans=0, start=None, end=None, grouping=0, skips=0,
+                  chars=3, max_age=None):
         '''Generator for taking continous measurment of distances. If `scan` is
         equal to 0 infinite number of scans will be taken until laser is
         switched to the standby state.
@@ -549,17 +1079,31 @@ class HokuyoLX(object):
         skips : int, optional
             Number of scans to skip (the default is 0, 0 means all scans
             will be yielded, 1 - every second, 2 - every third, etc.)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 (`MD` command) or
+            2 (`MS` command). The latter reduces amount of transfered data
+            by a third, but distances larger than `self.dmax_2char` are
+            saturated (the default is 3)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
 
         Yields
         -------
-        timestamp : int
-            Timestamp of the measurment
-        scan : ndarray
-            Array with measured distances
+        `Scan`
+            Measured scan, can be unpacked into array with measured
+            distances, timestamp of the measurment and number of
+            pending scans
         '''
-        return self._iter_meas(False, scans, start, end, grouping, skips)
+        return self._iter_meas(False, scans, start, end, grouping, skips,
+                               chars, max_age=max_age)
 
-    def iter_intens(self, scans=0, start=None, end=None, grouping=0, skips=0):
+    def iter_intens(self, scans=0, start=None, end=None, grouping=0, skips=0,
+                    max_age=None):
         '''Generator for taking continous measurment of distances and
         intensities. If `scan` is equal to 0 infinite number of scans will be
         taken until laser is switched to the standby state.
@@ -580,18 +1124,114 @@ class HokuyoLX(object):
         skips : int, optional
             Number of scans to skip (the default is 0, 0 means all scans
             will be yielded, 1 - every second, 2 - every third, etc.)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
+
+        Yields
+        -------
+        `Scan`
+            Measured scan, can be unpacked into array with measured
+            distances and intensities, timestamp of the measurment and
+            number of pending scans
+        '''
+        return self._iter_meas(True, scans, start, end, grouping, skips,
+                               max_age=max_age)
+
+    def iter_multi_dist(self, scans=0, start=None, end=None, grouping=0,
+                        skips=0, max_age=None):
+        '''Generator for taking continous measurment of distances of all
+        echoes (`ND` command). Supported only by sensors with multi-echo
+        capability (e.g. UTM-30LX-EW). If `scan` is equal to 0 infinite number
+        of scans will be taken until laser is switched to the standby state.
+
+        Parameters
+        ----------
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
 
         Yields
         -------
+        scan : `MultiEcho`
+            Measured distances of all echoes
         timestamp : int
             Timestamp of the measurment
-        scan : ndarray
-            Array with measured distances and intensities
+        pending : int
+            Number of pending scans
         '''
-        return self._iter_meas(True, scans, start, end, grouping, skips)
+        return self._iter_meas(False, scans, start, end, grouping, skips,
+                               multi=True, max_age=max_age)
+
+    def iter_multi_intens(self, scans=0, start=None, end=None, grouping=0,
+                          skips=0, max_age=None):
+        '''Generator for taking continous measurment of distances and
+        intensities of all echoes (`NE` command). Supported only by sensors
+        with multi-echo capability (e.g. UTM-30LX-EW). If `scan` is equal to 0
+        infinite number of scans will be taken until laser is switched to
+        the standby state.
+
+        Parameters
+        ----------
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
+
+        Yields
+        -------
+        scan : `MultiEcho`
+            Measured distances and intensities of all echoes
+        timestamp : int
+            Timestamp of the measurment
+        pending : int
+            Number of pending scans
+        '''
+        return self._iter_meas(True, scans, start, end, grouping, skips,
+                               multi=True, max_age=max_age)
 
     def iter_filtered_dist(self, scans=0, start=None, end=None, grouping=0,
-                           skips=0, dmin=None, dmax=None):
+                           skips=0, dmin=None, dmax=None, chars=None,
+                           max_age=None):
         '''Generator for taking continous measurment of distances with
         additional filtering. If `scan` is equal to 0 infinite number of scans
         will be taken until laser is switched to the standby state.
@@ -620,22 +1260,36 @@ class HokuyoLX(object):
         dmax : int,  optional
             Maximum distance for filtering (the default is None,
             which implies `self.dmax`)
+        chars : int, optional
+            Number of chars used for encoding distances (the default is None,
+            which implies 2 if `dmax` does not exceed `self.dmax_2char`
+            and 3 otherwise)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
 
         Yields
         -------
-        timestamp : int
-            Timestamp of the measurment
         scan : ndarray
             Array with measured angles and distances
+        timestamp : int
+            Timestamp of the measurment
+        pending : int
+            Number of pending scans
         '''
-        gen = self.iter_dist(scans, start, end, grouping, skips)
-        for scan, timestamp, pending in gen:
-            scan = self._filter(scan, start, end, grouping, dmin, dmax)
+        gen = self._iter_auto(dmax, chars, lambda chars: self.iter_dist(
+            scans, start, end, grouping, skips, chars, max_age))
+        for (scan, timestamp, pending), cdmax in gen:
+            scan = self._filter(scan, start, end, grouping, dmin, cdmax)
             yield (scan, timestamp, pending)
 
     def iter_filtered_intens(self, scans=0, start=None, end=None, grouping=0,
                              skips=0, dmin=None, dmax=None,
-                             imin=None, imax=None):
+                             imin=None, imax=None, max_age=None):
         '''Generator for taking continous measurment of distances and
         intensities with additional filtering. If `scan` is equal to 0 infinite
         number of scans will be taken until laser is switched to the standby
@@ -671,20 +1325,506 @@ class HokuyoLX(object):
         imax : int,  optional
             Maximum distance for filtering (the default is None,
             which disables maximum intensity filter)
+        max_age : float, optional
+            Maximal age of the yielded scan in milliseconds. Older scans are
+            skipped without decoding if newer ones are already recieved, so
+            consumer always gets the freshest available scan. Age is measured
+            from the converted sensor timestamp or, if `self.convert_time` is
+            False, from the host time of recieving (the default is None,
+            which disables skipping)
 
         Yields
         -------
-        timestamp : int
-            Timestamp of the measurment
         scan : ndarray
             Array with measured angles, distances and intensities
+        timestamp : int
+            Timestamp of the measurment
+        pending : int
+            Number of pending scans
         '''
-        gen = self.iter_intens(scans, start, end, grouping, skips)
+        gen = self.iter_intens(scans, start, end, grouping, skips, max_age)
         for scan, timestamp, pending in gen:
             scan = self._filter(scan, start, end, grouping,
                                 dmin, dmax, imin, imax)
             yield (scan, timestamp, pending)
 
+    #Adaptive continous measurments
+
+    def _backlog(self):
+        '''Returns number of recieved but not yet processed frames, in
+        the direct mode including frames waiting in the socket buffer'''
+        if self._dispatcher is not None:
+            return self._dispatcher.backlog()
+        self._read_buffered()
+        return len(self._frames)
+
+    def iter_adaptive(self, with_intensity=False, start=None, end=None,
+                      levels=None, max_lag=None, max_backlog=2, headroom=0.7,
+                      patience=5, recover=40, on_change=None, chars=3):
+        '''Generator for taking infinite continous measurment which adapts
+        decimation to the consumer speed. Consumer lag (age of the scan at
+        the moment it is recieved) and number of already buffered frames are
+        monitored, if they exceed the limits for `patience` consecutive scans
+        measurment is restarted with the next (coarser) decimation level.
+        If for `recover` consecutive scans time spent by the consumer on
+        one scan, scaled by the number of beams, fits into `headroom` part
+        of the scan period of the previous (finer) level, measurment is
+        restarted with that level. Restarting is performed by switching
+        the sensor to the standby state and reissuing the measurment
+        command.
+
+        Parameters
+        ----------
+        with_intensity : bool, optional
+            Measure intensities (`ME` command)? (the default is False)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        levels : list, optional
+            Decimation levels as `(grouping, skips)` pairs ordered from
+            the finest to the coarsest (the default is None, which implies
+            `self.adaptive_levels`)
+        max_lag : float, optional
+            Maximal lag of the scan in milliseconds (the default is None,
+            which implies two scan periods)
+        max_backlog : int, optional
+            Maximal number of buffered frames (the default is 2)
+        headroom : float, optional
+            Part of the scan period which consumer is allowed to use at
+            the finer level (the default is 0.7)
+        patience : int, optional
+            Number of consecutive overloaded scans before switching to
+            the coarser level (the default is 5)
+        recover : int, optional
+            Number of consecutive scans with enough headroom before switching
+            to the finer level (the default is 40)
+        on_change : callable, optional
+            Function called with the new level index, grouping and skips
+            on each change of the decimation level (the default is None)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 or 2 (the default
+            is 3)
+
+        Yields
+        -------
+        `Scan`
+            Measured scan, `scan.config` contains grouping and skips which
+            were used for the measurment
+        '''
+        levels = self.adaptive_levels if levels is None else levels
+        max_lag = 2000./self.scan_freq if max_lag is None else max_lag
+        cmd = self._meas_cmd(False, with_intensity, chars)
+        level = 0
+        while True:
+            grouping, skips = levels[level]
+            beams = self.get_config(start, end, grouping, skips, cmd).beams
+            if level > 0:
+                finer = levels[level - 1]
+                finer_beams = self.get_config(start, end, finer[0], finer[1],
+                                              cmd).beams
+                budget = headroom*1000.*(finer[1] + 1)/self.scan_freq
+            gen = self._iter_meas(with_intensity, 0, start, end, grouping,
+                                  skips, chars)
+            overloaded = relaxed = 0
+            new_level = level
+            try:
+                for scan in gen:
+                    ref = scan.timestamp if self.convert_time else \
+                        scan.host_time
+                    lag = time.time()*1000 - ref
+                    if lag > max_lag or self._backlog() > max_backlog:
+                        overloaded += 1
+                    else:
+                        overloaded = 0
+                    if overloaded >= patience and level + 1 < len(levels):
+                        new_level = level + 1
+                        break
+                    yielded = time.time()*1000
+                    yield scan
+                    if level == 0:
+                        continue
+                    busy = (time.time()*1000 - yielded)*finer_beams/beams
+                    relaxed = relaxed + 1 if busy < budget and \
+                        overloaded == 0 else 0
+                    if relaxed >= recover:
+                        new_level = level - 1
+                        break
+            finally:
+                gen.close()
+            if new_level == level:
+                return
+            self._logger.info('Switching decimation level %d -> %d',
+                              level, new_level)
+            self.standby()
+            level = new_level
+            if on_change is not None:
+                on_change(level, *levels[level])
+
+    #Callback-driven continous measurments
+
+    def subscribe(self, callback, executor=None, ordered=False,
+                  max_in_flight=None, skip=True, on_result=None,
+                  on_error=None, with_intensity=False, scans=0, start=None,
+                  end=None, grouping=0, skips=0, chars=3, max_age=None):
+        '''Starts continous measurment on the background thread and passes
+        every scan to `callback` executed on the given executor, so
+        processing does not delay recieving of scans. If measurment is
+        stopped by `Subscription.stop` the sensor is switched to the standby
+        state.
+
+        Parameters
+        ----------
+        callback : callable
+            Function called as `callback(scan)` with `Scan` records, it must
+            be picklable for process pools
+        executor : `concurrent.futures.Executor`, optional
+            Thread or process pool (the default is None, which means that
+            single worker thread is created)
+        ordered : bool, optional
+            Deliver results to `on_result` in the order of acquisition
+            (the default is False)
+        max_in_flight : int, optional
+            Maximal number of scans being processed at once (the default is
+            None, which means unlimited)
+        skip : bool, optional
+            Skip scans if `max_in_flight` is reached, otherwise they are
+            queued until workers finish (the default is True)
+        on_result : callable, optional
+            Function called as `on_result(scan, result)` with the result of
+            the callback (the default is None)
+        on_error : callable, optional
+            Function called as `on_error(scan, err)` if the callback raised
+            an exception (the default is None, which means that exceptions
+            are logged)
+        with_intensity : bool, optional
+            Measure intensities? (the default is False)
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 or 2, ignored if
+            `with_intensity` is True (the default is 3)
+        max_age : float, optional
+            Maximal age of the scan in milliseconds, see `iter_dist`
+            (the default is None, which disables skipping)
+
+        Returns
+        -------
+        `Subscription`
+            Started subscription
+
+        Examples
+        --------
+        >>> sub = laser.subscribe(lambda scan: scan.dist.min(),
+        ...                       on_result=lambda scan, res: print(res))
+        >>> sub.stop()
+        '''
+        if with_intensity:
+            gen = self.iter_intens(scans, start, end, grouping, skips,
+                                   max_age)
+        else:
+            gen = self.iter_dist(scans, start, end, grouping, skips, chars,
+                                 max_age)
+        sub = Subscription(gen, callback, executor, ordered, max_in_flight,
+                           skip, on_result, on_error, self.standby,
+                           self._logger)
+        return sub.start()
+
+    #Batched continous measurments
+
+    def _iter_batches(self, gen, batch_size, shape, dtype, timeout=None,
+                      process=None):
+        '''Generic generator which collects scans yielded by `gen` into
+        preallocated arrays of the given `shape` and `dtype`. Incomplete batch
+        is yielded if `timeout` seconds passed since recieving its first scan
+        (even if the stream stalls), if `gen` was exhausted or before
+        reraising its exception. If given, `process(scan, out)` function
+        stores the scan into the batch row `out`.'''
+        if batch_size < 1:
+            raise HokuyoException('Batch size must be positive')
+        batch = None
+        gen = iter(gen)
+        while True:
+            if batch is not None and timeout is not None and \
+                    not self._wait_frame(t_first + timeout - time.time()):
+                self._logger.debug('Stream stalled, yielding incomplete '
+                                   'batch of %d scans', n)
+                yield batch[:n], timestamps[:n], pendings[:n]
+                batch = None
+            try:
+                scan, timestamp, pending = next(gen)
+            except StopIteration:
+                break
+            except HokuyoException:
+                if batch is not None:
+                    yield batch[:n], timestamps[:n], pendings[:n]
+                raise
+            if batch is None:
+                batch = np.empty((batch_size, ) + shape, dtype)
+                timestamps = np.empty(batch_size, np.int64)
+                pendings = np.empty(batch_size, np.int32)
+                n = 0
+                t_first = time.time()
+            if process is None:
+                batch[n] = scan
+            else:
+                process(scan, batch[n])
+            timestamps[n] = timestamp
+            pendings[n] = pending
+            n += 1
+            if n == batch_size or (timeout is not None and
+                                   time.time() - t_first >= timeout):
+                yield batch[:n], timestamps[:n], pendings[:n]
+                batch = None
+        if batch is not None:
+            yield batch[:n], timestamps[:n], pendings[:n]
+
+    def _nan_filtered(self, scan, out, with_intensity, dmin, dmax,
+                      imin=None, imax=None):
+        '''Stores the scan into float array `out` with filtered out
+        measurments replaced by NaN'''
+        if with_intensity:
+            mask = self._filter_mask(scan[:, 0], scan[:, 1],
+                                     dmin, dmax, imin, imax)
+        else:
+            mask = self._filter_mask(scan, None, dmin, dmax)
+        out[...] = scan
+        out[~mask] = np.nan
+
+    def iter_dist_batches(self, batch_size, scans=0, start=None, end=None,
+                          grouping=0, skips=0, timeout=None, chars=3):
+        '''Generator for taking continous measurment of distances which
+        yields batches of scans stacked into arrays. If `scan` is equal to 0
+        infinite number of scans will be taken until laser is switched to
+        the standby state.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of scans in one batch
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        timeout : float, optional
+            Time in seconds after recieving the first scan of the batch after
+            which incomplete batch is yielded (the default is None, which
+            means that only full batches are yielded)
+        chars : int, optional
+            Number of chars used for encoding distances, 3 or 2
+            (the default is 3)
+
+        Yields
+        -------
+        scans : ndarray
+            Array of shape `(B, beams)` with measured distances
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps of the measurments
+        pending : ndarray
+            Array of shape `(B, )` with number of pending scans
+
+        Examples
+        --------
+        >>> for batch, timestamps, pending in laser.iter_dist_batches(40):
+        ...     print(batch.mean(axis=0))
+        '''
+        gen = self.iter_dist(scans, start, end, grouping, skips, chars)
+        shape = (self._beams_num(start, end, grouping), )
+        return self._iter_batches(gen, batch_size, shape, np.uint32, timeout)
+
+    def iter_intens_batches(self, batch_size, scans=0, start=None, end=None,
+                            grouping=0, skips=0, timeout=None):
+        '''Generator for taking continous measurment of distances and
+        intensities which yields batches of scans stacked into arrays.
+        If `scan` is equal to 0 infinite number of scans will be taken until
+        laser is switched to the standby state.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of scans in one batch
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        timeout : float, optional
+            Time in seconds after recieving the first scan of the batch after
+            which incomplete batch is yielded (the default is None, which
+            means that only full batches are yielded)
+
+        Yields
+        -------
+        scans : ndarray
+            Array of shape `(B, beams, 2)` with measured distances
+            and intensities
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps of the measurments
+        pending : ndarray
+            Array of shape `(B, )` with number of pending scans
+        '''
+        gen = self.iter_intens(scans, start, end, grouping, skips)
+        shape = (self._beams_num(start, end, grouping), 2)
+        return self._iter_batches(gen, batch_size, shape, np.uint32, timeout)
+
+    def iter_filtered_dist_batches(self, batch_size, scans=0, start=None,
+                                   end=None, grouping=0, skips=0, dmin=None,
+                                   dmax=None, timeout=None, chars=None):
+        '''Generator for taking continous measurment of distances with
+        additional filtering which yields batches of scans stacked into
+        arrays. Filtered out measurments are replaced by NaN, so all scans
+        in the batch have the same number of beams. If `scan` is equal to 0
+        infinite number of scans will be taken until laser is switched to
+        the standby state.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of scans in one batch
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        dmin : int, optional
+            Minimal distance for filtering (the default is None,
+            which implies `self.dmin`)
+        dmax : int,  optional
+            Maximum distance for filtering (the default is None,
+            which implies `self.dmax`)
+        timeout : float, optional
+            Time in seconds after recieving the first scan of the batch after
+            which incomplete batch is yielded (the default is None, which
+            means that only full batches are yielded)
+        chars : int, optional
+            Number of chars used for encoding distances (the default is None,
+            which implies 2 if `dmax` does not exceed `self.dmax_2char`
+            and 3 otherwise)
+
+        Yields
+        -------
+        scans : ndarray
+            Float array of shape `(B, beams)` with measured distances
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps of the measurments
+        pending : ndarray
+            Array of shape `(B, )` with number of pending scans
+        '''
+        gen = self._iter_auto(dmax, chars, lambda chars: self.iter_dist(
+            scans, start, end, grouping, skips, chars))
+        gen = (((scan, cdmax), ts, pending)
+               for (scan, ts, pending), cdmax in gen)
+        process = lambda item, out: self._nan_filtered(item[0], out, False,
+                                                       dmin, item[1])
+        shape = (self._beams_num(start, end, grouping), )
+        return self._iter_batches(gen, batch_size, shape, np.float64, timeout,
+                                  process)
+
+    def iter_filtered_intens_batches(self, batch_size, scans=0, start=None,
+                                     end=None, grouping=0, skips=0, dmin=None,
+                                     dmax=None, imin=None, imax=None,
+                                     timeout=None):
+        '''Generator for taking continous measurment of distances and
+        intensities with additional filtering which yields batches of scans
+        stacked into arrays. Filtered out measurments are replaced by NaN,
+        so all scans in the batch have the same number of beams. If `scan` is
+        equal to 0 infinite number of scans will be taken until laser is
+        switched to the standby state.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of scans in one batch
+        scans : int, optional
+            Number of scans to perform (the default is 0, which means infinite
+            number of scans)
+        start : int, optional
+            Position of the starting step (the default is None,
+            which implies `self.amin`)
+        end : int, optional
+            Position of the ending step (the default is None,
+            which implies `self.amax`)
+        grouping : int, optional
+            Number of grouped steps (the default is 0, which regarded as 1)
+        skips : int, optional
+            Number of scans to skip (the default is 0, 0 means all scans
+            will be yielded, 1 - every second, 2 - every third, etc.)
+        dmin : int, optional
+            Minimal distance for filtering (the default is None,
+            which implies `self.dmin`)
+        dmax : int,  optional
+            Maximum distance for filtering (the default is None,
+            which implies `self.dmax`)
+        imin : int, optional
+            Minimum intensity for filtering (the default is None,
+            which disables minimum intensity filter)
+        imax : int,  optional
+            Maximum distance for filtering (the default is None,
+            which disables maximum intensity filter)
+        timeout : float, optional
+            Time in seconds after recieving the first scan of the batch after
+            which incomplete batch is yielded (the default is None, which
+            means that only full batches are yielded)
+
+        Yields
+        -------
+        scans : ndarray
+            Float array of shape `(B, beams, 2)` with measured distances
+            and intensities
+        timestamps : ndarray
+            Array of shape `(B, )` with timestamps of the measurments
+        pending : ndarray
+            Array of shape `(B, )` with number of pending scans
+        '''
+        gen = self.iter_intens(scans, start, end, grouping, skips)
+        shape = (self._beams_num(start, end, grouping), 2)
+        process = lambda scan, out: self._nan_filtered(scan, out, True, dmin,
+                                                       dmax, imin, imax)
+        return self._iter_batches(gen, batch_size, shape, np.float64, timeout,
+                                  process)
+
     #Time synchronization methods
 
     def _tsync_cmd(self, code):
@@ -840,11 +1980,119 @@ class HokuyoLX(object):
         for key in ['dmin', 'dmax', 'ares', 'amin', 'amax', ]:
             if key.upper() in params:
                 self.__dict__[key] = params[key.upper()]
-        sfreq = params['SCAN']
-        self.scan_freq = sfreq//60 if sfreq % 60 == 0 else sfreq/60
+        self._set_scan_freq(params['SCAN'])
         self.aforw = params['AFRT']
         self.model = params['MODL']
 
+    #Measurment settings
+
+    def _set_scan_freq(self, rpm):
+        '''Updates `scan_freq` for the given motor speed in rpm, configs
+        created after it get new timing tables'''
+        self.scan_freq = rpm//60 if rpm % 60 == 0 else rpm/60
+
+    @staticmethod
+    def _parse_speed(value):
+        '''Extracts motor speed in rpm from the `SCSP` value of the sensor
+        state, e.g. `Initial(2400[rpm])`'''
+        if isinstance(value, int):
+            return value
+        match = re.search(r'(\d+)\s*\[rpm\]', value) or \
+            re.search(r'\d+', value)
+        if match is None:
+            raise HokuyoException('Unable to parse motor speed: %s' % value)
+        return int(match.group(1) if match.groups() else match.group(0))
+
+    def motor_speed(self):
+        '''Returns current motor speed in rpm reported by the sensor and
+        updates `scan_freq` accordingly'''
+        state = self.sensor_state()
+        if 'SCSP' not in state:
+            raise HokuyoException('Sensor does not report motor speed')
+        rpm = self._parse_speed(state['SCSP'])
+        self._set_scan_freq(rpm)
+        return rpm
+
+    def set_motor_speed(self, ratio=0, verify=True):
+        '''Changes motor speed (scanning frequency) of the sensor. After
+        the change actual speed is read from the sensor and `scan_freq` is
+        updated, so configs of the following measurments get new beam
+        timing tables and scan periods. The command is valid in the standby
+        state only, so the sensor is switched to it first.
+
+        Parameters
+        ----------
+        ratio : int, optional
+            Speed ratio: 0 - default speed, from 1 to 10 - decreased speed
+            levels, 99 - reset to the initial speed (the default is 0)
+        verify : bool, optional
+            Raise `HokuyoException` if the sensor accepted the command but
+            reported unchanged speed (the default is True)
+
+        Returns
+        -------
+        float
+            New scanning frequency in Hz
+
+        Examples
+        --------
+        >>> laser.set_motor_speed(2)
+        38
+        >>> laser.get_config().scan_period
+        26.31578947368421
+        '''
+        if not (0 <= ratio <= 10 or ratio == 99):
+            raise HokuyoException('Invalid motor speed ratio: %s' % ratio)
+        self._logger.info('Setting motor speed ratio %d', ratio)
+        self._force_standby()
+        before = self.motor_speed() if verify else None
+        status, _ = self._send_req('CR', '%0.2d' % ratio)
+        if status not in motor_speed_statuses:
+            raise HokuyoStatusException(status)
+        if status not in ('00', '03'):
+            raise HokuyoException('Failed to set motor speed: %s (%s)' %
+                                  (motor_speed_statuses[status], status))
+        rpm = self.motor_speed()
+        if verify and status == '00' and ratio not in (0, 99) and \
+                rpm == before:
+            raise HokuyoException('Motor speed was not changed: %d rpm' % rpm)
+        self._logger.info('Motor speed: %d rpm', rpm)
+        return self.scan_freq
+
+    def high_sensitivity(self):
+        '''Returns True if the sensor reports high sensitivity measurment
+        mode'''
+        state = self.sensor_state()
+        if 'MESM' not in state:
+            raise HokuyoException('Sensor does not report measurment mode')
+        return 'high' in str(state['MESM']).lower()
+
+    def set_sensitivity(self, high=False, verify=True):
+        '''Switches between normal and high sensitivity measurment modes.
+        High sensitivity increases detection range of dark objects at
+        the cost of accuracy. The command is valid in the standby state
+        only, so the sensor is switched to it first.
+
+        Parameters
+        ----------
+        high : bool, optional
+            Enable high sensitivity mode? (the default is False)
+        verify : bool, optional
+            Read the mode back from the sensor and raise `HokuyoException` if
+            it differs from the requested one (the default is True)
+        '''
+        self._logger.info('Setting %s sensitivity mode',
+                          'high' if high else 'normal')
+        self._force_standby()
+        status, _ = self._send_req('HS', '1' if high else '0')
+        if status not in sensitivity_statuses:
+            raise HokuyoStatusException(status)
+        if status not in ('00', '02'):
+            raise HokuyoException('Failed to set sensitivity: %s (%s)' %
+                                  (sensitivity_statuses[status], status))
+        if verify and self.high_sensitivity() != bool(high):
+            raise HokuyoException('Sensitivity mode was not changed')
+
     #Service methods
 
     def reset(self):
@@ -923,6 +2171,9 @@ class HokuyoLX(object):
 
     def close(self):
         '''Disconnects from the sensor closing TCP socket'''
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+            self._dispatcher = None
         if self._sock is None:
             self._logger.info('Close: socket already closed')
             return
@@ -0,0 +1,244 @@
+'''Point-to-line ICP scan matcher for laser odometry.
+
+Correspondences are found by projective association: each point of
+the current scan is transformed into the reference scan frame and its
+bearing gives the index of the reference beam, so only a small window of
+neighbouring reference beams is searched. This exploits the angular ordering
+of the scan and avoids building a k-d tree for each scan. Poses are given as
+`(x, y, theta)` in millimeters and radians.
+
+Usage example:
+
+>>> odometry = ICPMatcher()
+>>> for scan in laser.iter_dist():
+...     result = odometry.update(scan)
+...     print(odometry.pose, result.cov)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+def compose(a, b):
+    '''Composes two poses: returns pose `b` given in the frame `a`
+    transformed into the frame in which `a` is given'''
+    x, y, theta = a
+    c, s = np.cos(theta), np.sin(theta)
+    return np.array([x + c*b[0] - s*b[1], y + s*b[0] + c*b[1],
+                     (theta + b[2] + np.pi) % (2*np.pi) - np.pi])
+
+
+class ICPResult(object):
+    '''Result of the scan matching'''
+
+    __slots__ = ('pose', 'cov', 'iterations', 'inliers', 'rmse', 'converged')
+
+    def __init__(self, pose, cov, iterations, inliers, rmse, converged):
+        self.pose = pose #: Pose of the current scan in the reference frame
+        self.cov = cov #: Covariance of the pose, shape `(3, 3)`
+        self.iterations = iterations #: Number of performed iterations
+        self.inliers = inliers #: Number of used correspondences
+        self.rmse = rmse #: Root mean square of point-to-line distances
+        self.converged = converged #: Did matching converge?
+
+    def __repr__(self):
+        return '%s(pose=%s, inliers=%d, rmse=%.2f, converged=%s)' % (
+            type(self).__name__, np.round(self.pose, 4), self.inliers,
+            self.rmse, self.converged)
+
+
+class ICPMatcher(object):
+    '''Point-to-line ICP matcher with projective data association'''
+
+    def __init__(self, max_iter=30, tol=1e-3, max_dist=300., window=3,
+                 max_neighbour_dist=200., min_inliers=20, dmin=None,
+                 dmax=None, require_converged=True):
+        '''Creates new matcher
+
+        Parameters
+        ----------
+        max_iter : int, optional
+            Maximal number of iterations (the default is 30)
+        tol : float, optional
+            Convergence threshold for the pose increment norm, translation
+            in millimeters and rotation in milliradians (the default is 1e-3)
+        max_dist : float, optional
+            Maximal point-to-point distance of correspondences in
+            millimeters (the default is 300)
+        window : int, optional
+            Number of neighbouring reference beams searched on each side of
+            the projected beam (the default is 3)
+        max_neighbour_dist : float, optional
+            Maximal distance between neighbouring reference points used for
+            normal estimation in millimeters (the default is 200)
+        min_inliers : int, optional
+            Minimal number of correspondences (the default is 20)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `scan.config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `scan.config.dmax`)
+        require_converged : bool, optional
+            Accumulate in `update` only matches which converged, otherwise
+            any match with at least `min_inliers` correspondences is
+            accumulated, including ones which reached `max_iter` or stopped
+            on a singular system (the default is True)
+        '''
+        super(ICPMatcher, self).__init__()
+        if max_iter < 1:
+            raise HokuyoException('max_iter must be positive')
+        self.max_iter = max_iter
+        self.tol = tol
+        self.max_dist = max_dist
+        self.window = window
+        self.max_neighbour_dist = max_neighbour_dist
+        self.min_inliers = min_inliers
+        self.dmin = dmin
+        self.dmax = dmax
+        self.require_converged = require_converged
+        self.pose = np.zeros(3) #: Accumulated pose updated by `update`
+        self._ref = None
+
+    def _points(self, scan, angles=None):
+        '''Converts scan into array of points aligned with beams, invalid
+        points are set to NaN. Returns points and angles.'''
+        if isinstance(scan, Scan):
+            config = scan.config
+            points = scan.points.copy()
+            angles = config.angles
+            dist = scan.dist
+            dmin, dmax = config.limits(self.dmin, self.dmax)
+        else:
+            if angles is None:
+                raise HokuyoException('Angles are required for raw scans')
+            dist = np.asarray(scan)
+            if dist.ndim == 2:
+                dist = dist[:, 0]
+            points = np.column_stack((dist*np.cos(angles),
+                                      dist*np.sin(angles)))
+            dmin, dmax = self.dmin, self.dmax
+        points[~filter_mask(dist, None, dmin, dmax)] = np.nan
+        return points, np.asarray(angles)
+
+    def set_reference(self, scan, angles=None):
+        '''Sets reference scan and precomputes its normals
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        angles : ndarray, optional
+            Beam angles, required if `scan` is an array
+        '''
+        points, angles = self._points(scan, angles)
+        tangent = np.full_like(points, np.nan)
+        tangent[1:-1] = points[2:] - points[:-2]
+        length = np.hypot(tangent[:, 0], tangent[:, 1])
+        with np.errstate(invalid='ignore'):
+            bad = ~(length <= 2*self.max_neighbour_dist) | (length == 0)
+        length[bad] = np.nan
+        normals = np.column_stack((-tangent[:, 1], tangent[:, 0]))
+        normals /= length[:, None]
+        self._ref = (points, normals, angles[0],
+                     (angles[-1] - angles[0])/max(len(angles) - 1, 1))
+
+    def match(self, scan, guess=None, angles=None):
+        '''Matches scan against the reference scan
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        guess : tuple, optional
+            Initial guess of the scan pose in the reference frame
+            (the default is None, which implies `(0, 0, 0)`)
+        angles : ndarray, optional
+            Beam angles, required if `scan` is an array
+
+        Returns
+        -------
+        `ICPResult`
+            Matching result
+        '''
+        if self._ref is None:
+            raise HokuyoException('Reference scan is not set')
+        ref, normals, a0, da = self._ref
+        points, _ = self._points(scan, angles)
+        points = points[~np.isnan(points[:, 0])]
+        pose = np.zeros(3) if guess is None else np.array(guess, np.float64)
+        offsets = np.arange(-self.window, self.window + 1)
+        n_ref = len(ref)
+        cov = np.full((3, 3), np.inf)
+        converged = False
+        inliers, rmse = 0, np.inf
+        iteration = 0
+        for iteration in range(1, self.max_iter + 1):
+            c, s = np.cos(pose[2]), np.sin(pose[2])
+            rot = np.column_stack((c*points[:, 0] - s*points[:, 1],
+                                   s*points[:, 0] + c*points[:, 1]))
+            moved = rot + pose[:2]
+            bearing = np.arctan2(moved[:, 1], moved[:, 0])
+            beam = np.rint((bearing - a0)/da).astype(np.intp)
+            cand = beam[:, None] + offsets
+            cand_ok = (cand >= 0) & (cand < n_ref)
+            cand = np.clip(cand, 0, n_ref - 1)
+            diff = ref[cand] - moved[:, None, :]
+            dist2 = diff[:, :, 0]**2 + diff[:, :, 1]**2
+            dist2[~cand_ok | np.isnan(normals[cand, 0])] = np.inf
+            dist2[np.isnan(dist2)] = np.inf
+            best = np.argmin(dist2, axis=1)
+            rows = np.arange(len(points))
+            ok = dist2[rows, best] <= self.max_dist**2
+            inliers = int(ok.sum())
+            if inliers < self.min_inliers:
+                break
+            idx = cand[rows, best][ok]
+            n = normals[idx]
+            err = np.sum(n*(moved[ok] - ref[idx]), axis=1)
+            jac = np.column_stack((n[:, 0], n[:, 1],
+                                   n[:, 1]*rot[ok, 0] - n[:, 0]*rot[ok, 1]))
+            hess = jac.T.dot(jac)
+            try:
+                delta = -np.linalg.solve(hess, jac.T.dot(err))
+            except np.linalg.LinAlgError:
+                break
+            pose += delta
+            rmse = float(np.sqrt(np.mean(err**2)))
+            var = np.sum(err**2)/max(inliers - 3, 1)
+            cov = var*np.linalg.inv(hess)
+            if np.hypot(delta[0], delta[1]) + 1000*abs(delta[2]) < self.tol:
+                converged = True
+                break
+        pose[2] = (pose[2] + np.pi) % (2*np.pi) - np.pi
+        return ICPResult(pose, cov, iteration, inliers, rmse, converged)
+
+    def update(self, scan, guess=None, angles=None):
+        '''Matches scan against the previous one, accumulates resulting pose
+        increment into `self.pose` and makes the scan new reference. The first
+        scan only becomes reference. Failed matches (see `require_converged`)
+        are not accumulated, so `self.pose` is not corrupted by them.
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        guess : tuple, optional
+            Initial guess of the increment (the default is None, which
+            implies `(0, 0, 0)`)
+        angles : ndarray, optional
+            Beam angles, required if `scan` is an array
+
+        Returns
+        -------
+        `ICPResult`
+            Matching result, None for the first scan
+        '''
+        result = None
+        if self._ref is not None:
+            result = self.match(scan, guess, angles)
+            if result.converged or (not self.require_converged and
+                                    result.inliers >= self.min_inliers):
+                self.pose = compose(self.pose, result.pose)
+        self.set_reference(scan, angles)
+        return result
@@ -0,0 +1,208 @@
+'''Log-odds occupancy grid built from scans.
+
+Rays of all beams are traversed at once: sample points along each ray are
+generated with a single vectorized pass (DDA with sub-cell step), converted
+to cell indices and accumulated into the grid in place. All distances and
+coordinates are in millimeters, angles in radians.
+
+Usage example:
+
+>>> grid = OccupancyGrid((2000, 2000), resolution=50)
+>>> for scan in laser.iter_dist():
+...     grid.update(scan, pose=(x, y, theta))
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+class OccupancyGrid(object):
+    '''Fixed-size 2D occupancy grid storing log-odds of cell occupancy.
+    Grid can be used as a scrolling window for robot-centred maps.'''
+
+    def __init__(self, shape=(1000, 1000), resolution=50., origin=None,
+                 l_occ=0.85, l_free=-0.4, l_min=-4., l_max=4.,
+                 dtype=np.float32, scale=100., step=0.5, auto_scroll=False,
+                 margin=0.25):
+        '''Creates new empty grid
+
+        Parameters
+        ----------
+        shape : tuple, optional
+            Number of cells along Y and X axes (the default is (1000, 1000))
+        resolution : float, optional
+            Cell size in millimeters (the default is 50)
+        origin : tuple, optional
+            World coordinates of the grid corner (the default is None, which
+            places world origin in the center of the grid)
+        l_occ : float, optional
+            Log-odds increment for cells with returns (the default is 0.85)
+        l_free : float, optional
+            Log-odds increment for cells traversed by rays
+            (the default is -0.4)
+        l_min : float, optional
+            Minimal log-odds value (the default is -4)
+        l_max : float, optional
+            Maximal log-odds value (the default is 4)
+        dtype : dtype, optional
+            Grid dtype, `np.float32` or integer type such as `np.int16`
+            (the default is `np.float32`)
+        scale : float, optional
+            Fixed-point scale of log-odds for integer grids
+            (the default is 100)
+        step : float, optional
+            Step of the ray sampling relative to the cell size
+            (the default is 0.5)
+        auto_scroll : bool, optional
+            Scroll grid automatically to keep sensor pose in the central part
+            of the grid (the default is False)
+        margin : float, optional
+            Fraction of the grid size near the edges which triggers
+            automatic scrolling (the default is 0.25)
+        '''
+        super(OccupancyGrid, self).__init__()
+        self.shape = tuple(shape)
+        self.resolution = float(resolution)
+        if origin is None:
+            origin = (-shape[1]*self.resolution/2, -shape[0]*self.resolution/2)
+        self.origin = np.array(origin, np.float64)
+        self.dtype = np.dtype(dtype)
+        self.scale = 1. if self.dtype.kind == 'f' else float(scale)
+        self.l_occ = self._fixed(l_occ)
+        self.l_free = self._fixed(l_free)
+        self.l_min = self._fixed(l_min)
+        self.l_max = self._fixed(l_max)
+        self.step = step
+        self.auto_scroll = auto_scroll
+        self.margin = margin
+        self.grid = np.zeros(self.shape, self.dtype)
+        self._buf = np.zeros(self.shape, self.dtype)
+        self._hit_mask = np.zeros(self.shape[0]*self.shape[1], bool)
+
+    def _fixed(self, value):
+        '''Converts log-odds value into grid units'''
+        return self.dtype.type(np.round(value*self.scale)
+                               if self.dtype.kind != 'f' else value)
+
+    def log_odds(self):
+        '''Returns grid log-odds as float array'''
+        return self.grid.astype(np.float32)/self.scale
+
+    def probabilities(self):
+        '''Returns array with occupancy probabilities of the cells'''
+        return 1. - 1./(1. + np.exp(self.log_odds()))
+
+    def reset(self):
+        '''Clears the grid'''
+        self.grid[:] = 0
+
+    def world2cell(self, x, y):
+        '''Converts world coordinates into cell indices (row, column)'''
+        col = np.floor((np.asarray(x) - self.origin[0])/self.resolution)
+        row = np.floor((np.asarray(y) - self.origin[1])/self.resolution)
+        return row.astype(np.intp), col.astype(np.intp)
+
+    def _flat_keys(self, col, row):
+        '''Returns flat cell indices of the points given in the fractional
+        cell coordinates which lie inside the grid'''
+        inside = (row >= 0) & (row < self.shape[0]) & \
+            (col >= 0) & (col < self.shape[1])
+        return row[inside].astype(np.intp)*self.shape[1] + \
+            col[inside].astype(np.intp)
+
+    def recenter(self, x, y):
+        '''Scrolls grid by whole number of cells so the given world point
+        will be in its center, cells moved outside of the grid are lost and
+        new cells are cleared'''
+        row, col = self.world2cell(x, y)
+        drow = int(row) - self.shape[0]//2
+        dcol = int(col) - self.shape[1]//2
+        if drow == 0 and dcol == 0:
+            return
+        h, w = self.shape
+        self._buf[:] = 0
+        src_r = slice(max(drow, 0), min(h + drow, h))
+        dst_r = slice(max(-drow, 0), min(h - drow, h))
+        src_c = slice(max(dcol, 0), min(w + dcol, w))
+        dst_c = slice(max(-dcol, 0), min(w - dcol, w))
+        if src_r.start < src_r.stop and src_c.start < src_c.stop:
+            self._buf[dst_r, dst_c] = self.grid[src_r, src_c]
+        self.grid, self._buf = self._buf, self.grid
+        self.origin += (dcol*self.resolution, drow*self.resolution)
+
+    def _maybe_scroll(self, x, y):
+        '''Scrolls grid if the given point is too close to the grid edges'''
+        row, col = self.world2cell(x, y)
+        h, w = self.shape
+        if not (self.margin*h <= row < (1 - self.margin)*h and
+                self.margin*w <= col < (1 - self.margin)*w):
+            self.recenter(x, y)
+
+    def update(self, scan, pose=None, angles=None, dmin=None, dmax=None):
+        '''Updates grid using the given scan
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        pose : tuple, optional
+            Sensor pose `(x, y, theta)` in the world frame (the default is
+            None, which implies `(0, 0, 0)`)
+        angles : ndarray, optional
+            Beam angles, required if `scan` is an array
+            (e.g. `HokuyoLX.get_angles()`)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `scan.config.dmin` or 0)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `scan.config.dmax` or unbounded)
+        '''
+        if isinstance(scan, Scan):
+            config = scan.config
+            dist, cos, sin = scan.dist, config.cos, config.sin
+            dmin, dmax = config.limits(dmin, dmax)
+        else:
+            if angles is None:
+                raise HokuyoException('Angles are required for raw scans')
+            dist, cos, sin = np.asarray(scan), np.cos(angles), np.sin(angles)
+            if dist.ndim == 2:
+                dist = dist[:, 0]
+        x0, y0, theta = (0., 0., 0.) if pose is None else pose
+        if self.auto_scroll:
+            self._maybe_scroll(x0, y0)
+        valid = filter_mask(dist, None, dmin, dmax)
+        dist = dist[valid]/np.float32(self.resolution)
+        ct, st = np.cos(theta), np.sin(theta)
+        dx = (cos[valid]*ct - sin[valid]*st).astype(np.float32)
+        dy = (cos[valid]*st + sin[valid]*ct).astype(np.float32)
+        col0 = np.float32((x0 - self.origin[0])/self.resolution)
+        row0 = np.float32((y0 - self.origin[1])/self.resolution)
+
+        hits = self._flat_keys(col0 + dist*dx, row0 + dist*dy)
+
+        counts = np.floor(dist/self.step).astype(np.intp)
+        total = counts.sum()
+        ray = np.repeat(np.arange(len(dist)), counts)
+        offsets = np.cumsum(counts) - counts
+        t = np.arange(total, dtype=np.float32)
+        t -= offsets[ray]
+        t *= np.float32(self.step)
+        free = self._flat_keys(col0 + t*dx[ray], row0 + t*dy[ray])
+        # consecutive samples of one ray often fall into the same cell
+        if len(free):
+            keep = np.empty(len(free), bool)
+            keep[0] = True
+            np.not_equal(free[1:], free[:-1], out=keep[1:])
+            free = free[keep]
+
+        # cells with returns are not cleared by other rays
+        self._hit_mask[hits] = True
+        free = free[~self._hit_mask[free]]
+        self._hit_mask[hits] = False
+
+        # duplicate indices are harmless, since all of them assign
+        # the same value computed from the old one
+        flat = self.grid.reshape(-1)
+        flat[free] = np.maximum(flat[free] + self.l_free, self.l_min)
+        flat[hits] = np.minimum(flat[hits] + self.l_occ, self.l_max)
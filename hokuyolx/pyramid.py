@@ -0,0 +1,186 @@
+'''Minimum range queries over angular sectors of the scan.
+
+`RangePyramid` is the sparse table of the scan: level `k` holds minimal
+distances over windows of `2**k` consecutive beams, all levels are built
+in one vectorized pass with invalid returns masked as `inf`. The minimum
+over any interval of beams is the minimum of two overlapping windows of
+the same level, so closest-range queries for arbitrary sectors take
+constant time and many sectors are queried at once with fancy indexing.
+
+`SectorMinimum` handles the common case of fixed consecutive sectors
+(e.g. bearing bins of the planner): beam boundaries of sectors are cached
+per scan config and minima of all sectors are computed with a single
+`np.minimum.reduceat` call.
+
+Usage example:
+
+>>> for scan in laser.iter_dist():
+...     front = scan.pyramid.query(-np.pi/6, np.pi/6)
+...     left, right = scan.pyramid.query([0.5, -1.5], [1.5, -0.5])
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+def _masked_dist(scan, config, dmin, dmax):
+    '''Returns config and float distances with invalid returns set to
+    `inf`'''
+    if isinstance(scan, Scan):
+        config = scan.config
+        dist = scan.dist
+    else:
+        if config is None:
+            raise HokuyoException('Config is required for raw scans')
+        dist = np.asarray(scan)
+        if dist.ndim == 2:
+            dist = dist[:, 0]
+    dmin, dmax = config.limits(dmin, dmax)
+    values = dist.astype(np.float64)
+    values[~filter_mask(dist, None, dmin, dmax)] = np.inf
+    return config, values
+
+
+class RangePyramid(object):
+    '''Sparse table of minimal distances of the scan'''
+
+    def __init__(self, scan, config=None, dmin=None, dmax=None):
+        '''Builds the table
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        config : `ScanConfig`, optional
+            Config of the scan, required if `scan` is an array
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `config.dmax`)
+        '''
+        super(RangePyramid, self).__init__()
+        self.config, values = _masked_dist(scan, config, dmin, dmax)
+        n = len(values)
+        levels = max(n, 1).bit_length()
+        #: Array of shape `(levels, beams)`, element `[k, i]` is the minimal
+        #: distance over beams `i, ..., i + 2**k - 1`
+        self.table = np.full((levels, n), np.inf)
+        self.table[0] = values
+        for k in range(1, levels):
+            w = 1 << (k - 1)
+            prev = self.table[k - 1]
+            np.minimum(prev[:n - w], prev[w:], out=self.table[k, :n - w])
+
+    @property
+    def beams(self):
+        '''Number of beams'''
+        return self.table.shape[1]
+
+    def min_range(self, first, last):
+        '''Returns minimal valid distance over beams from `first` to `last`
+        inclusive, `inf` for empty intervals and intervals without valid
+        returns. Arguments can be arrays of indices.'''
+        first = np.maximum(np.asarray(first, np.intp), 0)
+        last = np.minimum(np.asarray(last, np.intp), self.beams - 1)
+        length = last - first + 1
+        empty = length <= 0
+        length = np.where(empty, 1, length)
+        first = np.where(empty, 0, first)
+        k = np.frexp(length)[1] - 1
+        result = np.minimum(self.table[k, first],
+                            self.table[k, first + length - (1 << k)])
+        result = np.where(empty, np.inf, result)
+        return result[()] if result.ndim == 0 else result
+
+    def beam_range(self, amin, amax):
+        '''Returns indices of the first and the last beam with angles
+        inside `[amin, amax]`'''
+        angles = self.config.angles
+        first = np.searchsorted(angles, amin, 'left')
+        last = np.searchsorted(angles, amax, 'right') - 1
+        return first, last
+
+    def query(self, amin, amax):
+        '''Returns closest valid distance inside the sector
+
+        Parameters
+        ----------
+        amin : float or ndarray
+            Lower sector bound in radians
+        amax : float or ndarray
+            Upper sector bound in radians
+
+        Returns
+        -------
+        float or ndarray
+            Minimal distance in millimeters, `inf` if the sector does not
+            contain valid returns
+        '''
+        return self.min_range(*self.beam_range(amin, amax))
+
+    def __repr__(self):
+        return '%s(beams=%d, levels=%d)' % (type(self).__name__, self.beams,
+                                            len(self.table))
+
+
+class SectorMinimum(object):
+    '''Closest valid distance in each of fixed consecutive sectors'''
+
+    def __init__(self, edges, dmin=None, dmax=None):
+        '''Creates new reducer
+
+        Parameters
+        ----------
+        edges : array_like
+            Increasing sector boundaries in radians, `len(edges) - 1`
+            sectors `[edges[i], edges[i + 1])` are produced
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `config.dmin`)
+        dmax : int, optional
+            Maximal valid distance (the default is None, which implies
+            `config.dmax`)
+        '''
+        super(SectorMinimum, self).__init__()
+        self.edges = np.asarray(edges, np.float64)
+        if self.edges.ndim != 1 or len(self.edges) < 2 or \
+                np.any(np.diff(self.edges) <= 0):
+            raise HokuyoException('Edges must be increasing array of at '
+                                  'least two angles')
+        self.dmin = dmin
+        self.dmax = dmax
+        self._bounds = {}
+        self._buffer = None
+
+    def bounds(self, config):
+        '''Returns cached beam boundaries of sectors and mask of empty
+        sectors for the given config'''
+        bounds = self._bounds.get(config)
+        if bounds is None:
+            index = np.searchsorted(config.angles, self.edges, 'left')
+            bounds = self._bounds[config] = (index, index[1:] == index[:-1])
+        return bounds
+
+    def __call__(self, scan, config=None):
+        '''Returns array with minimal valid distance of each sector, `inf`
+        for sectors without valid returns
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances
+        config : `ScanConfig`, optional
+            Config of the scan, required if `scan` is an array
+        '''
+        config, values = _masked_dist(scan, config, self.dmin, self.dmax)
+        index, empty = self.bounds(config)
+        n = len(values)
+        if self._buffer is None or len(self._buffer) != n + 1:
+            self._buffer = np.full(n + 1, np.inf)
+        # trailing `inf` terminates the last sector at its upper edge
+        self._buffer[:n] = values
+        result = np.minimum.reduceat(self._buffer, index)[:-1]
+        result[empty] = np.inf
+        return result
@@ -0,0 +1,199 @@
+'''Retroreflective landmark detection from scans with intensities.
+
+Intensities are normalized for range as `intens*(dist/ref_range)**exponent`
+and thresholded, candidate beams are clustered with run-length encoding over
+the beam axis (runs are also split at range jumps). Centres of all clusters
+are computed at once in closed form from cumulative sums of point
+coordinates: flat markers are represented by the centroid of their points,
+for cylindrical markers of the known radius the centroid is shifted along
+the bearing by the expected depth of the visible arc. All operations are
+vectorized over beams and clusters.
+
+Usage example:
+
+>>> for scan in laser.iter_intens():
+...     marks = detect_reflectors(scan, threshold=3000, radius=40)
+...     print(marks.points, marks.cov)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+class Reflectors(object):
+    '''Detected reflectors stored as flat arrays'''
+
+    __slots__ = ('points', 'cov', 'counts', 'first', 'last', 'intensity',
+                 'width')
+
+    def __init__(self, points, cov, counts, first, last, intensity, width):
+        self.points = points #: Array of shape `(K, 2)` with reflector centres
+        self.cov = cov #: Covariance matrices of centres, shape `(K, 2, 2)`
+        self.counts = counts #: Number of beams of each reflector
+        self.first = first #: Index of the first beam of each reflector
+        self.last = last #: Index of the last beam of each reflector
+        self.intensity = intensity #: Peak normalized intensity
+        #: Distance between the first and the last points of each reflector
+        self.width = width
+
+    def __len__(self):
+        return len(self.points)
+
+    def __repr__(self):
+        return '%s(reflectors=%d)' % (type(self).__name__, len(self))
+
+    @property
+    def ranges(self):
+        '''Distances from the sensor to reflector centres'''
+        return np.hypot(self.points[:, 0], self.points[:, 1])
+
+    @property
+    def bearings(self):
+        '''Bearings of reflector centres in radians'''
+        return np.arctan2(self.points[:, 1], self.points[:, 0])
+
+
+def _arc_depth(radius, dist):
+    '''Returns mean depth of points of the visible arc of the cylinder
+    behind its front point, points are assumed to be uniformly spaced
+    across the bearing'''
+    # visible arc is limited by tangent lines from the sensor, for sine `s`
+    # of its half-angle the mean of `cos` over uniform `sin` in `[-s, s]`
+    # is `(s*sqrt(1 - s*s) + arcsin(s))/(2*s)`
+    ratio = np.clip(radius/np.maximum(dist, radius), 0., 1.)
+    s = np.maximum(np.sqrt(1. - ratio*ratio), 1e-9)
+    mean_cos = (s*ratio + np.arcsin(s))/(2*s)
+    return radius*(1. - mean_cos)
+
+
+def detect_reflectors(scan, angles=None, threshold=2000, exponent=1.,
+                      ref_range=1000., radius=None, min_points=2,
+                      max_points=None, max_jump=100., min_width=None,
+                      max_width=None, sigma=10., dmin=None, dmax=None):
+    '''Detects retroreflective markers
+
+    Parameters
+    ----------
+    scan : `Scan` or ndarray
+        Scan record with intensities or array of shape `(N, 2)` with
+        measured distances and intensities
+    angles : ndarray, optional
+        Beam angles, required if `scan` is an array
+        (e.g. `HokuyoLX.get_angles()`)
+    threshold : float, optional
+        Minimal normalized intensity of reflector returns
+        (the default is 2000)
+    exponent : float, optional
+        Exponent of the range compensation of intensities, 0 disables
+        normalization (the default is 1)
+    ref_range : float, optional
+        Range at which normalized intensity equals the raw one in
+        millimeters (the default is 1000)
+    radius : float, optional
+        Radius of cylindrical markers in millimeters (the default is None,
+        which means flat markers)
+    min_points : int, optional
+        Minimal number of beams of the reflector (the default is 2)
+    max_points : int, optional
+        Maximal number of beams of the reflector (the default is None,
+        which means unlimited)
+    max_jump : float, optional
+        Maximal range difference between neighbouring beams of the same
+        reflector in millimeters (the default is 100)
+    min_width : float, optional
+        Minimal distance between the first and the last points of
+        the reflector (the default is None, which disables the check)
+    max_width : float, optional
+        Maximal distance between the first and the last points of
+        the reflector (the default is None, which disables the check)
+    sigma : float, optional
+        Range noise in millimeters used for covariances (the default is 10)
+    dmin : int, optional
+        Minimal valid distance (the default is None, which implies
+        `scan.config.dmin` or 0)
+    dmax : int, optional
+        Maximal valid distance (the default is None, which implies
+        `scan.config.dmax` or unbounded)
+
+    Returns
+    -------
+    `Reflectors`
+        Detected reflectors ordered by beam index
+    '''
+    if isinstance(scan, Scan):
+        config = scan.config
+        dist, intens = scan.dist, scan.intens
+        angles, cos, sin = config.angles, config.cos, config.sin
+        dmin, dmax = config.limits(dmin, dmax)
+    else:
+        if angles is None:
+            raise HokuyoException('Angles are required for raw scans')
+        scan = np.asarray(scan)
+        dist, intens = (scan[:, 0], scan[:, 1]) if scan.ndim == 2 else \
+            (scan, None)
+        cos, sin = np.cos(angles), np.sin(angles)
+    if intens is None:
+        raise HokuyoException('Reflector detection requires intensities')
+    r = dist.astype(np.float64)
+    norm = intens.astype(np.float64)
+    if exponent:
+        norm *= (r/ref_range)**exponent
+    cand = (norm >= threshold) & filter_mask(dist, None, dmin, dmax)
+
+    # run-length clustering: neighbouring candidates are linked unless
+    # there is a range jump between them
+    link = cand[:-1] & cand[1:] & (np.abs(np.diff(r)) <= max_jump)
+    starts = cand.copy()
+    starts[1:] &= ~link
+    ends = cand.copy()
+    ends[:-1] &= ~link
+    first = np.flatnonzero(starts)
+    last = np.flatnonzero(ends)
+    counts = last - first + 1
+    keep = counts >= min_points
+    if max_points is not None:
+        keep &= counts <= max_points
+    x, y = r*cos, r*sin
+    width = np.hypot(x[last] - x[first], y[last] - y[first])
+    if min_width is not None:
+        keep &= width >= min_width
+    if max_width is not None:
+        keep &= width <= max_width
+    first, last, counts, width = first[keep], last[keep], counts[keep], \
+        width[keep]
+
+    csum = np.zeros((len(r) + 1, 2))
+    np.cumsum(np.column_stack((x, y)), axis=0, out=csum[1:])
+    sx, sy = (csum[last + 1] - csum[first]).T
+    n = counts.astype(np.float64)
+    cx, cy = sx/n, sy/n
+    rng = np.hypot(cx, cy)
+    ux, uy = cx/np.maximum(rng, 1e-9), cy/np.maximum(rng, 1e-9)
+    if radius is not None:
+        depth = _arc_depth(float(radius), rng)
+        shift = radius - depth
+        cx += ux*shift
+        cy += uy*shift
+        rng += shift
+    # peak intensity of clusters, reduction intervals alternate between
+    # clusters and gaps between them
+    intensity = np.empty(0)
+    if len(first):
+        marks = np.full(len(norm) + 1, -np.inf)
+        marks[:len(norm)] = norm
+        index = np.empty(2*len(first), np.intp)
+        index[0::2] = first
+        index[1::2] = last + 1
+        intensity = np.maximum.reduceat(marks, index)[0::2]
+
+    # range noise averaged over the beams along the bearing, bearing of
+    # the centre is limited by beam spacing at both cluster ends
+    dphi = np.abs(angles[1] - angles[0]) if len(angles) > 1 else 0.
+    var_r = float(sigma)**2/n
+    var_t = (rng*dphi)**2/6.
+    cov = np.empty((len(n), 2, 2))
+    cov[:, 0, 0] = var_r*ux*ux + var_t*uy*uy
+    cov[:, 1, 1] = var_r*uy*uy + var_t*ux*ux
+    cov[:, 0, 1] = cov[:, 1, 0] = (var_r - var_t)*ux*uy
+    return Reflectors(np.column_stack((cx, cy)), cov, counts, first, last,
+                      intensity, width)
@@ -0,0 +1,371 @@
+'''Scan record type and per-configuration tables shared between scans'''
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from .exceptions import HokuyoException
+
+DMAX_2CHAR = 4094 #: Maximum distance which fits into 2-char encoding
+
+
+def filter_mask(dist, intens=None, dmin=None, dmax=None,
+                imin=None, imax=None):
+    '''Returns boolean mask of measurments which pass filtering for given
+    `dmin`, `dmax`, `imin` and `imax`. Works with arrays of any shape,
+    `None` limits are not checked.'''
+    mask = np.ones(np.shape(dist), bool)
+    if dmin is not None:
+        mask &= dist >= dmin
+    if dmax is not None:
+        mask &= dist <= dmax
+    if imin is not None:
+        mask &= intens >= imin
+    if imax is not None:
+        mask &= intens <= imax
+    return mask
+
+
+def clip_dmax(dmax, chars, dmax_2char=DMAX_2CHAR):
+    '''Clips maximum distance for filtering, so saturated values of
+    2-char encoding will be filtered out'''
+    return min(dmax, dmax_2char) if chars == 2 else dmax
+
+
+def filter_scan(angles, scan, dmin=None, dmax=None, imin=None, imax=None):
+    '''Stacks angles with the scan and filters it for given `dmin`, `dmax`,
+    `imin` and `imax`. Note that `imin` and `imax` should be only used for
+    scans with intensities.
+
+    Returns
+    -------
+    ndarray
+        Array with angles, distances and intensities (if available)
+    '''
+    if scan.ndim == 1:
+        tpl = (angles, scan)
+    elif scan.ndim == 2:
+        tpl = (angles, scan[:, 0], scan[:, 1])
+    else:
+        raise HokuyoException('Unexpected scan dimensions')
+    data = np.vstack(tpl).T
+    intens = data[:, 2] if scan.ndim == 2 else None
+    return data[filter_mask(data[:, 1], intens, dmin, dmax, imin, imax)]
+
+
+class ScanConfig(object):
+    '''Sensor parameters and measurment command parameters of the scan.
+    Instances are cached, so scans measured with the same parameters share
+    lazily computed tables (angles, their cosines and sines). Use
+    `ScanConfig.get` for creating instances. Only `cache_size` recently
+    used configs are kept in the cache.'''
+
+    __slots__ = ('ares', 'amin', 'amax', 'aforw', 'dmin', 'dmax', 'scan_freq',
+                 'start', 'end', 'grouping', 'skips', 'cmd', '_tables')
+
+    cache_size = 64 #: Maximal number of cached configs
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+
+    def __init__(self, ares, amin, amax, aforw, dmin, dmax, scan_freq,
+                 start, end, grouping=0, skips=0, cmd='MD'):
+        self.ares = ares
+        self.amin = amin
+        self.amax = amax
+        self.aforw = aforw
+        self.dmin = dmin
+        self.dmax = dmax
+        self.scan_freq = scan_freq
+        self.start = start
+        self.end = end
+        self.grouping = grouping
+        self.skips = skips
+        self.cmd = cmd
+        self._tables = {}
+
+    @classmethod
+    def get(cls, *args):
+        '''Returns cached config instance for the given parameters, accepts
+        the same arguments as the constructor'''
+        with cls._cache_lock:
+            config = cls._cache.pop(args, None)
+            if config is None:
+                config = cls(*args)
+            cls._cache[args] = config
+            while len(cls._cache) > cls.cache_size:
+                cls._cache.popitem(last=False)
+        return config
+
+    @classmethod
+    def from_laser(cls, laser, start=None, end=None, grouping=0, skips=0,
+                   cmd='MD'):
+        '''Returns config for the given `HokuyoLX` instance and measurment
+        parameters'''
+        start = laser.amin if start is None else start
+        end = laser.amax if end is None else end
+        return cls.get(laser.ares, laser.amin, laser.amax, laser.aforw,
+                       laser.dmin, laser.dmax, laser.scan_freq,
+                       start, end, grouping, skips, cmd)
+
+    @property
+    def key(self):
+        '''Tuple of all parameters'''
+        return (self.ares, self.amin, self.amax, self.aforw, self.dmin,
+                self.dmax, self.scan_freq, self.start, self.end,
+                self.grouping, self.skips, self.cmd)
+
+    def __repr__(self):
+        return 'ScanConfig%r' % (self.key, )
+
+    def __reduce__(self):
+        return (ScanConfig.get, self.key)
+
+    @property
+    def with_intensity(self):
+        '''Does scan contain intensities?'''
+        return self.cmd[1] == 'E'
+
+    @property
+    def chars(self):
+        '''Number of chars used for encoding distances'''
+        return 2 if self.cmd[1] == 'S' else 3
+
+    def limits(self, dmin=None, dmax=None):
+        '''Returns distance limits `(dmin, dmax)` for filtering scans of
+        this config. `None` limits default to the sensor ones and `dmax` is
+        clipped for 2-char encoding in the same way as in
+        `HokuyoLX.iter_filtered_dist`.'''
+        dmin = self.dmin if dmin is None else dmin
+        dmax = self.dmax if dmax is None else dmax
+        return dmin, clip_dmax(dmax, self.chars)
+
+    @property
+    def beams(self):
+        '''Number of beams in the scan'''
+        return len(self.angles)
+
+    def _table(self, name, func):
+        '''Returns cached read-only table, computing it on the first call'''
+        table = self._tables.get(name)
+        if table is None:
+            table = np.asarray(func())
+            table.flags.writeable = False
+            self._tables[name] = table
+        return table
+
+    def _steps(self):
+        '''Returns positions of the beams in steps, grouped beams are placed
+        in the middle of their groups (the last group can be incomplete)'''
+        grouping = 1 if self.grouping == 0 else self.grouping
+        first = np.arange(self.start, self.end + 1, grouping,
+                          dtype=np.float64)
+        last = np.minimum(first + grouping - 1, self.end)
+        return (first + last)/2
+
+    def _compute_angles(self):
+        '''Computes angles, see `HokuyoLX.get_angles`'''
+        return 2*np.pi*(self._steps() - self.aforw)/self.ares
+
+    @property
+    def angles(self):
+        '''Array of beam angles in radians'''
+        return self._table('angles', self._compute_angles)
+
+    @property
+    def cos(self):
+        '''Array of cosines of beam angles'''
+        return self._table('cos', lambda: np.cos(self.angles))
+
+    @property
+    def sin(self):
+        '''Array of sines of beam angles'''
+        return self._table('sin', lambda: np.sin(self.angles))
+
+    @property
+    def step_time(self):
+        '''Time between measurments of neighbouring steps in milliseconds'''
+        return 1000./(self.scan_freq*self.ares)
+
+    @property
+    def scan_period(self):
+        '''Expected interval between consecutive scans of the measurment in
+        milliseconds'''
+        return 1000.*(self.skips + 1)/self.scan_freq
+
+    def _compute_time_offsets(self):
+        '''Computes beam time offsets using the same steps as angles'''
+        return (self._steps() - self.amin)*self.step_time
+
+    @property
+    def time_offsets(self):
+        '''Array of beam measurment times in milliseconds relative to
+        the scan timestamp, which is regarded as the measurment time of
+        the step `amin`'''
+        return self._table('time_offsets', self._compute_time_offsets)
+
+
+class Scan(object):
+    '''Single scan recieved from the sensor. Derived forms of the scan
+    (validity mask, Cartesian points, filtered data) are computed on
+    the first access and cached.
+
+    For backward compatibility scan can be unpacked as the
+    `(scan, timestamp, pending)` tuple.'''
+
+    __slots__ = ('data', 'timestamp', 'host_time', 'decode_time', 'skipped',
+                 'seq', 'pending', 'config', '_valid_mask', '_points',
+                 '_filtered', '_pyramid')
+
+    def __init__(self, data, timestamp, config, pending=0, seq=0,
+                 host_time=None, decode_time=None, skipped=0):
+        '''Creates new scan record
+
+        Parameters
+        ----------
+        data : ndarray
+            Array with measured distances or with distances and intensities
+        timestamp : int
+            Sensor timestamp of the measurment
+        config : `ScanConfig`
+            Parameters of the measurment
+        pending : int, optional
+            Number of pending scans
+        seq : int, optional
+            Sequence number of the scan in the measurment
+        host_time : float, optional
+            Host time of recieving the scan in milliseconds
+        decode_time : float, optional
+            Host time of completing the scan decoding in milliseconds
+        skipped : int, optional
+            Number of stale scans skipped right before this one
+        '''
+        self.data = data
+        self.timestamp = timestamp
+        self.config = config
+        self.pending = pending
+        self.seq = seq
+        self.host_time = host_time
+        self.decode_time = decode_time
+        self.skipped = skipped
+        self._valid_mask = None
+        self._points = None
+        self._filtered = None
+        self._pyramid = None
+
+    def __getstate__(self):
+        '''Returns the picklable state of the scan, cached derived arrays
+        are recomputed on demand after unpickling'''
+        return (self.data, self.timestamp, self.config, self.pending,
+                self.seq, self.host_time, self.decode_time, self.skipped)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return '%s(seq=%d, timestamp=%d, beams=%d, intens=%s)' % (
+            type(self).__name__, self.seq, self.timestamp, len(self.data),
+            self.intens is not None)
+
+    def __iter__(self):
+        return iter((self.data, self.timestamp, self.pending))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.data, self.timestamp, self.pending)[index]
+
+    @property
+    def latency(self):
+        '''Time from the measurment (converted sensor timestamp) to
+        the decoding completion in milliseconds, None if unknown'''
+        if self.decode_time is None:
+            return None
+        return self.decode_time - self.timestamp
+
+    def age(self):
+        '''Returns time passed since the measurment in milliseconds,
+        meaningful only for converted sensor timestamps'''
+        return time.time()*1000 - self.timestamp
+
+    @property
+    def beam_times(self):
+        '''Array of measurment times of beams in milliseconds'''
+        return self.timestamp + self.config.time_offsets
+
+    @property
+    def dist(self):
+        '''Array with measured distances'''
+        return self.data if self.data.ndim == 1 else self.data[:, 0]
+
+    @property
+    def intens(self):
+        '''Array with measured intensities or None'''
+        return None if self.data.ndim == 1 else self.data[:, 1]
+
+    @property
+    def angles(self):
+        '''Array of beam angles in radians'''
+        return self.config.angles
+
+    @property
+    def valid_mask(self):
+        '''Boolean mask of beams with distances inside the sensor range'''
+        if self._valid_mask is None:
+            dmin, dmax = self.config.limits()
+            self._valid_mask = filter_mask(self.dist, None, dmin, dmax)
+        return self._valid_mask
+
+    @property
+    def points(self):
+        '''Array of shape `(beams, 2)` with Cartesian coordinates of all
+        beams in millimeters, use `valid_mask` to select valid ones'''
+        if self._points is None:
+            dist = self.dist
+            points = np.empty((len(dist), 2))
+            np.multiply(dist, self.config.cos, out=points[:, 0])
+            np.multiply(dist, self.config.sin, out=points[:, 1])
+            self._points = points
+        return self._points
+
+    @property
+    def pyramid(self):
+        '''`RangePyramid` of the scan for closest-range queries over
+        angular sectors'''
+        if self._pyramid is None:
+            from .pyramid import RangePyramid
+            self._pyramid = RangePyramid(self)
+        return self._pyramid
+
+    def filtered(self, dmin=None, dmax=None, imin=None, imax=None):
+        '''Returns scan filtered for given parameters in the same form as
+        `HokuyoLX.get_filtered_dist` and `HokuyoLX.get_filtered_intens`.
+
+        Parameters
+        ----------
+        dmin : int, optional
+            Minimal distance for filtering (the default is None,
+            which implies `config.dmin`)
+        dmax : int,  optional
+            Maximum distance for filtering (the default is None,
+            which implies `config.dmax`)
+        imin : int, optional
+            Minimum intensity for filtering (the default is None,
+            which disables minimum intensity filter)
+        imax : int,  optional
+            Maximum distance for filtering (the default is None,
+            which disables maximum intensity filter)
+
+        Returns
+        -------
+        ndarray
+            Array with angles, distances and intensities (if available)
+        '''
+        dmin, dmax = self.config.limits(dmin, dmax)
+        key = (dmin, dmax, imin, imax)
+        if self._filtered is None:
+            self._filtered = {}
+        data = self._filtered.get(key)
+        if data is None:
+            data = self._filtered[key] = filter_scan(
+                self.angles, self.data, dmin, dmax, imin, imax)
+        return data
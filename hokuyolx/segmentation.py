@@ -0,0 +1,150 @@
+'''Scan segmentation using the adaptive breakpoint detector.
+
+Consecutive valid points `p[n-1]` and `p[n]` belong to different segments
+if the distance between them exceeds
+
+    D_max = r[n-1]*sin(dphi)/sin(lam - dphi) + 3*sigma
+
+where `dphi` is the angle between beams, `lam` is the smallest expected
+incidence angle of the surface and `sigma` is the range noise
+(G. A. Borges, M.-J. Aldon, "Line extraction in 2D range images for mobile
+robotics", 2004). All operations are vectorized over beams.
+
+Usage example:
+
+>>> for scan in laser.iter_dist():
+...     segments = segment(scan)
+...     print(segments.centroids)
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan, filter_mask
+
+
+class Segments(object):
+    '''Segmentation result stored as flat arrays. Segment `k` consists of
+    valid points `points[first[k]:last[k]+1]`, which correspond to beams
+    `beams[first[k]:last[k]+1]`.'''
+
+    __slots__ = ('points', 'beams', 'first', 'last', 'start', 'end',
+                 'counts', 'centroids', 'extents')
+
+    def __init__(self, points, beams, first, last):
+        '''Creates segmentation result
+
+        Parameters
+        ----------
+        points : ndarray
+            Array of shape `(N, 2)` with Cartesian coordinates of
+            valid points
+        beams : ndarray
+            Array of shape `(N, )` with beam indices of valid points
+        first : ndarray
+            Index of the first point of each segment
+        last : ndarray
+            Index of the last point of each segment
+        '''
+        self.points = points
+        self.beams = beams
+        self.first = first
+        self.last = last
+        #: Beam index of the first point of each segment
+        self.start = beams[first]
+        #: Beam index of the last point of each segment
+        self.end = beams[last]
+        #: Number of points in each segment
+        self.counts = last - first + 1
+        csum = np.zeros((len(points) + 1, 2))
+        np.cumsum(points, axis=0, out=csum[1:])
+        sums = csum[last + 1] - csum[first]
+        #: Array of shape `(K, 2)` with segment centroids
+        self.centroids = sums/self.counts[:, None]
+        #: Distance between the first and the last points of each segment
+        self.extents = np.hypot(*(points[last] - points[first]).T)
+
+    def __len__(self):
+        return len(self.first)
+
+    def __repr__(self):
+        return '%s(segments=%d, points=%d)' % (
+            type(self).__name__, len(self), int(self.counts.sum()))
+
+    @property
+    def labels(self):
+        '''Segment index for each point in `points`, -1 for points which do
+        not belong to any segment'''
+        labels = np.full(len(self.points), -1, np.intp)
+        marks = np.zeros(len(self.points) + 1, np.intp)
+        np.add.at(marks, self.first, 1)
+        np.add.at(marks, self.last + 1, -1)
+        inside = np.cumsum(marks[:-1]) > 0
+        ids = np.repeat(np.arange(len(self)), self.counts)
+        labels[inside] = ids
+        return labels
+
+
+def segment(scan, angles=None, lam=np.radians(10.), sigma=10., min_points=3,
+            max_gap=1, dmin=None, dmax=None):
+    '''Segments scan using the adaptive breakpoint detector
+
+    Parameters
+    ----------
+    scan : `Scan` or ndarray
+        Scan record or array with measured distances
+    angles : ndarray, optional
+        Beam angles, required if `scan` is an array
+        (e.g. `HokuyoLX.get_angles()`)
+    lam : float, optional
+        Smallest expected incidence angle of the surface in radians
+        (the default is 10 degrees)
+    sigma : float, optional
+        Range noise in millimeters (the default is 10)
+    min_points : int, optional
+        Minimal number of points in the segment, smaller segments are
+        discarded (the default is 3)
+    max_gap : int, optional
+        Maximal number of consecutive invalid beams inside the segment
+        (the default is 1)
+    dmin : int, optional
+        Minimal valid distance (the default is None, which implies
+        `scan.config.dmin` or 0)
+    dmax : int, optional
+        Maximal valid distance (the default is None, which implies
+        `scan.config.dmax` or unbounded)
+
+    Returns
+    -------
+    `Segments`
+        Segmentation result
+    '''
+    if isinstance(scan, Scan):
+        config = scan.config
+        dist, angles, cos, sin = scan.dist, config.angles, config.cos, \
+            config.sin
+        dmin, dmax = config.limits(dmin, dmax)
+    else:
+        if angles is None:
+            raise HokuyoException('Angles are required for raw scans')
+        dist, cos, sin = np.asarray(scan), np.cos(angles), np.sin(angles)
+        if dist.ndim == 2:
+            dist = dist[:, 0]
+    beams = np.flatnonzero(filter_mask(dist, None, dmin, dmax))
+    r = dist[beams].astype(np.float64)
+    points = np.empty((len(beams), 2))
+    np.multiply(r, cos[beams], out=points[:, 0])
+    np.multiply(r, sin[beams], out=points[:, 1])
+    if len(beams) == 0:
+        empty = np.empty(0, np.intp)
+        return Segments(points, beams, empty, empty)
+
+    dphi = np.abs(np.diff(angles[beams]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        threshold = r[:-1]*np.sin(dphi)/np.sin(lam - dphi) + 3*sigma
+    step = np.hypot(*np.diff(points, axis=0).T)
+    breaks = (step > threshold) | (dphi >= lam) | \
+        (np.diff(beams) > max_gap + 1)
+    cuts = np.flatnonzero(breaks)
+    first = np.concatenate(([0], cuts + 1))
+    last = np.concatenate((cuts, [len(beams) - 1]))
+    keep = last - first + 1 >= min_points
+    return Segments(points, beams, first[keep], last[keep])
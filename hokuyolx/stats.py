@@ -0,0 +1,277 @@
+'''Streaming per-beam statistics of measured distances.
+
+Statistics are accumulated with memory proportional to the number of beams:
+mean and variance are updated with the batched Welford algorithm (statistics
+of the new batch are merged into accumulated ones using the parallel
+formula of Chan et al.), ranges are counted in fixed-bin histograms.
+Values below `dmin` are sensor error codes, they are counted as dropouts
+per code and do not affect range statistics. The limits are taken from
+the config of the first `Scan` (or `ScanBatch`) unless given explicitly.
+Accumulators can be merged, which allows parallel reduction over recordings
+(see `process_recordings`).
+
+Usage example:
+
+>>> stats = BeamStatistics()
+>>> for scan in laser.iter_dist(10000):
+...     stats.update(scan)
+>>> print(stats.mean, stats.std, stats.dropout_rate)
+'''
+import copy
+import numpy as np
+from .batch import ScanBatch
+from .exceptions import HokuyoException
+from .scan import Scan
+
+
+class BeamStatistics(object):
+    '''Accumulator of per-beam distance statistics'''
+
+    def __init__(self, beams=None, dmin=None, dmax=None, bins=100,
+                 hist_range=None):
+        '''Creates new empty accumulator
+
+        Parameters
+        ----------
+        beams : int, optional
+            Number of beams (the default is None, which implies number of
+            beams of the first scan)
+        dmin : int, optional
+            Minimal valid distance, smaller values are error codes
+            (the default is None, which implies `config.dmin` of the first
+            scan)
+        dmax : int, optional
+            Maximal valid distance, larger values are counted as dropouts
+            (the default is None, which implies `config.dmax` of the first
+            scan clipped for 2-char encoding)
+        bins : int, optional
+            Number of histogram bins (the default is 100)
+        hist_range : tuple, optional
+            Range of the histogram (the default is None, which implies
+            `(dmin, dmax)`)
+        '''
+        super(BeamStatistics, self).__init__()
+        self.dmin = dmin
+        self.dmax = dmax
+        self.bins = bins
+        self.hist_range = hist_range
+        self.scans = 0 #: Number of accumulated scans
+        self.beams = None
+        self._config_limits = None
+        if beams is not None and dmin is not None and dmax is not None:
+            self._alloc(beams)
+
+    def _set_limits(self, config):
+        '''Takes missing limits from the scan config and checks that
+        the following scans have the same limits'''
+        if config is None:
+            if self.dmin is None or self.dmax is None:
+                raise HokuyoException('dmin and dmax are required for '
+                                      'scans without config')
+        elif self._config_limits is None:
+            self._config_limits = config.limits()
+            if self.dmin is None:
+                self.dmin = self._config_limits[0]
+            if self.dmax is None:
+                self.dmax = self._config_limits[1]
+        elif self._config_limits != config.limits():
+            raise HokuyoException('Sensor limits do not match: %s != %s' %
+                                  (config.limits(), self._config_limits))
+        if self.hist_range is None:
+            self.hist_range = (self.dmin, self.dmax)
+
+    def _alloc(self, beams):
+        '''Allocates accumulator arrays'''
+        self.beams = beams #: Number of beams
+        self.count = np.zeros(beams, np.int64) #: Number of valid values
+        self._mean = np.zeros(beams)
+        self.m2 = np.zeros(beams) #: Sum of squared deviations from the mean
+        #: Minimal valid distance of each beam
+        self.min = np.full(beams, np.iinfo(np.uint32).max, np.uint32)
+        self.max = np.zeros(beams, np.uint32) #: Maximal valid distance
+        #: Array of shape `(beams, dmin)` with number of error codes
+        self.errors = np.zeros((beams, self.dmin), np.int64)
+        #: Number of values larger than `dmax`
+        self.overflows = np.zeros(beams, np.int64)
+        #: Array of shape `(beams, bins)` with range histograms
+        self.hist = np.zeros((beams, self.bins), np.int64)
+
+    @property
+    def bin_edges(self):
+        '''Edges of the histogram bins'''
+        if self.hist_range is None:
+            return None
+        return np.linspace(self.hist_range[0], self.hist_range[1],
+                           self.bins + 1)
+
+    @property
+    def mean(self):
+        '''Mean distance of each beam, NaN for beams without valid values'''
+        with np.errstate(invalid='ignore'):
+            return np.where(self.count > 0, self._mean, np.nan)
+
+    @property
+    def var(self):
+        '''Sample variance of distances of each beam'''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, self.m2/(self.count - 1), np.nan)
+
+    @property
+    def std(self):
+        '''Sample standard deviation of distances of each beam'''
+        return np.sqrt(self.var)
+
+    @property
+    def dropouts(self):
+        '''Number of dropouts (error codes and overflows) of each beam'''
+        return self.errors.sum(axis=1) + self.overflows
+
+    @property
+    def dropout_rate(self):
+        '''Fraction of dropouts of each beam'''
+        if not self.scans:
+            return np.full(self.beams or 0, np.nan)
+        return self.dropouts/float(self.scans)
+
+    def update(self, scan):
+        '''Adds scan to the statistics
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with measured distances (and intensities),
+            arrays require `dmin` and `dmax` given on creation
+        '''
+        config = None
+        if isinstance(scan, Scan):
+            config = scan.config
+            scan = scan.dist
+        scan = np.asarray(scan)
+        if scan.ndim == 2:
+            scan = scan[:, 0]
+        self.update_batch(scan[None], config)
+
+    def update_batch(self, batch, config=None):
+        '''Adds batch of scans to the statistics
+
+        Parameters
+        ----------
+        batch : `ScanBatch` or ndarray
+            Batch of scans or array of shape `(B, beams)` with measured
+            distances, e.g. yielded by `HokuyoLX.iter_dist_batches`
+        config : `ScanConfig`, optional
+            Config of the scans, used for missing `dmin` and `dmax`
+            (the default is None, which implies `batch.config` for
+            `ScanBatch`)
+        '''
+        if isinstance(batch, ScanBatch):
+            config = batch.config if config is None else config
+            batch = batch.dist
+        batch = np.asarray(batch)
+        if batch.ndim != 2:
+            raise HokuyoException('Batch must be two-dimensional array')
+        self._set_limits(config)
+        if self.beams is None:
+            self._alloc(batch.shape[1])
+        elif batch.shape[1] != self.beams:
+            raise HokuyoException('Number of beams does not match: '
+                                  '%d != %d' % (batch.shape[1], self.beams))
+        n_scans = batch.shape[0]
+        if n_scans == 0:
+            return
+        beam_ids = np.broadcast_to(np.arange(self.beams), batch.shape)
+
+        low = batch < self.dmin
+        if low.any():
+            codes = beam_ids[low]*self.dmin + batch[low].astype(np.intp)
+            self.errors += np.bincount(
+                codes, minlength=self.errors.size).reshape(self.errors.shape)
+        high = batch > self.dmax
+        self.overflows += high.sum(axis=0)
+        valid = ~(low | high)
+
+        count = valid.sum(axis=0)
+        values = np.where(valid, batch, 0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = values.sum(axis=0)/count
+        mean[count == 0] = 0.
+        dev = np.where(valid, values - mean, 0.)
+        m2 = np.einsum('ij,ij->j', dev, dev)
+        # parallel merge of the batch statistics into the accumulated ones
+        total = self.count + count
+        delta = mean - self._mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(total > 0, count/total.astype(np.float64), 0.)
+        self._mean += delta*frac
+        self.m2 += m2 + delta*delta*self.count*frac
+        self.count = total
+
+        big = np.iinfo(np.uint32).max
+        np.minimum(self.min, np.where(valid, batch, big).min(axis=0),
+                   out=self.min)
+        np.maximum(self.max, np.where(valid, batch, 0).max(axis=0),
+                   out=self.max)
+
+        lo, hi = self.hist_range
+        scale = self.bins/float(hi - lo)
+        vals = batch[valid].astype(np.float64)
+        inside = (vals >= lo) & (vals <= hi)
+        idx = ((vals[inside] - lo)*scale).astype(np.intp)
+        np.minimum(idx, self.bins - 1, out=idx)
+        flat = beam_ids[valid][inside]*self.bins + idx
+        self.hist += np.bincount(
+            flat, minlength=self.hist.size).reshape(self.hist.shape)
+        self.scans += n_scans
+
+    def merge(self, other):
+        '''Merges statistics accumulated by other instance into this one
+
+        Parameters
+        ----------
+        other : `BeamStatistics`
+            Accumulator with the same number of beams and parameters
+        '''
+        if other.beams is None:
+            return self
+        if self.beams is None:
+            for name in ('dmin', 'dmax', 'hist_range', '_config_limits'):
+                if getattr(self, name) is None:
+                    setattr(self, name, getattr(other, name))
+            self._alloc(other.beams)
+        if (self.beams, self.dmin, self.dmax, self.bins,
+                tuple(self.hist_range)) != \
+                (other.beams, other.dmin, other.dmax, other.bins,
+                 tuple(other.hist_range)):
+            raise HokuyoException('Statistics parameters do not match')
+        total = self.count + other.count
+        delta = other._mean - self._mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(total > 0, other.count/total.astype(np.float64),
+                            0.)
+        self._mean += delta*frac
+        self.m2 += other.m2 + delta*delta*self.count*frac
+        self.count = total
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.errors += other.errors
+        self.overflows += other.overflows
+        self.hist += other.hist
+        self.scans += other.scans
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def snapshot(self):
+        '''Returns independent copy of the current statistics'''
+        return copy.deepcopy(self)
+
+    def reset(self):
+        '''Clears accumulated statistics'''
+        self.scans = 0
+        if self.beams is not None:
+            self._alloc(self.beams)
+
+    def __repr__(self):
+        return '%s(beams=%s, scans=%d)' % (type(self).__name__, self.beams,
+                                           self.scans)
@@ -37,6 +37,23 @@ tsync_statuses = {
           'synchronization state.',
 }
 
+#: Motor speed change command statuses
+motor_speed_statuses = {
+    '00': 'Normal',
+    '01': 'Invalid speed ratio.',
+    '02': 'Speed ratio is out of range.',
+    '03': 'Motor is already running at the requested speed.',
+    '04': 'Command is not compatible with the sensor.',
+}
+
+#: Measurment sensitivity command statuses
+sensitivity_statuses = {
+    '00': 'Normal',
+    '01': 'Invalid parameter.',
+    '02': 'Sensor is already running in the requested mode.',
+    '03': 'Command is not compatible with the sensor.',
+}
+
 #: Other reply statuses, usually meaning some sort of exception
 reply_statuses = {
     '0L': 'AbnormalState',
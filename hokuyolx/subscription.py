@@ -0,0 +1,314 @@
+'''Callback-driven streaming with dispatch of scans to worker pools.
+
+Scans are acquired on the dedicated background thread and every decoded
+scan is submitted to the executor (`concurrent.futures` thread or process
+pool), so processing never delays socket reads. Number of scans being
+processed can be bounded: when the limit is reached new scans are either
+skipped or queued until a worker becomes free, in both cases acquisition
+thread does not wait for user code. Results can be delivered in the order
+of acquisition.
+
+Usage example:
+
+>>> from concurrent.futures import ProcessPoolExecutor
+>>> pool = ProcessPoolExecutor(4)
+>>> sub = laser.subscribe(process_scan, executor=pool, ordered=True,
+...                       max_in_flight=4, on_result=handle_result)
+>>> time.sleep(60)
+>>> sub.stop()
+'''
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import HokuyoException
+
+
+class Subscription(object):
+    '''Background acquisition of scans with dispatch to the executor'''
+
+    def __init__(self, scans, callback, executor=None, ordered=False,
+                 max_in_flight=None, skip=True, on_result=None,
+                 on_error=None, on_stop=None, logger=None):
+        '''Creates new subscription, use `start` to run it
+
+        Parameters
+        ----------
+        scans : iterable
+            Source of scans, e.g. `HokuyoLX.iter_dist()` generator
+        callback : callable
+            Function called as `callback(scan)` on the executor, it must be
+            picklable for process pools
+        executor : `concurrent.futures.Executor`, optional
+            Thread or process pool (the default is None, which means that
+            subscription creates and owns the single worker thread)
+        ordered : bool, optional
+            Deliver results to `on_result` in the order of acquisition
+            (the default is False)
+        max_in_flight : int, optional
+            Maximal number of scans submitted to the executor and not
+            finished yet (the default is None, which means unlimited)
+        skip : bool, optional
+            Skip new scans if `max_in_flight` is reached, otherwise they are
+            queued and submitted when workers finish (the default is True)
+        on_result : callable, optional
+            Function called as `on_result(scan, result)` with the result of
+            the callback (the default is None)
+        on_error : callable, optional
+            Function called as `on_error(scan, err)` if the callback raised
+            an exception (the default is None, which means that exceptions
+            are logged)
+        on_stop : callable, optional
+            Function called on the acquisition thread if iteration was
+            interrupted by `stop`, e.g. `HokuyoLX.standby` (the default is
+            None)
+        logger : `logging._logger` instance, optional
+            Logger instance, if none is provided new instance is created
+        '''
+        super(Subscription, self).__init__()
+        self.callback = callback
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight
+        self.skip = skip
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_stop = on_stop
+        self.submitted = 0 #: Number of scans submitted to the executor
+        self.completed = 0 #: Number of processed and delivered scans
+        self.skipped = 0 #: Number of scans skipped because workers were busy
+        self.failed = 0 #: Number of scans on which the callback failed
+        self.error = None #: Exception which terminated the acquisition
+        self._scans = scans
+        self._own_executor = executor is None
+        self._executor = ThreadPoolExecutor(1) if executor is None \
+            else executor
+        self._logger = logging.getLogger('hokuyo.subscription') \
+            if logger is None else logger
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._deliver_lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = deque()
+        self._ready = {}
+        self._next = 0
+        self._running = False
+        self._finished = False
+        self._thread = None
+
+    @property
+    def in_flight(self):
+        '''Number of scans being processed'''
+        return self._in_flight
+
+    @property
+    def running(self):
+        '''Is acquisition thread running?'''
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        '''Starts acquisition thread'''
+        if self._thread is not None:
+            raise HokuyoException('Subscription is already started')
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        '''Acquisition loop'''
+        interrupted = False
+        try:
+            for scan in self._scans:
+                if not self._running:
+                    interrupted = True
+                    break
+                self._dispatch(scan)
+        except Exception as err:
+            self.error = err
+            self._logger.error('Acquisition failed: %s', err)
+        finally:
+            close = getattr(self._scans, 'close', None)
+            if close is not None:
+                close()
+            if interrupted and self.on_stop is not None:
+                try:
+                    self.on_stop()
+                except Exception as err:
+                    self._logger.warning('Stop handler failed: %s', err)
+            with self._cond:
+                self._running = False
+                self._finished = True
+                self._cond.notify_all()
+
+    def _dispatch(self, scan):
+        '''Submits the scan or skips (queues) it if workers are busy'''
+        with self._lock:
+            if self.max_in_flight is not None and \
+                    self._in_flight >= self.max_in_flight:
+                if self.skip:
+                    self.skipped += 1
+                else:
+                    self._queued.append(scan)
+                return
+            index = self._reserve()
+        self._submit(index, scan)
+
+    def _reserve(self):
+        '''Reserves slot and delivery index, called under the lock'''
+        self._in_flight += 1
+        index = self.submitted
+        self.submitted += 1
+        return index
+
+    def _submit(self, index, scan):
+        '''Submits callback to the executor'''
+        try:
+            future = self._executor.submit(self.callback, scan)
+        except Exception as err:
+            self._finish(index, scan, None, err)
+            return
+        future.add_done_callback(
+            lambda future: self._collect(index, scan, future))
+
+    def _collect(self, index, scan, future):
+        '''Handles completed future'''
+        err = future.exception()
+        result = None if err is not None else future.result()
+        self._finish(index, scan, result, err)
+
+    def _finish(self, index, scan, result, err):
+        '''Releases the slot, submits queued scan and delivers results'''
+        with self._lock:
+            self._in_flight -= 1
+            if err is not None:
+                self.failed += 1
+            queued = None
+            if self._queued:
+                queued = self._queued.popleft()
+                queued_index = self._reserve()
+        if queued is not None:
+            self._submit(queued_index, queued)
+        with self._deliver_lock:
+            if self.ordered:
+                with self._lock:
+                    self._ready[index] = (scan, result, err)
+                    ready = []
+                    while self._next in self._ready:
+                        ready.append(self._ready.pop(self._next))
+                        self._next += 1
+            else:
+                ready = [(scan, result, err)]
+            for item in ready:
+                self._deliver(*item)
+        with self._cond:
+            self.completed += 1
+            self._cond.notify_all()
+
+    def _deliver(self, scan, result, err):
+        '''Passes result or exception to handlers'''
+        try:
+            if err is not None:
+                if self.on_error is None:
+                    self._logger.error('Scan processing failed: %s', err)
+                else:
+                    self.on_error(scan, err)
+            elif self.on_result is not None:
+                self.on_result(scan, result)
+        except Exception as exc:
+            self._logger.error('Result handler failed: %s', exc)
+
+    def join(self, timeout=None):
+        '''Waits until acquisition is finished and all scans are processed
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Time to wait in seconds (the default is None, which means
+            infinite waiting)
+
+        Returns
+        -------
+        bool
+            True if subscription is finished, False on timeout
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        if not self._join_thread(deadline):
+            return False
+        with self._cond:
+            while self._queued or self.completed != self.submitted:
+                if not self._wait(deadline):
+                    return False
+        return True
+
+    def _wait(self, deadline):
+        '''Waits for the condition notification until the deadline, called
+        under the lock'''
+        if deadline is None:
+            self._cond.wait()
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        self._cond.wait(remaining)
+        return True
+
+    def _join_thread(self, deadline):
+        '''Waits until acquisition thread finishes, including the stop
+        handler'''
+        if self._thread is None or \
+                self._thread is threading.current_thread():
+            return True
+        with self._cond:
+            while not self._finished:
+                if not self._wait(deadline):
+                    return False
+        self._thread.join(None if deadline is None else
+                          max(deadline - time.time(), 0))
+        return not self._thread.is_alive()
+
+    def stop(self, wait=True, timeout=None):
+        '''Stops acquisition and waits until acquisition thread finishes
+        (it happens after recieving the next scan) and calls the stop
+        handler, so the sensor can be used again after return
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Wait for processing of already submitted scans
+            (the default is True)
+        timeout : float, optional
+            Time to wait in seconds (the default is None, which means
+            infinite waiting)
+
+        Returns
+        -------
+        bool
+            True if subscription is finished, False on timeout
+        '''
+        with self._lock:
+            self._running = False
+            if not wait:
+                self._queued.clear()
+        if wait:
+            finished = self.join(timeout)
+        else:
+            deadline = None if timeout is None else time.time() + timeout
+            finished = self._join_thread(deadline)
+        if self._own_executor and finished:
+            self._executor.shutdown(wait=wait)
+        return finished
+
+    close = stop
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __repr__(self):
+        return '%s(submitted=%d, completed=%d, skipped=%d, in_flight=%d)' % (
+            type(self).__name__, self.submitted, self.completed,
+            self.skipped, self._in_flight)
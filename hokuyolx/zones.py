@@ -0,0 +1,273 @@
+'''Protective zone monitoring using precompiled per-beam range thresholds.
+
+Each zone (polygon or sector) is converted once per scan configuration into
+the interval of ranges `[lo, hi]` for every beam: return of the beam is
+inside the zone if its distance lies in the interval. Thresholds of all
+zones form `(zones, beams)` matrices, so evaluation of the scan is a single
+vectorized comparison of the raw unsigned distances. Lower thresholds are
+not smaller than `dmin` and upper ones not larger than `dmax` (clipped for
+2-char encoding), so sensor error codes and saturated 2-char values never
+trigger zones.
+For non-convex polygons interval spans from the first entry of the ray into
+the polygon to the last exit, which is a conservative approximation.
+
+Usage example:
+
+>>> engine = ZoneEngine([Zone.sector(-np.pi/4, np.pi/4, 1000, name='stop'),
+...                      Zone.polygon([(0, -500), (2000, -500),
+...                                    (2000, 500), (0, 500)], name='warn')],
+...                     debounce=2)
+>>> for scan in laser.iter_dist():
+...     alarms = engine.update(scan)
+...     if alarms.any():
+...         print(engine.active())
+'''
+import numpy as np
+from .exceptions import HokuyoException
+from .scan import Scan
+
+
+def _cross(ax, ay, bx, by):
+    return ax*by - ay*bx
+
+
+class Zone(object):
+    '''Zone given in the sensor frame (or in the robot frame if the engine
+    is created with sensor extrinsic pose)'''
+
+    def __init__(self, kind, params, name=None):
+        self.kind = kind #: Zone type, 'polygon' or 'sector'
+        self.params = params #: Zone geometry parameters
+        self.name = name #: Name of the zone
+
+    @classmethod
+    def polygon(cls, vertices, name=None):
+        '''Creates polygonal zone from the list of `(x, y)` vertices in
+        millimeters'''
+        vertices = np.asarray(vertices, np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] != 2 or \
+                len(vertices) < 3:
+            raise HokuyoException('Polygon requires at least 3 vertices')
+        return cls('polygon', vertices, name)
+
+    @classmethod
+    def sector(cls, amin, amax, rmax, rmin=0, name=None):
+        '''Creates sector zone between angles `amin` and `amax` (radians,
+        sensor frame) and ranges `rmin` and `rmax` (millimeters)'''
+        return cls('sector', (amin, amax, rmin, rmax), name)
+
+    def __repr__(self):
+        return '%s(%s, name=%r)' % (type(self).__name__, self.kind,
+                                    self.name)
+
+    def _polygon_ranges(self, cos, sin, origin):
+        '''Returns range intervals of the polygon for the given beam
+        directions'''
+        px = self.params[:, 0] - origin[0]
+        py = self.params[:, 1] - origin[1]
+        qx, qy = np.roll(px, -1), np.roll(py, -1)
+        ex, ey = qx - px, qy - py
+        denom = _cross(cos[:, None], sin[:, None], ex, ey)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = _cross(px, py, ex, ey)/denom
+            u = _cross(px, py, cos[:, None], sin[:, None])/denom
+        hit = (u >= 0) & (u <= 1) & (t > 0) & np.isfinite(t)
+        lo = np.where(hit, t, np.inf).min(axis=1)
+        hi = np.where(hit, t, -np.inf).max(axis=1)
+        # even-odd test of the sensor origin
+        cond = (py > 0) != (qy > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xs = px - py*ex/ey
+        if np.count_nonzero(cond & (xs > 0)) % 2 == 1:
+            lo = np.where(np.isfinite(hi), 0., lo)
+        return lo, hi
+
+    def _sector_ranges(self, angles, heading):
+        '''Returns range intervals of the sector for the given beams'''
+        amin, amax, rmin, rmax = self.params
+        span = amax - amin
+        if span >= 2*np.pi:
+            inside = np.ones(len(angles), bool)
+        else:
+            inside = (angles + heading - amin) % (2*np.pi) <= span % (2*np.pi)
+        lo = np.where(inside, float(rmin), np.inf)
+        hi = np.where(inside, float(rmax), -np.inf)
+        return lo, hi
+
+    def ranges(self, angles, extrinsic=None):
+        '''Returns lower and upper range of the zone for each beam, `inf`
+        and `-inf` for beams which do not cross the zone
+
+        Parameters
+        ----------
+        angles : ndarray
+            Beam angles in the sensor frame
+        extrinsic : tuple, optional
+            Sensor pose `(x, y, theta)` in the zone frame (the default is
+            None, which means that zones are given in the sensor frame)
+        '''
+        x, y, theta = (0., 0., 0.) if extrinsic is None else extrinsic
+        if self.kind == 'polygon':
+            a = angles + theta
+            return self._polygon_ranges(np.cos(a), np.sin(a), (x, y))
+        if self.kind == 'sector':
+            if x != 0 or y != 0:
+                raise HokuyoException('Sectors are centred at the sensor, '
+                                      'only rotation is allowed')
+            return self._sector_ranges(angles, theta)
+        raise HokuyoException('Unknown zone type: %s' % self.kind)
+
+
+class ZoneEngine(object):
+    '''Evaluates many zones at once with debouncing across scans'''
+
+    def __init__(self, zones, extrinsic=None, debounce=1, release=1,
+                 min_beams=1, dmin=None):
+        '''Creates new engine
+
+        Parameters
+        ----------
+        zones : list of `Zone`
+            Monitored zones
+        extrinsic : tuple, optional
+            Sensor pose `(x, y, theta)` in the frame of zones (the default is
+            None, which means that zones are given in the sensor frame)
+        debounce : int, optional
+            Number of consecutive scans with returns inside the zone needed
+            to raise the alarm (the default is 1)
+        release : int, optional
+            Number of consecutive clear scans needed to release the alarm
+            (the default is 1)
+        min_beams : int or list, optional
+            Minimal number of beams with returns inside the zone which
+            triggers it in one scan (the default is 1)
+        dmin : int, optional
+            Minimal valid distance (the default is None, which implies
+            `config.dmin`)
+        '''
+        super(ZoneEngine, self).__init__()
+        self.zones = list(zones)
+        self.extrinsic = extrinsic
+        self.debounce = debounce
+        self.release = release
+        self.min_beams = np.broadcast_to(
+            np.asarray(min_beams, np.int64), (len(self.zones), )).copy()
+        self.dmin = dmin
+        #: Boolean array with debounced alarm state of each zone
+        self.alarms = np.zeros(len(self.zones), bool)
+        #: Number of beams inside each zone in the last scan
+        self.hits = np.zeros(len(self.zones), np.int64)
+        self._on = np.zeros(len(self.zones), np.int64)
+        self._off = np.zeros(len(self.zones), np.int64)
+        self._compiled = {}
+
+    @property
+    def names(self):
+        '''Names of the zones'''
+        return [zone.name for zone in self.zones]
+
+    def compile(self, config):
+        '''Computes threshold matrices for the given scan config, results
+        are cached per config
+
+        Parameters
+        ----------
+        config : `ScanConfig`
+            Scan config, e.g. `HokuyoLX.get_config()`
+
+        Returns
+        -------
+        lo : ndarray
+            Array of shape `(zones, beams)` with lower thresholds
+        width : ndarray
+            Array of shape `(zones, beams)` with interval widths, the return
+            is inside the zone if `dist - lo <= width` in unsigned arithmetic
+        '''
+        compiled = self._compiled.get(config)
+        if compiled is not None:
+            return compiled
+        angles = config.angles
+        dmin, dmax = config.limits(self.dmin)
+        lo = np.zeros((len(self.zones), len(angles)), np.uint32)
+        width = np.zeros((len(self.zones), len(angles)), np.uint32)
+        big = np.iinfo(np.uint32).max
+        for i, zone in enumerate(self.zones):
+            zlo, zhi = zone.ranges(angles, self.extrinsic)
+            zlo = np.maximum(np.floor(zlo), dmin)
+            zhi = np.minimum(np.ceil(zhi), dmax)
+            empty = ~(zhi >= zlo)
+            zlo[empty] = big
+            zhi[empty] = 0
+            zlo = np.minimum(zlo, big)
+            zhi = np.minimum(zhi, big - 1)
+            lo[i] = zlo
+            width[i] = np.where(empty, 0, zhi - zlo)
+        # for beams outside of the zone `dist - lo` wraps to `dist + 1`,
+        # which never fits into zero width
+        compiled = self._compiled[config] = (lo, width)
+        return compiled
+
+    def inside(self, scan, config=None):
+        '''Returns boolean matrix of shape `(zones, beams)` showing which
+        returns of the scan lie inside which zones
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with raw distances
+        config : `ScanConfig`, optional
+            Config of the scan, required if `scan` is an array
+        '''
+        if isinstance(scan, Scan):
+            config = scan.config
+            dist = scan.dist
+        else:
+            if config is None:
+                raise HokuyoException('Config is required for raw scans')
+            dist = np.asarray(scan)
+            if dist.ndim == 2:
+                dist = dist[:, 0]
+        lo, width = self.compile(config)
+        if len(dist) != lo.shape[1]:
+            raise HokuyoException('Scan does not match the config')
+        return (dist.astype(np.uint32, copy=False) - lo) <= width
+
+    def evaluate(self, scan, config=None):
+        '''Returns boolean array showing which zones are triggered by
+        the scan, debouncing state is not changed'''
+        self.hits = np.count_nonzero(self.inside(scan, config), axis=1)
+        return self.hits >= self.min_beams
+
+    def update(self, scan, config=None):
+        '''Evaluates the scan and updates debounced alarm states
+
+        Parameters
+        ----------
+        scan : `Scan` or ndarray
+            Scan record or array with raw distances
+        config : `ScanConfig`, optional
+            Config of the scan, required if `scan` is an array
+
+        Returns
+        -------
+        ndarray
+            Boolean array with alarm state of each zone
+        '''
+        triggered = self.evaluate(scan, config)
+        self._on = np.where(triggered, self._on + 1, 0)
+        self._off = np.where(triggered, 0, self._off + 1)
+        self.alarms = (self.alarms | (self._on >= self.debounce)) & \
+            ~(self._off >= self.release)
+        return self.alarms
+
+    def active(self):
+        '''Returns list of names (or indices for unnamed zones) of zones
+        with raised alarms'''
+        return [zone.name if zone.name is not None else i
+                for i, zone in enumerate(self.zones) if self.alarms[i]]
+
+    def reset(self):
+        '''Clears alarms and debouncing counters'''
+        self.alarms[:] = False
+        self._on[:] = 0
+        self._off[:] = 0
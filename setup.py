@@ -12,7 +12,7 @@ setup(
     author_email='newpavlov@gmail.com',
     url='https://github.com/SkRobo/hokuyolx',
     license='MIT',
-    install_requires=['numpy'],
+    install_requires=['numpy', 'futures; python_version < "3"'],
     zip_safe=True,
     long_description='This module aims to implement communication protocol '
         'with Hokuyo laser rangefinder scaners, specifically with the'
@@ -0,0 +1,233 @@
+'''Minimal fake sensor speaking SCIP 2.0 over TCP, used by tests'''
+import socket
+import threading
+import time
+
+import numpy as np
+
+from hokuyolx.scan import Scan, ScanConfig
+
+
+def check_sum(line):
+    '''Returns SCIP checksum char of the line'''
+    return chr((sum(bytearray(line.encode('ascii'))) & 0x3f) + 0x30)
+
+
+def encode_int(value, chars):
+    '''Encodes integer using SCIP character encoding'''
+    return ''.join(chr(((value >> (6*(chars - i - 1))) & 0x3f) + 0x30)
+                   for i in range(chars))
+
+
+def data_blocks(raw):
+    '''Splits encoded data into 64 chars blocks with checksums'''
+    return [raw[i:i + 64] + check_sum(raw[i:i + 64])
+            for i in range(0, len(raw), 64)]
+
+
+def saturated_scan(dist=2000, start=540, cmd='MS'):
+    '''Returns scan of the default sensor measured with `cmd`, beams from
+    `start` have no return and are saturated as in 2-char encoding'''
+    config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080, 0, 0,
+                            cmd)
+    data = np.full(config.beams, dist, np.uint32)
+    data[start:] = 4095
+    return Scan(data, 1000, config)
+
+
+class FakeSensor(object):
+    '''Fake sensor listening on the local port. Distances of steps are
+    `1000 + (step*7) % 5000`, intensities are `100 + step`.'''
+
+    params = (('MODL', 'UST-10LX'), ('DMIN', '20'), ('DMAX', '30000'),
+              ('ARES', '1440'), ('AMIN', '0'), ('AMAX', '1080'),
+              ('AFRT', '540'), ('SCAN', '2400'))
+
+    def __init__(self, freq=40):
+        self.freq = freq
+        self.state = '000'
+        self.rpm = 2400
+        self.sensitivity = 0
+        self.requests = []
+        #: Status codes replied to the commands instead of executing them,
+        #: e.g. `{'GS': '0E'}`
+        self.statuses = {}
+        #: Apply accepted `CR` and `HS` settings?
+        self.apply_settings = True
+        self._t0 = time.time()
+        self._stream = None
+        self._lock = threading.Lock()
+        self._conns = []
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(4)
+        self.addr = self._server.getsockname()
+        self._spawn(self._accept)
+
+    @staticmethod
+    def _spawn(target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def dist(step):
+        '''Distance measured at the given step'''
+        return 1000 + (step*7) % 5000
+
+    @classmethod
+    def echoes(cls, step):
+        '''Distances and intensities of echoes measured at the given step,
+        the second echo (if any) is the strongest one'''
+        return [(cls.dist(step) + 100*i, 100 + step + (500 if i == 1 else i))
+                for i in range(step % 3 + 1)]
+
+    def stall(self):
+        '''Stops sending scans of the running measurment without
+        notifying the client'''
+        self._stream = None
+
+    def close(self):
+        '''Stops the server and closes connections'''
+        self._stream = None
+        for sock in [self._server] + self._conns:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except socket.error:
+                return
+            self._conns.append(conn)
+            self._spawn(self._serve, conn)
+
+    def _serve(self, conn):
+        data = b''
+        while True:
+            try:
+                chunk = conn.recv(4096)
+            except socket.error:
+                return
+            if not chunk:
+                return
+            data += chunk
+            while b'\n' in data:
+                line, data = data.split(b'\n', 1)
+                self._handle(conn, line.decode('ascii'))
+
+    def _send(self, conn, lines):
+        with self._lock:
+            conn.sendall(('\n'.join(lines) + '\n\n').encode('ascii'))
+
+    @staticmethod
+    def _status(code='00'):
+        return code + check_sum(code)
+
+    def _timestamp(self):
+        value = encode_int(int((time.time() - self._t0)*1000) & 0xffffff, 4)
+        return value + check_sum(value)
+
+    def _info(self, items):
+        lines = []
+        for key, value in items:
+            line = '%s:%s' % (key, value)
+            lines.append(line + ';' + check_sum(line))
+        return lines
+
+    def _scan_lines(self, cmd, start, end, grouping):
+        steps = range(start, end + 1, grouping or 1)
+        if cmd[0] in 'HN':
+            chars = 6 if cmd[1] == 'E' else 3
+            raw = ''.join(
+                '&'.join((encode_int(dist, 3) + encode_int(intens, 3))[:chars]
+                         for dist, intens in self.echoes(i)) for i in steps)
+        elif cmd[1] == 'E':
+            raw = ''.join(encode_int(self.dist(i), 3) +
+                          encode_int(100 + i, 3) for i in steps)
+        else:
+            chars = 2 if cmd[1] == 'S' else 3
+            raw = ''.join(encode_int(min(self.dist(i), 4095) if chars == 2
+                                     else self.dist(i), chars)
+                          for i in steps)
+        return [self._timestamp()] + data_blocks(raw)
+
+    def _handle(self, conn, req):
+        self.requests.append(req)
+        cmd = req[:3] if req.startswith('%') else req[:2]
+        if cmd in self.statuses:
+            self._send(conn, [req, self._status(self.statuses[cmd])])
+        elif cmd == '%ST':
+            self._send(conn, [req, self._status(),
+                              self.state + check_sum(self.state)])
+        elif cmd == 'PP':
+            self._send(conn, [req, self._status()] + self._info(self.params))
+        elif cmd == 'VV':
+            self._send(conn, [req, self._status()] + self._info(
+                (('VEND', 'Hokuyo'), ('PROD', 'UST-10LX'))))
+        elif cmd == 'II':
+            speed = 'Initial(2400[rpm])' if self.rpm == 2400 else \
+                'Changed(%d[rpm])' % self.rpm
+            mode = 'High Sensitivity' if self.sensitivity else 'Normal'
+            self._send(conn, [req, self._status()] + self._info(
+                (('MODL', 'UST-10LX'), ('SCSP', speed), ('MESM', mode))))
+        elif cmd == 'TM':
+            if req[2] == '1':
+                self._send(conn, [req, self._status(), self._timestamp()])
+            else:
+                self.state = '002' if req[2] == '0' else '000'
+                self._send(conn, [req, self._status()])
+        elif cmd == 'BM':
+            self.state = '003'
+            self._send(conn, [req, self._status()])
+        elif cmd == 'QT':
+            self._stream = None
+            self.state = '000'
+            self._send(conn, [req, self._status()])
+        elif cmd == 'CR':
+            if self.apply_settings:
+                ratio = int(req[2:4])
+                self.rpm = 2400 if ratio in (0, 99) else 2400 - 60*ratio
+            self._send(conn, [req, self._status()])
+        elif cmd == 'HS':
+            if self.apply_settings:
+                self.sensitivity = int(req[2])
+            self._send(conn, [req, self._status()])
+        elif cmd in ('GD', 'GE', 'GS', 'HD', 'HE'):
+            start, end, grouping = int(req[2:6]), int(req[6:10]), \
+                int(req[10:12])
+            self._send(conn, [req, self._status()] +
+                       self._scan_lines(cmd, start, end, grouping))
+        elif cmd in ('MD', 'ME', 'MS'):
+            self._send(conn, [req, self._status()])
+            self.state = '004'
+            token = self._stream = object()
+            self._spawn(self._stream_scans, conn, req, cmd, token)
+        else:
+            self._send(conn, [req, self._status('0E')])
+
+    def _stream_scans(self, conn, req, cmd, token):
+        start, end, grouping = int(req[2:6]), int(req[6:10]), int(req[10:12])
+        skips, scans = int(req[12]), int(req[13:15])
+        left = scans
+        while True:
+            time.sleep((skips + 1)/float(self.freq))
+            if self._stream is not token:
+                return
+            if scans:
+                left -= 1
+            header = req[:13] + '%0.2d' % left
+            try:
+                self._send(conn, [header, self._status('99')] +
+                           self._scan_lines(cmd, start, end, grouping))
+            except socket.error:
+                return
+            if scans and left == 0:
+                self._stream = None
+                self.state = '003'
+                return
@@ -0,0 +1,45 @@
+import time
+import unittest
+
+from hokuyolx import HokuyoLX
+from fakesensor import FakeSensor
+
+
+class AdaptiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def check_slow_consumer(self, multiplex):
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False, multiplex=multiplex)
+        changes = []
+        # lag limit is disabled, so only the backlog triggers the change
+        gen = self.laser.iter_adaptive(
+            max_lag=1e9, patience=2,
+            on_change=lambda *args: changes.append(args))
+        configs = []
+        for i, scan in enumerate(gen):
+            configs.append(scan.config)
+            if changes or i > 30:
+                break
+            time.sleep(0.1)
+        gen.close()
+        self.assertEqual(changes, [(1, 0, 1)])
+        self.assertEqual(configs[0].skips, 0)
+        self.assertEqual(configs[-1].skips, 1)
+        self.assertEqual(self.sensor.requests.count('QT'), 1)
+
+    def test_slow_consumer_direct(self):
+        self.check_slow_consumer(False)
+
+    def test_slow_consumer_multiplex(self):
+        self.check_slow_consumer(True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from hokuyolx import ScanArchiveReader, ScanArchiveWriter
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import Scan, ScanConfig
+
+
+def make_config(cmd='MD'):
+    return ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080, 0, 0,
+                          cmd)
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'scans.hlx')
+        self.rng = np.random.RandomState(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_scans(self, count, with_intensity):
+        shape = (count, 1081) + ((2, ) if with_intensity else ())
+        data = self.rng.randint(0, 2**18, shape).astype(np.uint32)
+        timestamps = 1000 + 25*np.arange(count, dtype=np.int64)
+        seqs = np.arange(count, dtype=np.int64)*2
+        return data, timestamps, seqs
+
+    def write(self, config, data, timestamps, seqs, **kwargs):
+        with ScanArchiveWriter(self.path, config, chunk_size=7,
+                               **kwargs) as arc:
+            for i in range(5):
+                arc.write(Scan(data[i], int(timestamps[i]), config,
+                               seq=int(seqs[i])))
+            arc.write_batch(data[5:17], timestamps[5:17], seqs[5:17])
+            for i in range(17, len(data)):
+                arc.write(data[i], int(timestamps[i]), int(seqs[i]))
+
+    def check_round_trip(self, cmd, compression):
+        config = make_config(cmd)
+        data, timestamps, seqs = self.make_scans(30, cmd == 'ME')
+        self.write(config, data, timestamps, seqs, compression=compression)
+        with ScanArchiveReader(self.path) as reader:
+            self.assertIs(reader.config, config)
+            self.assertEqual(len(reader), 30)
+            self.assertEqual(len(reader.index), 5)
+            res = reader.query()
+            for col, expected in zip(res, (data, timestamps, seqs)):
+                self.assertTrue(np.array_equal(col, expected))
+            for t0, t1 in ((1100, 1400), (None, 1012), (1700, None),
+                           (1001, 1024), (5000, 6000)):
+                lo = timestamps.min() if t0 is None else t0
+                hi = timestamps.max() if t1 is None else t1
+                mask = (timestamps >= lo) & (timestamps <= hi)
+                res = reader.query(t0, t1)
+                self.assertEqual(res[0].shape, data[mask].shape)
+                self.assertTrue(np.array_equal(res[0], data[mask]))
+                self.assertTrue(np.array_equal(res[1], timestamps[mask]))
+                self.assertTrue(np.array_equal(res[2], seqs[mask]))
+            self.assertEqual(reader.chunks(1100, 1200).tolist(), [0, 1])
+            scans = list(reader.iter_scans(1100, 1200))
+            self.assertEqual([scan.seq for scan in scans],
+                             seqs[4:9].tolist())
+            self.assertTrue(np.array_equal(scans[0].data, data[4]))
+            self.assertIs(scans[0].config, config)
+
+    def test_dist(self):
+        self.check_round_trip('MD', 'zlib')
+
+    def test_intens(self):
+        self.check_round_trip('ME', 'zlib')
+
+    def test_compressions(self):
+        self.check_round_trip('MD', 'none')
+        try:
+            import lzma
+        except ImportError:
+            return
+        self.check_round_trip('ME', 'lzma')
+
+    def test_errors(self):
+        self.assertRaises(HokuyoException, ScanArchiveWriter, self.path,
+                          make_config(), compression='foo')
+        arc = ScanArchiveWriter(self.path, make_config())
+        self.assertRaises(HokuyoException, arc.write,
+                          np.zeros(1081, np.uint32))
+        arc.write(np.zeros(1081, np.uint32), 0)
+        arc.flush()
+        arc._file.flush()
+        self.assertRaises(HokuyoException, ScanArchiveReader, self.path)
+        arc.close()
+        with ScanArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.background import BackgroundModel, _P2Percentile
+from hokuyolx.exceptions import HokuyoException
+
+
+class P2PercentileTest(unittest.TestCase):
+
+    def test_estimate(self):
+        rng = np.random.RandomState(0)
+        data = rng.normal(3000, 30, (2000, 100))
+        valid = rng.uniform(size=data.shape) > 0.2
+        for percentile in (2., 50., 98.):
+            estimator = _P2Percentile(data.shape[1], percentile)
+            for values, mask in zip(data, valid):
+                estimator.update(values, mask)
+            expected = np.nanpercentile(np.where(valid, data, np.nan),
+                                        percentile, axis=0)
+            self.assertEqual(list(estimator.count), list(valid.sum(axis=0)))
+            self.assertLess(np.abs(estimator.estimate() - expected).mean(),
+                            5)
+
+    def test_few_values(self):
+        estimator = _P2Percentile(3, 50.)
+        estimator.update(np.array([1., 2., 3.]),
+                         np.array([True, True, False]))
+        estimator.update(np.array([5., 2., 3.]),
+                         np.array([True, False, False]))
+        result = estimator.estimate()
+        self.assertEqual(list(result[:2]), [3., 2.])
+        self.assertTrue(np.isnan(result[2]))
+
+
+class BackgroundModelTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.scans = rng.normal(3000, 10, (300, 1081)).astype(np.uint32)
+
+    def test_train(self):
+        model = BackgroundModel(train_scans=50, dmin=20, dmax=30000)
+        foregrounds = list(model.iter_foreground(self.scans[:100]))
+        self.assertTrue(model.trained)
+        self.assertEqual(len(foregrounds), 50)
+
+    def test_fit(self):
+        model = BackgroundModel(train_scans=50, dmin=20, dmax=30000)
+        model.fit(self.scans[:200])
+        self.assertEqual(model.train_scans, 50)
+        self.assertEqual(len(model.apply(self.scans[250])), 0)
+        scan = self.scans[260].copy()
+        scan[100:110] = 1000
+        scan[500] = 0
+        self.assertEqual(list(model.apply(scan).indices),
+                         list(range(100, 110)))
+        self.assertRaises(HokuyoException, model.fit, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
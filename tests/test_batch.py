@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX
+from hokuyolx.batch import ScanBatch
+from fakesensor import FakeSensor
+
+
+class FilteringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False)
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def check_filtering(self, chars, dmin=None, dmax=None):
+        online = []
+        raw = []
+        gen = self.laser.iter_filtered_dist(2, dmin=dmin, dmax=dmax,
+                                            chars=chars)
+        for scan, _, _ in gen:
+            online.append(scan)
+        for scan in self.laser.iter_dist(2, chars=chars):
+            raw.append(scan)
+        batch = ScanBatch(np.array([scan.data for scan in raw]),
+                          np.array([scan.timestamp for scan in raw]),
+                          np.array([scan.seq for scan in raw]),
+                          raw[0].config)
+        for offline, scan, expected in zip(batch.filtered(dmin, dmax), raw,
+                                           online):
+            self.assertTrue(np.array_equal(offline, expected))
+            self.assertTrue(np.array_equal(scan.filtered(dmin, dmax),
+                                           expected))
+        mask = batch.valid_mask(dmin, dmax)
+        self.assertEqual([m.sum() for m in mask],
+                         [len(scan) for scan in online])
+        return online
+
+    def test_2char(self):
+        online = self.check_filtering(2)
+        # saturated values of 2-char encoding are filtered out
+        self.assertLessEqual(online[0][:, 1].max(), self.laser.dmax_2char)
+        self.assertLess(len(online[0]), 1081)
+
+    def test_3char(self):
+        online = self.check_filtering(3, dmin=1500)
+        self.assertGreater(online[0][:, 1].max(), self.laser.dmax_2char)
+
+
+if __name__ == '__main__':
+    unittest.main()
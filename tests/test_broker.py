@@ -0,0 +1,180 @@
+import logging
+import threading
+import unittest
+
+import numpy as np
+
+from hokuyolx.broker import ScanBroker, ScanClient, _Subscriber, \
+    decode_data, decode_header, encode_config, encode_scan, MSG_CONFIG, \
+    MSG_SCAN, _HEADER
+from hokuyolx.scan import Scan, ScanConfig
+
+
+def make_config(grouping=0, cmd='MD'):
+    return ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080,
+                          grouping, 0, cmd)
+
+
+def make_scan(config, seq, value=1000):
+    shape = (config.beams, 2) if config.with_intensity else (config.beams, )
+    return Scan(np.full(shape, value, np.uint32), 100*seq, config, seq=seq,
+                host_time=1.5)
+
+
+class BlockingSocket(object):
+    '''Socket stub which blocks the first send until released'''
+
+    def __init__(self, count):
+        self.sent = []
+        self.count = count
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.done = threading.Event()
+
+    def sendall(self, packet):
+        self.started.set()
+        self.release.wait(5)
+        self.sent.append(packet)
+        if len(self.sent) == self.count:
+            self.done.set()
+
+    def close(self):
+        pass
+
+
+def kinds(packets):
+    return [(decode_header(packet[:_HEADER.size])[0],
+             decode_header(packet[:_HEADER.size])[3]) for packet in packets]
+
+
+class EncodingTest(unittest.TestCase):
+
+    def check_roundtrip(self, config, value):
+        scan = make_scan(config, 7, value)
+        packet = encode_scan(scan, 3)
+        kind, flags, length, seq, scan_seq, timestamp, host_time = \
+            decode_header(packet[:_HEADER.size])
+        self.assertEqual((kind, seq, scan_seq, timestamp, host_time),
+                         (MSG_SCAN, 3, 7, 700, 1.5))
+        data = decode_data(packet[_HEADER.size:], flags)
+        self.assertEqual(length, len(packet) - _HEADER.size)
+        self.assertTrue(np.array_equal(data, scan.data))
+
+    def test_scan(self):
+        self.check_roundtrip(make_config(), 1000)
+        self.check_roundtrip(make_config(), 70000)
+        self.check_roundtrip(make_config(cmd='ME'), 1000)
+
+    def test_config(self):
+        packet = encode_config(make_config(2), 5)
+        header = decode_header(packet[:_HEADER.size])
+        self.assertEqual((header[0], header[3]), (MSG_CONFIG, 5))
+
+
+class SubscriberTest(unittest.TestCase):
+
+    def make_subscriber(self, policy, count, size=2):
+        sock = BlockingSocket(count)
+        sub = _Subscriber(sock, 'test', policy, size,
+                          logging.getLogger('test'))
+        return sub, sock
+
+    def run_subscriber(self, sub, sock):
+        a, b = make_config(), make_config(2)
+        sub.push(encode_config(a, 1), config=True)
+        # sender thread blocks on the first config message
+        self.assertTrue(sock.started.wait(5))
+        for seq in (1, 2, 3):
+            sub.push(encode_scan(make_scan(a, seq), seq))
+        sub.push(encode_config(b, 4), config=True)
+        sub.push(encode_scan(make_scan(b, 4), 4))
+        sock.release.set()
+        self.assertTrue(sock.done.wait(5))
+        sub.close()
+        return kinds(sock.sent)
+
+    def test_config_order(self):
+        sub, sock = self.make_subscriber('oldest', 6, 10)
+        self.assertEqual(self.run_subscriber(sub, sock),
+                         [(MSG_CONFIG, 1), (MSG_SCAN, 1), (MSG_SCAN, 2),
+                          (MSG_SCAN, 3), (MSG_CONFIG, 4), (MSG_SCAN, 4)])
+        self.assertEqual(sub.dropped, 0)
+
+    def test_drop_oldest(self):
+        sub, sock = self.make_subscriber('oldest', 4)
+        self.assertEqual(self.run_subscriber(sub, sock),
+                         [(MSG_CONFIG, 1), (MSG_SCAN, 3), (MSG_CONFIG, 4),
+                          (MSG_SCAN, 4)])
+        self.assertEqual(sub.dropped, 2)
+
+    def test_drop_newest(self):
+        sub, sock = self.make_subscriber('newest', 4)
+        self.assertEqual(self.run_subscriber(sub, sock),
+                         [(MSG_CONFIG, 1), (MSG_SCAN, 1), (MSG_SCAN, 2),
+                          (MSG_CONFIG, 4)])
+        self.assertEqual(sub.dropped, 2)
+
+
+class BrokerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = ScanBroker(addr=('127.0.0.1', 0), queue_size=100)
+        self.broker.start()
+
+    def tearDown(self):
+        self.broker.close()
+
+    def connect(self):
+        client = ScanClient(self.broker.addr, timeout=2)
+        # wait until the broker registers the subscriber
+        for _ in range(200):
+            if self.broker.subscribers:
+                break
+            threading.Event().wait(0.01)
+        return client
+
+    def test_config_change(self):
+        client = self.connect()
+        try:
+            configs = [make_config(), make_config(2), make_config(4)]
+            for seq in range(30):
+                self.broker.publish(make_scan(configs[seq//10], seq))
+            scans = list(client.iter_scans(30))
+        finally:
+            client.close()
+        self.assertEqual([scan.seq for scan in scans], list(range(30)))
+        for scan in scans:
+            self.assertIs(scan.config, configs[scan.seq//10])
+            self.assertEqual(len(scan.data), scan.config.beams)
+        self.assertEqual(client.dropped, 0)
+
+    def test_iter_dist(self):
+        client = self.connect()
+        try:
+            for seq in range(3):
+                self.broker.publish(make_scan(make_config(cmd='ME'), seq))
+            scans = list(client.iter_dist(3))
+        finally:
+            client.close()
+        for scan in scans:
+            self.assertEqual(scan.data.ndim, 1)
+            self.assertFalse(scan.config.with_intensity)
+            self.assertIs(scan.config, make_config(cmd='MD'))
+
+    def test_udp(self):
+        client = ScanClient(('127.0.0.1', 0), udp=True, timeout=2)
+        broker = ScanBroker(addr=None, udp=[client._sock.getsockname()])
+        try:
+            broker.start()
+            for seq in range(3):
+                broker.publish(make_scan(make_config(), seq))
+            scans = list(client.iter_scans(3))
+        finally:
+            broker.close()
+            client.close()
+        self.assertEqual([scan.seq for scan in scans], [0, 1, 2])
+        self.assertIs(scans[0].config, make_config())
+
+
+if __name__ == '__main__':
+    unittest.main()
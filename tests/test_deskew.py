@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import Trajectory, deskew
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import Scan, ScanConfig
+
+WALL = 3000. #: Wall `x = WALL` in the world frame
+
+
+def make_trajectory(omega=2*np.pi/1000, speed=0.5):
+    '''Robot driving along x axis and rotating with the given angular speed
+    in rad/ms and linear speed in mm/ms'''
+    times = np.arange(-100., 200., 10.)
+    poses = np.column_stack((speed*times, np.zeros_like(times),
+                             omega*times))
+    return Trajectory(times, poses)
+
+
+def wall_scan(trajectory, extrinsic=None, timestamp=20):
+    '''Scan of the wall measured by the sensor moving along
+    the trajectory, beams which do not hit the wall have no return'''
+    config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080, 0, 0,
+                            'MD')
+    poses = trajectory(timestamp + config.time_offsets)
+    ex, ey, et = extrinsic or (0., 0., 0.)
+    c, s = np.cos(poses[:, 2]), np.sin(poses[:, 2])
+    sx = poses[:, 0] + c*ex - s*ey
+    direction = poses[:, 2] + et + config.angles
+    with np.errstate(divide='ignore'):
+        dist = (WALL - sx)/np.cos(direction)
+    dist[(np.cos(direction) < 0.3) | (dist > 30000)] = 0
+    return Scan(np.round(dist).astype(np.uint32), timestamp, config)
+
+
+class DeskewTest(unittest.TestCase):
+
+    def check_wall(self, extrinsic):
+        trajectory = make_trajectory()
+        scan = wall_scan(trajectory, extrinsic)
+        valid = scan.valid_mask
+        self.assertGreater(valid.sum(), 300)
+        points = deskew(scan, trajectory, extrinsic=extrinsic, world=True)
+        self.assertLess(np.abs(points[valid, 0] - WALL).max(), 1.)
+        # points in the robot frame at the scan timestamp
+        local = deskew(scan, trajectory, extrinsic=extrinsic)
+        x, y, theta = trajectory(scan.timestamp)
+        c, s = np.cos(theta), np.sin(theta)
+        self.assertLess(np.abs(c*local[valid, 0] - s*local[valid, 1] + x -
+                               WALL).max(), 1.)
+        return scan, points
+
+    def test_rotating(self):
+        scan, _ = self.check_wall(None)
+        # without deskewing the wall is noticeably distorted
+        trajectory = make_trajectory()
+        x, y, theta = trajectory(scan.timestamp)
+        points = scan.points[scan.valid_mask]
+        wx = np.cos(theta)*points[:, 0] - np.sin(theta)*points[:, 1] + x
+        self.assertGreater(np.abs(wx - WALL).max(), 100.)
+
+    def test_extrinsic(self):
+        self.check_wall((100., -50., 0.3))
+
+    def test_ref_time(self):
+        trajectory = make_trajectory()
+        scan = wall_scan(trajectory)
+        valid = scan.valid_mask
+        local = deskew(scan, trajectory, ref_time=0)
+        x, y, theta = trajectory(0)
+        c, s = np.cos(theta), np.sin(theta)
+        wx = c*local[valid, 0] - s*local[valid, 1] + x
+        self.assertLess(np.abs(wx - WALL).max(), 1.)
+
+    def test_errors(self):
+        trajectory = make_trajectory()
+        scan = wall_scan(trajectory)
+        self.assertRaises(HokuyoException, deskew, scan.data, trajectory)
+        self.assertRaises(HokuyoException, deskew, scan, Trajectory())
+
+
+class TrajectoryTest(unittest.TestCase):
+
+    def test_unwrap(self):
+        trajectory = Trajectory([0, 10], [(0, 0, 3.), (10, 0, -3.)])
+        trajectory.append(20, (20, 0, -2.8))
+        pose = trajectory(np.array([5., 15., 30.]))
+        self.assertAlmostEqual(pose[0, 2], np.pi)
+        self.assertAlmostEqual(pose[1, 0], 15.)
+        # times outside of the trajectory are clamped
+        self.assertAlmostEqual(pose[2, 0], 20.)
+
+    def test_maxlen(self):
+        trajectory = Trajectory(maxlen=3)
+        for t in range(5):
+            trajectory.append(t, (t, 0, 0))
+        self.assertEqual(len(trajectory), 3)
+        self.assertEqual(trajectory.times.tolist(), [2., 3., 4.])
+        self.assertRaises(HokuyoException, trajectory.append, 4, (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
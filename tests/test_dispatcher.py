@@ -0,0 +1,138 @@
+import socket
+import time
+import unittest
+
+from hokuyolx import HokuyoLX
+from hokuyolx.dispatcher import Dispatcher, split_frames
+from hokuyolx.exceptions import HokuyoException
+from fakesensor import FakeSensor
+
+
+class SplitFramesTest(unittest.TestCase):
+
+    def test_split(self):
+        frames, rest = split_frames(b'A\n00P\n\nB\n00P\n\nC\n0')
+        self.assertEqual(frames, [b'A\n00P', b'B\n00P'])
+        self.assertEqual(rest, b'C\n0')
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor_sock, sock = socket.socketpair()
+        self.dispatcher = Dispatcher(sock, poll=0.01)
+        self.dispatcher.start()
+
+    def tearDown(self):
+        self.dispatcher.stop(1)
+        self.sensor_sock.close()
+
+    def send(self, data):
+        self.sensor_sock.sendall(data)
+
+    def test_request_routing(self):
+        first = self.dispatcher.request('II')
+        second = self.dispatcher.request('VV')
+        self.send(b'VV\n00P\nVEND:x;a\n\nII\n00P\n\n')
+        self.assertEqual(second.result(1), ['VV', '00P', 'VEND:x;a'])
+        self.assertEqual(first.result(1), ['II', '00P'])
+
+    def test_pipelined_requests(self):
+        futures = [self.dispatcher.request('%ST') for _ in range(3)]
+        self.send(b''.join(b'%%ST\n00P\n00%d\n\n' % i for i in range(3)))
+        self.assertEqual([future.result(1)[2] for future in futures],
+                         ['000', '001', '002'])
+
+    def test_split_chunks(self):
+        future = self.dispatcher.request('II')
+        for part in (b'I', b'I\n00', b'P\nA:1;x\n', b'\n'):
+            self.send(part)
+            time.sleep(0.02)
+        self.assertEqual(future.result(1), ['II', '00P', 'A:1;x'])
+
+    def test_stream_routing(self):
+        stream = self.dispatcher.open_stream('MD00001080')
+        future = self.dispatcher.request('%ST')
+        self.send(b'MD0000108000000\n99b\n\n%ST\n00P\n000\n\n'
+                  b'MD0000108000000\n99b\n\n')
+        self.assertEqual(future.result(1), ['%ST', '00P', '000'])
+        for _ in range(2):
+            lines, recv_time = stream.get(timeout=1)
+            self.assertEqual(lines, ['MD0000108000000', '99b'])
+            self.assertAlmostEqual(recv_time, time.time()*1000, delta=1000)
+        self.assertEqual(self.dispatcher.backlog(), 0)
+
+    def test_unknown_frames_discarded(self):
+        future = self.dispatcher.request('BM')
+        self.send(b'QT\n00P\n\nBM\n00P\n\n')
+        self.assertEqual(future.result(1), ['BM', '00P'])
+
+    def test_connection_closed(self):
+        future = self.dispatcher.request('II')
+        stream = self.dispatcher.open_stream('MD')
+        self.sensor_sock.close()
+        self.assertRaises(HokuyoException, future.result, 1)
+        self.assertIsInstance(stream.get(timeout=1), HokuyoException)
+        self.assertRaises(HokuyoException,
+                          self.dispatcher.request('VV').result, 1)
+
+    def test_stop_fails_pending(self):
+        future = self.dispatcher.request('II')
+        self.dispatcher.stop(1)
+        self.assertFalse(self.dispatcher.running)
+        self.assertRaises(HokuyoException, future.result, 1)
+
+
+class MultiplexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False, multiplex=True)
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def test_requests_during_measurment(self):
+        gen = self.laser.iter_dist()
+        states = []
+        for i, scan in enumerate(gen):
+            self.assertEqual(scan.dist[10], FakeSensor.dist(10))
+            states.append(self.laser.laser_state()[0])
+            if i == 3:
+                break
+        gen.close()
+        self.laser.standby()
+        self.assertEqual(states, [4]*4)
+        self.assertEqual(self.laser.laser_state()[0], 0)
+
+    def test_submit_req(self):
+        replies = [self.laser.submit_req('%ST') for _ in range(5)]
+        self.assertEqual([reply.result()[0] for reply in replies],
+                         ['00']*5)
+
+    def test_submit_dist_retry(self):
+        expected = [FakeSensor.dist(i) for i in range(1081)]
+        reply = self.laser.submit_dist()
+        convert2ts = self.laser._convert2ts
+        failures = []
+
+        def failing(*args):
+            if not failures:
+                failures.append(True)
+                raise HokuyoException('Conversion failed')
+            return convert2ts(*args)
+        self.laser._convert2ts = failing
+        try:
+            self.assertRaises(HokuyoException, reply.result)
+            timestamp, dist = reply.result()
+        finally:
+            del self.laser._convert2ts
+        self.assertEqual(dist.tolist(), expected)
+        self.assertEqual(reply.result()[1].tolist(), expected)
+        self.assertEqual(reply.result()[0], timestamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
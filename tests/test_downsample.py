@@ -0,0 +1,18 @@
+import unittest
+
+from hokuyolx.downsample import Downsampler
+from fakesensor import saturated_scan
+
+
+class DownsamplerTest(unittest.TestCase):
+
+    def test_2char_saturation(self):
+        self.assertEqual(len(Downsampler()(saturated_scan())), 540)
+        self.assertEqual(len(Downsampler(group=4)(saturated_scan())), 135)
+
+    def test_3char(self):
+        self.assertEqual(len(Downsampler()(saturated_scan(cmd='MD'))), 1081)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX, MultiEcho
+from hokuyolx.exceptions import HokuyoException
+from fakesensor import FakeSensor
+
+
+def make_echoes():
+    # beams with 1, 3 and 2 echoes
+    dist = np.array([1000, 2000, 2100, 2200, 3000, 3100])
+    intens = np.array([10, 5, 30, 20, 40, 40])
+    return MultiEcho(dist, np.array([0, 1, 4, 6]), intens)
+
+
+class MultiEchoTest(unittest.TestCase):
+
+    def test_selection(self):
+        echoes = make_echoes()
+        self.assertEqual(len(echoes), 3)
+        self.assertEqual(echoes.counts.tolist(), [1, 3, 2])
+        self.assertEqual(echoes.beam_ids.tolist(), [0, 1, 1, 1, 2, 2])
+        self.assertEqual(echoes.first().tolist(),
+                         [[1000, 10], [2000, 5], [3000, 40]])
+        self.assertEqual(echoes.last().tolist(),
+                         [[1000, 10], [2200, 20], [3100, 40]])
+        strongest = echoes.strongest()
+        self.assertEqual(strongest[:2].tolist(), [[1000, 10], [2100, 30]])
+        self.assertEqual(strongest[2, 1], 40)
+        beam_ids, scan = echoes.all()
+        self.assertEqual(beam_ids.tolist(), echoes.beam_ids.tolist())
+        self.assertEqual(scan[:, 0].tolist(), echoes.dist.tolist())
+
+    def test_without_intensities(self):
+        echoes = make_echoes()
+        echoes = MultiEcho(echoes.dist, echoes.offsets)
+        self.assertEqual(echoes.first().tolist(), [1000, 2000, 3000])
+        self.assertEqual(echoes.last().tolist(), [1000, 2200, 3100])
+        self.assertRaises(HokuyoException, echoes.strongest)
+
+
+class SensorEchoesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False)
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def test_multi_intens(self):
+        _, echoes = self.laser.get_multi_intens()
+        self.assertEqual(len(echoes), 1081)
+        expected = [FakeSensor.echoes(i) for i in range(1081)]
+        self.assertEqual(echoes.counts.tolist(),
+                         [len(beam) for beam in expected])
+        self.assertEqual(echoes.first().tolist(),
+                         [list(beam[0]) for beam in expected])
+        self.assertEqual(echoes.last().tolist(),
+                         [list(beam[-1]) for beam in expected])
+        self.assertEqual(echoes.strongest().tolist(),
+                         [list(max(beam, key=lambda echo: echo[1]))
+                          for beam in expected])
+
+    def test_multi_dist(self):
+        _, echoes = self.laser.get_multi_dist(0, 100, 1)
+        self.assertEqual(len(echoes), 101)
+        self.assertIsNone(echoes.intens)
+        self.assertEqual(echoes.last().tolist(),
+                         [FakeSensor.echoes(i)[-1][0] for i in range(101)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX
+from hokuyolx.exceptions import HokuyoStatusException
+from fakesensor import FakeSensor, encode_int
+
+
+class DecodingTest(unittest.TestCase):
+
+    def test_convert2array(self):
+        for chars in (2, 3):
+            values = [0, 1, 63, 64, 4095, 2**(6*chars) - 1]
+            raw = ''.join(encode_int(value, chars) for value in values)
+            res = HokuyoLX._convert2array(raw.encode('ascii'), chars)
+            self.assertEqual(res.tolist(), values)
+            self.assertEqual(res.tolist(), [HokuyoLX._convert2int(
+                raw[i:i + chars]) for i in range(0, len(raw), chars)])
+
+
+class TwoCharTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False)
+        self.expected = np.array([FakeSensor.dist(i) for i in range(1081)])
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def test_get_dist(self):
+        _, dist3 = self.laser.get_dist()
+        _, dist2 = self.laser.get_dist(chars=2)
+        self.assertTrue(np.array_equal(dist3, self.expected))
+        self.assertTrue(np.array_equal(dist2,
+                                       np.minimum(self.expected, 4095)))
+        self.assertIn('GS0000108000', self.sensor.requests)
+
+    def test_iter_dist(self):
+        scans = list(self.laser.iter_dist(3, chars=2))
+        self.assertEqual(len(scans), 3)
+        for scan in scans:
+            self.assertEqual(scan.config.cmd, 'MS')
+            self.assertTrue(np.array_equal(scan.dist,
+                                           np.minimum(self.expected, 4095)))
+
+    def test_filtered_auto(self):
+        _, scan2 = self.laser.get_filtered_dist(dmax=3000)
+        _, scan3 = self.laser.get_filtered_dist(dmax=3000, chars=3)
+        self.assertTrue(any(req.startswith('GS')
+                            for req in self.sensor.requests))
+        self.assertTrue(np.array_equal(scan2, scan3))
+        # saturated values are filtered out with the default dmax
+        _, scan2 = self.laser.get_filtered_dist(chars=2)
+        self.assertEqual(scan2[:, 1].max(), 4094)
+
+    def check_fallback(self, code):
+        self.sensor.statuses['GS'] = code
+        self.sensor.statuses['MS'] = code
+        _, scan = self.laser.get_filtered_dist(dmax=3000)
+        self.assertFalse(self.laser.two_char)
+        self.assertEqual(scan[:, 1].max(), self.expected[
+            self.expected <= 3000].max())
+        requests = self.sensor.requests
+        self.assertEqual(requests[-1][:2], 'GD')
+        self.assertEqual(requests[-2][:2], 'GS')
+        # 2-char encoding is not used anymore
+        scans = list(self.laser.iter_filtered_dist(2, dmax=3000))
+        self.assertEqual(len(scans), 2)
+        self.assertFalse(any(req.startswith('MS') for req in requests))
+
+    def test_fallback_not_defined(self):
+        self.check_fallback('0E')
+
+    def test_fallback_not_supported(self):
+        self.check_fallback('0F')
+
+    def test_iter_fallback(self):
+        self.sensor.statuses['MS'] = '0E'
+        scans = list(self.laser.iter_filtered_dist(2, dmax=3000))
+        self.assertEqual(len(scans), 2)
+        self.assertFalse(self.laser.two_char)
+        self.assertEqual(scans[0][0][:, 1].max(), self.expected[
+            self.expected <= 3000].max())
+
+    def test_no_fallback(self):
+        self.sensor.statuses['GS'] = '0E'
+        self.assertRaises(HokuyoStatusException, self.laser.get_dist,
+                          chars=2)
+        self.assertRaises(HokuyoStatusException,
+                          self.laser.get_filtered_dist, dmax=3000, chars=2)
+        self.sensor.statuses['GS'] = '0L'
+        self.assertRaises(HokuyoStatusException,
+                          self.laser.get_filtered_dist, dmax=3000)
+        self.assertTrue(self.laser.two_char)
+
+
+if __name__ == '__main__':
+    unittest.main()
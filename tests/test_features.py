@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.features import extract_lines
+from hokuyolx.scan import Scan, ScanConfig
+from hokuyolx.segmentation import segment
+
+
+def room_corner(noise=0., seed=0):
+    '''Scan of the room corner formed by walls `x = 2000` and `y = 1500`,
+    beams looking outside of the first quadrant have no return'''
+    config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080, 0, 0,
+                            'MD')
+    with np.errstate(divide='ignore'):
+        dist = np.minimum(2000/config.cos, 1500/config.sin)
+    inside = (config.angles > 0.05) & (config.angles < np.pi/2 - 0.05)
+    dist[~inside] = 0
+    dist[inside] += np.random.RandomState(seed).normal(0, noise,
+                                                       inside.sum())
+    return Scan(np.round(dist).astype(np.uint32), 0, config)
+
+
+class ExtractLinesTest(unittest.TestCase):
+
+    def check_corner(self, lines, tol_r, tol_alpha):
+        self.assertEqual(len(lines), 2)
+        order = np.argsort(lines.alpha)
+        self.assertTrue(np.allclose(lines.alpha[order], [0, np.pi/2],
+                                    atol=tol_alpha))
+        self.assertTrue(np.allclose(lines.r[order], [2000, 1500],
+                                    atol=tol_r))
+        self.assertEqual(lines.corners.shape, (1, 2))
+        self.assertTrue(np.allclose(lines.corners[0], [2000, 1500],
+                                    atol=tol_r))
+        self.assertEqual(sorted(lines.corner_lines[0].tolist()), [0, 1])
+        self.assertEqual(lines.cov.shape, (2, 2, 2))
+        self.assertEqual(lines.endpoints.shape, (2, 2, 2))
+        # lines share the split point at the corner
+        self.assertEqual(lines.first[1], lines.last[0])
+        self.assertTrue(np.array_equal(lines.counts,
+                                       lines.last - lines.first + 1))
+
+    def test_corner(self):
+        lines = extract_lines(segment(room_corner()))
+        self.check_corner(lines, 2., 1e-3)
+
+    def test_noisy_corner(self):
+        lines = extract_lines(segment(room_corner(5.)))
+        self.check_corner(lines, 10., 0.01)
+
+    def test_min_points(self):
+        segments = segment(room_corner())
+        lines = extract_lines(segments, min_points=segments.counts.max() + 1)
+        self.assertEqual(len(lines), 0)
+        self.assertEqual(lines.corners.shape, (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from hokuyolx import start_fleet
+from hokuyolx.exceptions import HokuyoException, HokuyoStatusException
+from fakesensor import FakeSensor
+
+
+class FleetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensors = [FakeSensor() for _ in range(3)]
+
+    def tearDown(self):
+        for sensor in self.sensors:
+            sensor.close()
+
+    def test_startup(self):
+        addrs = [sensor.addr for sensor in self.sensors]
+        with start_fleet(addrs, tsync=False, convert_time=False) as fleet:
+            self.assertEqual(fleet.failed, [])
+            self.assertEqual([report.addr for report in fleet.reports],
+                             addrs)
+            for sensor, report in zip(self.sensors, fleet.reports):
+                self.assertTrue(report.ok)
+                self.assertEqual(sensor.state, '003')
+                self.assertEqual(sorted(report.timings),
+                                 ['activate', 'connect', 'info', 'total'])
+                self.assertEqual(report.laser.model, 'UST-10LX')
+
+    def test_one_failing(self):
+        dead = FakeSensor()
+        dead.close()
+        self.sensors[1].statuses['BM'] = '0L'
+        addrs = [self.sensors[0].addr, dead.addr, self.sensors[1].addr,
+                 self.sensors[2].addr]
+        with start_fleet(addrs, tsync=False, convert_time=False,
+                         timeout=1) as fleet:
+            self.assertEqual(len(fleet.failed), 2)
+            lasers = fleet.lasers
+            self.assertIsNone(lasers[1])
+            self.assertIsNone(lasers[2])
+            self.assertIsNotNone(fleet.reports[1].error)
+            self.assertIsInstance(fleet.reports[2].error,
+                                  HokuyoStatusException)
+            self.assertIn('info', fleet.reports[2].timings)
+            self.assertNotIn('activate', fleet.reports[2].timings)
+            # other sensors are started and usable
+            for i in (0, 3):
+                self.assertTrue(fleet.reports[i].ok)
+                self.assertEqual(lasers[i].laser_state()[0], 3)
+
+    def test_raise_errors(self):
+        self.sensors[2].statuses['BM'] = '0L'
+        addrs = [sensor.addr for sensor in self.sensors]
+        self.assertRaises(HokuyoException, start_fleet, addrs, tsync=False,
+                          convert_time=False, raise_errors=True)
+        self.assertEqual(start_fleet([]).reports, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
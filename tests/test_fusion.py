@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX
+from hokuyolx.fusion import ScanFusion, iter_fused
+from fakesensor import FakeSensor, saturated_scan
+
+
+class ScanFusionTest(unittest.TestCase):
+
+    def test_2char_saturation(self):
+        fusion = ScanFusion([(0, 0, 0)])
+        fusion.add(0, saturated_scan())
+        fused = fusion.fuse()
+        self.assertEqual(len(fused), 540)
+        self.assertLess(fused.beams.max(), 540)
+
+
+class IterFusedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensors = [FakeSensor(), FakeSensor()]
+        self.lasers = [HokuyoLX(addr=sensor.addr, tsync=False,
+                                convert_time=False)
+                       for sensor in self.sensors]
+
+    def tearDown(self):
+        for laser in self.lasers:
+            laser.close()
+        for sensor in self.sensors:
+            sensor.close()
+
+    def test_stop(self):
+        fusion = ScanFusion([(200, 0, 0), (-200, 0, np.pi)], tolerance=1000)
+        gen = iter_fused([laser.iter_dist() for laser in self.lasers],
+                         fusion, on_stop=[laser.standby
+                                          for laser in self.lasers])
+        for i, fused in enumerate(gen):
+            self.assertGreater(len(fused.points), 0)
+            if i == 4:
+                break
+        gen.close()
+        # readers have finished and switched sensors to standby
+        for laser, sensor in zip(self.lasers, self.sensors):
+            self.assertEqual(sensor.state, '000')
+            self.assertEqual(sensor.requests[-1], 'QT')
+            self.assertEqual(laser.laser_state()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
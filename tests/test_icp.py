@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.icp import ICPMatcher
+from fakesensor import saturated_scan
+
+
+class ICPMatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.angles = np.linspace(-np.pi/2, np.pi/2, 181)
+        # corridor with walls at y = +-1000 and end wall at x = 3000
+        with np.errstate(divide='ignore'):
+            side = 1000/np.abs(np.sin(self.angles))
+            end = 3000/np.abs(np.cos(self.angles))
+        self.dist = np.minimum(side, end)
+        # the same corridor measured 100 mm further along it
+        self.moved = np.minimum(side, end - 100/np.abs(np.cos(self.angles)))
+
+    def test_invalid_max_iter(self):
+        self.assertRaises(HokuyoException, ICPMatcher, max_iter=0)
+
+    def test_single_iteration(self):
+        matcher = ICPMatcher(max_iter=1)
+        matcher.set_reference(self.dist, self.angles)
+        result = matcher.match(self.dist, angles=self.angles)
+        self.assertEqual(result.iterations, 1)
+        self.assertTrue(np.allclose(result.pose, 0, atol=1e-6))
+
+    def test_update_converged(self):
+        matcher = ICPMatcher()
+        matcher.update(self.dist, angles=self.angles)
+        result = matcher.update(self.moved, angles=self.angles)
+        self.assertTrue(result.converged)
+        self.assertTrue(np.allclose(matcher.pose, (100, 0, 0), atol=1))
+
+    def test_update_not_converged(self):
+        matcher = ICPMatcher(max_iter=1)
+        matcher.update(self.dist, angles=self.angles)
+        result = matcher.update(self.moved, angles=self.angles)
+        self.assertFalse(result.converged)
+        self.assertTrue(np.array_equal(matcher.pose, np.zeros(3)))
+        matcher = ICPMatcher(max_iter=1, require_converged=False)
+        matcher.update(self.dist, angles=self.angles)
+        matcher.update(self.moved, angles=self.angles)
+        self.assertGreater(matcher.pose[0], 0)
+
+    def test_2char_saturation(self):
+        points, _ = ICPMatcher()._points(saturated_scan())
+        self.assertFalse(np.isnan(points[:540]).any())
+        self.assertTrue(np.isnan(points[540:]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
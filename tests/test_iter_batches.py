@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX
+from hokuyolx.exceptions import HokuyoException
+from fakesensor import FakeSensor
+
+
+class BatchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def connect(self, multiplex=False):
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False, multiplex=multiplex,
+                              timeout=2)
+
+    def check_stall(self, multiplex):
+        self.connect(multiplex)
+        timer = threading.Timer(0.15, self.sensor.stall)
+        timer.start()
+        t0 = time.time()
+        gen = self.laser.iter_dist_batches(100, timeout=0.5)
+        batch, timestamps, _ = next(gen)
+        # incomplete batch is flushed without waiting for the next scan
+        self.assertLess(time.time() - t0, 1.5)
+        self.assertGreater(len(batch), 0)
+        self.assertEqual(len(batch), len(timestamps))
+        self.assertEqual(batch.shape[1], 1081)
+        self.assertRaises(HokuyoException, next, gen)
+
+    def test_stall_direct(self):
+        self.check_stall(False)
+
+    def test_stall_multiplex(self):
+        self.check_stall(True)
+
+    def test_flush_before_error(self):
+        self.connect()
+        self.laser.timeout = 0.5
+        self.laser._sock.settimeout(0.5)
+        timer = threading.Timer(0.15, self.sensor.stall)
+        timer.start()
+        gen = self.laser.iter_dist_batches(100)
+        batch, _, _ = next(gen)
+        self.assertGreater(len(batch), 0)
+        self.assertRaises(HokuyoException, next, gen)
+
+    def test_filtered(self):
+        self.connect()
+        gen = self.laser.iter_filtered_dist_batches(3, 3, dmax=4000)
+        batch, _, _ = next(gen)
+        self.assertEqual(batch.dtype, np.float64)
+        self.assertEqual(batch.shape, (3, 1081))
+        dist = np.array([FakeSensor.dist(i) for i in range(1081)], float)
+        expected = np.where(dist <= 4000, dist, np.nan)
+        for row in batch:
+            self.assertTrue(np.array_equal(row, expected, equal_nan=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.occupancy import OccupancyGrid
+from fakesensor import saturated_scan
+
+
+class OccupancyGridTest(unittest.TestCase):
+
+    def occupied(self, grid, scan, beam, dist):
+        angle = scan.angles[beam]
+        row, col = grid.world2cell(dist*np.cos(angle), dist*np.sin(angle))
+        return grid.log_odds()[row, col] > 0
+
+    def test_2char_saturation(self):
+        grid = OccupancyGrid((200, 200), resolution=50.)
+        scan = saturated_scan()
+        grid.update(scan)
+        self.assertTrue(self.occupied(grid, scan, 100, 2000))
+        # saturated 2-char values are not treated as returns
+        self.assertFalse(self.occupied(grid, scan, 800, 4095))
+
+    def test_3char(self):
+        grid = OccupancyGrid((200, 200), resolution=50.)
+        scan = saturated_scan(cmd='MD')
+        grid.update(scan)
+        self.assertTrue(self.occupied(grid, scan, 800, 4095))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import RangePyramid, SectorMinimum
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import Scan, ScanConfig
+
+
+def make_config(start=0, end=1080, cmd='MD'):
+    return ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, start, end, 0,
+                          0, cmd)
+
+
+def random_dist(rng, beams):
+    dist = rng.randint(20, 10000, beams).astype(np.uint32)
+    invalid = rng.rand(beams) < 0.2
+    dist[invalid] = rng.choice([0, 1, 19, 30001, 65533], invalid.sum())
+    return dist
+
+
+def brute_min(dist, first, last, dmin=20, dmax=30000):
+    first, last = max(first, 0), min(last, len(dist) - 1)
+    if last < first:
+        return np.inf
+    values = dist[first:last + 1].astype(np.float64)
+    values = values[(values >= dmin) & (values <= dmax)]
+    return values.min() if len(values) else np.inf
+
+
+class RangePyramidTest(unittest.TestCase):
+
+    def test_min_range(self):
+        rng = np.random.RandomState(0)
+        for start, end in ((0, 1080), (100, 100), (200, 204), (0, 63),
+                           (0, 64)):
+            config = make_config(start, end)
+            dist = random_dist(rng, config.beams)
+            pyramid = RangePyramid(dist, config)
+            n = config.beams
+            first = rng.randint(-3, n + 3, 500)
+            last = rng.randint(-3, n + 3, 500)
+            expected = [brute_min(dist, f, l) for f, l in zip(first, last)]
+            self.assertTrue(np.array_equal(pyramid.min_range(first, last),
+                                           expected))
+            for f in range(min(n, 70)):
+                for l in range(f - 1, min(n, 70)):
+                    self.assertEqual(pyramid.min_range(f, l),
+                                     brute_min(dist, f, l))
+
+    def test_limits(self):
+        rng = np.random.RandomState(1)
+        config = make_config()
+        dist = random_dist(rng, config.beams)
+        pyramid = Scan(dist, 0, config).pyramid
+        self.assertIsInstance(pyramid.min_range(0, 1080), float)
+        limited = RangePyramid(dist, config, dmin=500, dmax=5000)
+        for f, l in rng.randint(0, 1081, (200, 2)):
+            self.assertEqual(limited.min_range(f, l),
+                             brute_min(dist, f, l, 500, 5000))
+        # 2-char saturated values are never the closest return
+        config = make_config(cmd='MS')
+        dist = np.full(config.beams, 4095, np.uint32)
+        self.assertEqual(RangePyramid(dist, config).min_range(0, 1080),
+                         np.inf)
+        self.assertRaises(HokuyoException, RangePyramid, dist)
+
+    def test_query(self):
+        rng = np.random.RandomState(2)
+        config = make_config()
+        dist = random_dist(rng, config.beams)
+        pyramid = RangePyramid(dist, config)
+        amin = rng.uniform(-2.5, 2.5, 300)
+        amax = amin + rng.uniform(-0.1, 1., 300)
+        res = pyramid.query(amin, amax)
+        angles = config.angles
+        valid = (dist >= 20) & (dist <= 30000)
+        for a0, a1, value in zip(amin, amax, res):
+            mask = valid & (angles >= a0) & (angles <= a1)
+            expected = dist[mask].min() if mask.any() else np.inf
+            self.assertEqual(value, expected)
+
+
+class SectorMinimumTest(unittest.TestCase):
+
+    def test_brute_force(self):
+        rng = np.random.RandomState(3)
+        config = make_config()
+        edges = np.concatenate(([-3.], np.linspace(-2., 2., 17),
+                                [2.001, 3.]))
+        reducer = SectorMinimum(edges)
+        angles = config.angles
+        for _ in range(5):
+            dist = random_dist(rng, config.beams)
+            res = reducer(Scan(dist, 0, config))
+            valid = (dist >= 20) & (dist <= 30000)
+            expected = []
+            for a0, a1 in zip(edges[:-1], edges[1:]):
+                mask = valid & (angles >= a0) & (angles < a1)
+                expected.append(dist[mask].min() if mask.any() else np.inf)
+            self.assertTrue(np.array_equal(res, expected))
+        self.assertRaises(HokuyoException, SectorMinimum, [1., 0.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx import detect_reflectors
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import Scan, ScanConfig
+
+CONFIG = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080, 0, 0,
+                        'ME')
+
+
+def cylinder_scan(centres, radius, wall=6000., intens=6000, background=300):
+    '''Scan with intensities of cylinders standing in front of the wall'''
+    cos, sin = CONFIG.cos, CONFIG.sin
+    dist = np.full(CONFIG.beams, wall)
+    values = np.full(CONFIG.beams, background)
+    for cx, cy in centres:
+        # nearest intersection of the beam with the circle
+        b = cos*cx + sin*cy
+        disc = b*b - (cx*cx + cy*cy - radius*radius)
+        hit = (disc >= 0) & (b > 0)
+        t = b - np.sqrt(np.where(hit, disc, 0))
+        closer = hit & (t < dist)
+        dist[closer] = t[closer]
+        values[closer] = intens
+    data = np.column_stack((np.round(dist), values)).astype(np.uint32)
+    return Scan(data, 0, CONFIG)
+
+
+class DetectReflectorsTest(unittest.TestCase):
+
+    def test_cylinder(self):
+        centres = [(2000., 500.), (-800., 1500.), (3000., -2000.)]
+        scan = cylinder_scan(centres, 40.)
+        marks = detect_reflectors(scan, threshold=3000, radius=40.)
+        self.assertEqual(len(marks), 3)
+        # reflectors are ordered by beam index
+        order = np.argsort(np.arctan2([c[1] for c in centres],
+                                      [c[0] for c in centres]))
+        expected = np.array(centres)[order]
+        self.assertLess(np.hypot(*(marks.points - expected).T).max(), 5.)
+        self.assertTrue(np.allclose(marks.bearings,
+                                    np.arctan2(expected[:, 1],
+                                               expected[:, 0]), atol=2e-3))
+        self.assertTrue((marks.counts >= 2).all())
+        self.assertTrue(np.array_equal(marks.counts,
+                                       marks.last - marks.first + 1))
+        self.assertTrue((marks.width < 80.).all())
+        self.assertEqual(marks.cov.shape, (3, 2, 2))
+        self.assertTrue(np.allclose(marks.cov, marks.cov.transpose(0, 2, 1)))
+        # without the radius centroid of the visible arc is closer
+        flat = detect_reflectors(scan, threshold=3000)
+        self.assertTrue((flat.ranges < marks.ranges - 20).all())
+
+    def test_raw_array(self):
+        scan = cylinder_scan([(2000., 500.)], 40.)
+        marks = detect_reflectors(scan.data, CONFIG.angles, threshold=3000,
+                                  radius=40.)
+        self.assertEqual(len(marks), 1)
+        self.assertLess(np.hypot(*(marks.points[0] - (2000., 500.))), 3.)
+
+    def test_filters(self):
+        scan = cylinder_scan([(2000., 500.), (1000., -200.)], 40.)
+        # normalized intensity of the far reflector is higher
+        marks = detect_reflectors(scan, threshold=6000*1.5)
+        self.assertEqual(len(marks), 1)
+        self.assertGreater(marks.ranges[0], 1500)
+        self.assertEqual(len(detect_reflectors(scan, threshold=3000,
+                                               max_width=30.)), 0)
+        self.assertEqual(len(detect_reflectors(scan, threshold=3000,
+                                               min_points=100)), 0)
+        self.assertEqual(len(detect_reflectors(scan, threshold=3000,
+                                               dmax=1500)), 1)
+        self.assertRaises(HokuyoException, detect_reflectors,
+                          scan.data[:, 0], CONFIG.angles)
+        self.assertRaises(HokuyoException, detect_reflectors, scan.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
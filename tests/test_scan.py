@@ -0,0 +1,101 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from hokuyolx import HokuyoLX
+from hokuyolx.scan import Scan, ScanConfig
+from fakesensor import FakeSensor
+
+
+def make_config(scan_freq=40, grouping=0):
+    return ScanConfig.get(1440, 0, 1080, 540, 20, 30000, scan_freq, 0, 1080,
+                          grouping, 0, 'MD')
+
+
+class ScanConfigCacheTest(unittest.TestCase):
+
+    def test_shared_instances(self):
+        self.assertIs(make_config(), make_config())
+
+    def test_bounded_cache(self):
+        first = make_config(grouping=1)
+        for freq in range(ScanConfig.cache_size):
+            make_config(scan_freq=1000 + freq)
+            # recently used config is kept
+            self.assertIs(make_config(), make_config())
+        self.assertLessEqual(len(ScanConfig._cache), ScanConfig.cache_size)
+        self.assertIsNot(make_config(grouping=1), first)
+        self.assertIs(make_config().angles, make_config().angles)
+
+
+class ScanConfigTablesTest(unittest.TestCase):
+
+    def test_angles(self):
+        config = make_config()
+        self.assertEqual(config.beams, 1081)
+        self.assertAlmostEqual(config.angles[0], -3*np.pi/4)
+        self.assertAlmostEqual(config.angles[540], 0)
+        self.assertAlmostEqual(config.time_offsets[1], 1000./(40*1440))
+
+    def test_grouping(self):
+        config = make_config(grouping=4)
+        self.assertEqual(config.beams, 271)
+        step = 2*np.pi/1440
+        # beams are placed in the middle of the grouped steps
+        self.assertAlmostEqual(config.angles[0], -3*np.pi/4 + 1.5*step)
+        self.assertAlmostEqual(config.angles[-1], 3*np.pi/4)
+        self.assertAlmostEqual(config.time_offsets[0],
+                               1.5*config.step_time)
+
+    def test_amin(self):
+        # steps are counted from the sensor origin, not from `amin`
+        config = ScanConfig.get(1024, 44, 725, 384, 20, 5600, 10, 100, 200,
+                                3, 0, 'MD')
+        self.assertEqual(config.beams, 34)
+        self.assertAlmostEqual(config.angles[0],
+                               2*np.pi*(101 - 384)/1024.)
+        self.assertAlmostEqual(config.time_offsets[0],
+                               (101 - 44)*config.step_time)
+        self.assertRaises(ValueError, config.angles.__setitem__, 0, 1)
+
+
+class GetAnglesTest(unittest.TestCase):
+
+    def test_copy(self):
+        sensor = FakeSensor()
+        laser = HokuyoLX(addr=sensor.addr, tsync=False, convert_time=False)
+        try:
+            angles = laser.get_angles()
+            angles[0] = 10.
+            self.assertNotEqual(laser.get_angles()[0], 10.)
+            config = laser.get_config(grouping=2)
+            self.assertTrue(np.array_equal(laser.get_angles(grouping=2),
+                                           config.angles))
+        finally:
+            laser.close()
+            sensor.close()
+
+
+class ScanPickleTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080,
+                                0, 0, 'ME')
+        data = np.array([[1000 + i, i] for i in range(1081)], dtype=np.uint32)
+        scan = Scan(data, 123, config, pending=2, seq=7, host_time=10.5,
+                    decode_time=11.5, skipped=1)
+        scan.points  # cached arrays are not part of the state
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(scan, protocol))
+            self.assertIs(copy.config, config)
+            self.assertTrue(np.array_equal(copy.data, data))
+            self.assertEqual((copy.timestamp, copy.pending, copy.seq),
+                             (123, 2, 7))
+            self.assertEqual((copy.host_time, copy.decode_time,
+                              copy.skipped), (10.5, 11.5, 1))
+            self.assertTrue(np.array_equal(copy.points, scan.points))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+import unittest
+
+from hokuyolx.segmentation import segment
+from fakesensor import saturated_scan
+
+
+class SegmentTest(unittest.TestCase):
+
+    def test_2char_saturation(self):
+        segments = segment(saturated_scan())
+        self.assertGreater(len(segments), 0)
+        self.assertLess(segments.beams.max(), 540)
+
+    def test_3char(self):
+        segments = segment(saturated_scan(cmd='MD'))
+        self.assertEqual(segments.beams.max(), 1080)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from hokuyolx import HokuyoLX
+from hokuyolx.exceptions import HokuyoException, HokuyoStatusException
+from fakesensor import FakeSensor
+
+
+class SettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+        self.laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                              convert_time=False)
+
+    def tearDown(self):
+        self.laser.close()
+        self.sensor.close()
+
+    def test_motor_speed(self):
+        period = self.laser.get_config().scan_period
+        self.assertEqual(self.laser.set_motor_speed(2), 38)
+        self.assertEqual(self.sensor.rpm, 2280)
+        self.assertEqual(self.laser.scan_freq, 38)
+        config = self.laser.get_config()
+        self.assertAlmostEqual(config.scan_period, 1000./38)
+        self.assertGreater(config.scan_period, period)
+        self.assertAlmostEqual(config.time_offsets[-1],
+                               1080*config.step_time)
+        self.assertEqual(self.laser.set_motor_speed(99), 40)
+        self.assertEqual(self.laser.get_config().scan_period, period)
+
+    def test_motor_speed_standby(self):
+        self.laser.activate()
+        self.assertEqual(self.laser.laser_state()[0], 3)
+        self.laser.set_motor_speed(1)
+        self.assertEqual(self.laser.laser_state()[0], 0)
+        requests = self.sensor.requests
+        requests = requests[requests.index('BM'):]
+        self.assertLess(requests.index('QT'), requests.index('CR01'))
+
+    def test_motor_speed_statuses(self):
+        self.sensor.statuses['CR'] = '03'
+        self.assertEqual(self.laser.set_motor_speed(2), 40)
+        self.sensor.statuses['CR'] = '02'
+        self.assertRaises(HokuyoException, self.laser.set_motor_speed, 2)
+        self.sensor.statuses['CR'] = '0X'
+        self.assertRaises(HokuyoStatusException, self.laser.set_motor_speed,
+                          2)
+        self.assertRaises(HokuyoException, self.laser.set_motor_speed, 11)
+
+    def test_motor_speed_verify(self):
+        self.sensor.apply_settings = False
+        self.assertRaises(HokuyoException, self.laser.set_motor_speed, 2)
+        self.assertEqual(self.laser.set_motor_speed(2, verify=False), 40)
+
+    def test_sensitivity(self):
+        self.assertFalse(self.laser.high_sensitivity())
+        self.laser.activate()
+        self.laser.set_sensitivity(True)
+        self.assertEqual(self.sensor.sensitivity, 1)
+        self.assertTrue(self.laser.high_sensitivity())
+        self.assertEqual(self.laser.laser_state()[0], 0)
+        self.laser.set_sensitivity(False)
+        self.assertFalse(self.laser.high_sensitivity())
+
+    def test_sensitivity_statuses(self):
+        self.sensor.statuses['HS'] = '02'
+        self.laser.set_sensitivity(False)
+        self.assertRaises(HokuyoException, self.laser.set_sensitivity, True)
+        self.sensor.statuses['HS'] = '01'
+        self.assertRaises(HokuyoException, self.laser.set_sensitivity, True,
+                          verify=False)
+        self.sensor.statuses['HS'] = '0X'
+        self.assertRaises(HokuyoStatusException, self.laser.set_sensitivity,
+                          True)
+
+    def test_sensitivity_verify(self):
+        self.sensor.apply_settings = False
+        self.assertRaises(HokuyoException, self.laser.set_sensitivity, True)
+        self.laser.set_sensitivity(True, verify=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import Scan, ScanConfig
+from hokuyolx.stats import BeamStatistics
+
+
+def make_config(dmin=20, dmax=30000):
+    return ScanConfig.get(1440, 0, 1080, 540, dmin, dmax, 40, 0, 1080, 0, 0,
+                          'MD')
+
+
+def make_scan(dist, config):
+    return Scan(np.asarray(dist, np.uint32), 0, config)
+
+
+class BeamStatisticsTest(unittest.TestCase):
+
+    def test_limits_from_config(self):
+        stats = BeamStatistics()
+        config = make_config(dmin=50, dmax=4000)
+        stats.update(make_scan([10, 45, 1000, 5000], config))
+        self.assertEqual((stats.dmin, stats.dmax), (50, 4000))
+        self.assertEqual(stats.errors.shape, (4, 50))
+        self.assertEqual(stats.errors[1, 45], 1)
+        self.assertEqual(list(stats.overflows), [0, 0, 0, 1])
+        self.assertEqual(list(stats.count), [0, 0, 1, 0])
+
+    def test_limits_mismatch(self):
+        stats = BeamStatistics()
+        stats.update(make_scan([1000]*3, make_config()))
+        self.assertRaises(HokuyoException, stats.update,
+                          make_scan([1000]*3, make_config(dmin=30)))
+
+    def test_explicit_limits(self):
+        stats = BeamStatistics(dmin=10, dmax=2000)
+        stats.update(make_scan([15, 3000], make_config()))
+        self.assertEqual(stats.errors.shape, (2, 10))
+        self.assertEqual(list(stats.count), [1, 0])
+
+    def test_array_requires_limits(self):
+        self.assertRaises(HokuyoException, BeamStatistics().update,
+                          np.array([1000, 2000]))
+
+
+if __name__ == '__main__':
+    unittest.main()
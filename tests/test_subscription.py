@@ -0,0 +1,154 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from hokuyolx import HokuyoLX
+from hokuyolx.subscription import Subscription
+from fakesensor import FakeSensor
+
+
+def numbers(count, period=0.002):
+    '''Generator imitating continous measurment'''
+    for i in range(count):
+        time.sleep(period)
+        yield i
+
+
+def scan_summary(scan):
+    '''Callback executed on the process pool'''
+    return scan.seq, scan.config.beams, int(scan.dist[0])
+
+
+class SubscriptionTest(unittest.TestCase):
+
+    def test_ordered_delivery(self):
+        def process(i):
+            time.sleep(0.02 if i % 3 == 0 else 0.001)
+            return i*i
+        results = []
+        pool = ThreadPoolExecutor(4)
+        try:
+            sub = Subscription(numbers(30), process, pool, ordered=True,
+                               max_in_flight=4, skip=False,
+                               on_result=lambda i, res: results.append(res))
+            sub.start()
+            self.assertTrue(sub.join(5))
+        finally:
+            pool.shutdown()
+        self.assertEqual(results, [i*i for i in range(30)])
+        self.assertEqual(sub.submitted, 30)
+        self.assertEqual(sub.completed, 30)
+
+    def test_skip_when_busy(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def process(i):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.02)
+            with lock:
+                state['active'] -= 1
+        sub = Subscription(numbers(40), process, max_in_flight=1).start()
+        self.assertTrue(sub.join(5))
+        sub.stop()
+        self.assertGreater(sub.skipped, 0)
+        self.assertEqual(sub.submitted + sub.skipped, 40)
+        self.assertEqual(sub.completed, sub.submitted)
+        self.assertEqual(state['peak'], 1)
+
+    def test_queue_when_busy(self):
+        results = []
+        sub = Subscription(numbers(20), lambda i: time.sleep(0.005) or i,
+                           max_in_flight=1, skip=False,
+                           on_result=lambda i, res: results.append(res))
+        sub.start()
+        self.assertTrue(sub.join(5))
+        sub.stop()
+        self.assertEqual(sub.skipped, 0)
+        self.assertEqual(results, list(range(20)))
+
+    def test_errors(self):
+        def process(i):
+            raise ValueError(i)
+        errors = []
+        sub = Subscription(numbers(5), process,
+                           on_error=lambda i, err: errors.append(i)).start()
+        self.assertTrue(sub.join(5))
+        sub.stop()
+        self.assertEqual(errors, list(range(5)))
+        self.assertEqual(sub.failed, 5)
+
+    def test_stop(self):
+        stopped = []
+        seen = []
+        sub = Subscription(numbers(10**6, 0.01), seen.append,
+                           on_stop=lambda: stopped.append(True)).start()
+        time.sleep(0.1)
+        self.assertTrue(sub.stop(timeout=5))
+        self.assertFalse(sub.running)
+        self.assertEqual(stopped, [True])
+        count = len(seen)
+        time.sleep(0.05)
+        self.assertEqual(len(seen), count)
+        self.assertEqual(sub.completed, sub.submitted)
+
+
+class SensorSubscriptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = FakeSensor()
+
+    def tearDown(self):
+        self.sensor.close()
+
+    def check_stop(self, multiplex):
+        laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                         convert_time=False, multiplex=multiplex)
+        try:
+            scans = []
+            sub = laser.subscribe(scans.append)
+            time.sleep(0.3)
+            self.assertTrue(sub.stop(timeout=5))
+            self.assertFalse(sub.running)
+            self.assertIsNone(sub.error)
+            self.assertGreater(len(scans), 0)
+            self.assertEqual(scans[0].dist[0], FakeSensor.dist(0))
+            # sensor is usable right after stop
+            self.assertEqual(laser.laser_state()[0], 0)
+            _, dist = laser.get_dist()
+            self.assertEqual(len(dist), 1081)
+        finally:
+            laser.close()
+
+    def test_stop_direct(self):
+        self.check_stop(False)
+
+    def test_stop_multiplex(self):
+        self.check_stop(True)
+
+    def test_process_pool(self):
+        laser = HokuyoLX(addr=self.sensor.addr, tsync=False,
+                         convert_time=False)
+        pool = ProcessPoolExecutor(2)
+        try:
+            results = []
+            sub = laser.subscribe(scan_summary, pool, ordered=True,
+                                  on_result=lambda scan, res:
+                                  results.append((scan.seq, res)))
+            time.sleep(0.5)
+            self.assertTrue(sub.stop(timeout=5))
+            self.assertIsNone(sub.error)
+            self.assertEqual(sub.failed, 0)
+            self.assertGreater(len(results), 0)
+            for seq, res in results:
+                self.assertEqual(res, (seq, 1081, FakeSensor.dist(0)))
+        finally:
+            pool.shutdown()
+            laser.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
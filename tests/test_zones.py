@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+
+from hokuyolx.exceptions import HokuyoException
+from hokuyolx.scan import ScanConfig
+from hokuyolx.zones import Zone, ZoneEngine
+from fakesensor import saturated_scan
+
+RECT = (500., -400., 2500., 600.) #: Rectangle `(x0, y0, x1, y1)`
+AROUND = (-300., -200., 700., 300.) #: Rectangle around the sensor
+
+
+def rect_zone(rect, name=None):
+    x0, y0, x1, y1 = rect
+    return Zone.polygon([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], name)
+
+
+def rect_inside(points, rect):
+    '''Brute force membership and distance to the rectangle boundary'''
+    x0, y0, x1, y1 = rect
+    x, y = points[:, 0], points[:, 1]
+    inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+    edge = np.minimum(np.minimum(np.abs(x - x0), np.abs(x - x1)),
+                      np.minimum(np.abs(y - y0), np.abs(y - y1)))
+    return inside, edge
+
+
+class ZoneEngineTest(unittest.TestCase):
+
+    def test_2char_saturation(self):
+        engine = ZoneEngine([Zone.sector(-np.pi, np.pi, 5000)])
+        inside = engine.inside(saturated_scan())
+        self.assertEqual(list(np.flatnonzero(inside[0])), list(range(540)))
+
+    def test_3char(self):
+        engine = ZoneEngine([Zone.sector(-np.pi, np.pi, 5000)])
+        self.assertTrue(engine.inside(saturated_scan(cmd='MD')).all())
+
+    def test_brute_force(self):
+        config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080,
+                                0, 0, 'MD')
+        engine = ZoneEngine([
+            rect_zone(RECT, 'rect'),
+            rect_zone(AROUND, 'around'),
+            Zone.sector(-np.pi/4, np.pi/2, 2000, rmin=300, name='sector'),
+            # behind the sensor, no beam crosses it
+            rect_zone((-3000, -100, -2000, 100), 'behind'),
+            # closer than dmin
+            Zone.sector(-np.pi, np.pi, 10, name='close'),
+        ])
+        lo, width = engine.compile(config)
+        self.assertIs(engine.compile(config)[0], lo)
+        self.assertEqual(lo.dtype, np.uint32)
+        self.assertEqual(lo.shape, (5, 1081))
+        self.assertTrue((width[3:] == 0).all())
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            dist = rng.randint(0, 4000, 1081).astype(np.uint32)
+            # error codes, short and out of range distances
+            dist[rng.randint(0, 1081, 100)] = rng.choice(
+                [0, 1, 5, 19, 20, 30000, 30001, 2**18 - 1], 100)
+            inside = engine.inside(dist, config)
+            self.assertEqual(inside.dtype, bool)
+            points = dist[:, None]*np.column_stack((config.cos, config.sin))
+            valid = (dist >= 20) & (dist <= 30000)
+            for i, rect in ((0, RECT), (1, AROUND)):
+                expected, edge = rect_inside(points, rect)
+                expected &= valid
+                exact = edge > 1.5
+                self.assertTrue(np.array_equal(inside[i][exact],
+                                               expected[exact]))
+            angle_ok = (config.angles >= -np.pi/4) & \
+                (config.angles <= np.pi/2)
+            expected = angle_ok & (dist >= 300) & (dist <= 2000)
+            self.assertTrue(np.array_equal(inside[2], expected))
+            self.assertFalse(inside[3:].any())
+        # intensity scans use the first column
+        data = np.column_stack((dist, dist))
+        self.assertTrue(np.array_equal(engine.inside(data, config), inside))
+
+    def test_empty_zones(self):
+        config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080,
+                                0, 0, 'MD')
+        engine = ZoneEngine([Zone.sector(0, np.pi/4, 10),
+                             Zone.sector(0, np.pi/4, 20000, rmin=40000)])
+        lo, width = engine.compile(config)
+        self.assertTrue((lo == np.iinfo(np.uint32).max).all())
+        self.assertTrue((width == 0).all())
+        for value in (0, 1, 10, 20, 40000, 2**18 - 1, 2**32 - 2):
+            dist = np.full(1081, value, np.uint32)
+            self.assertFalse(engine.inside(dist, config).any())
+        self.assertFalse(engine.update(dist, config).any())
+        self.assertEqual(engine.active(), [])
+
+    def test_debounce(self):
+        config = ScanConfig.get(1440, 0, 1080, 540, 20, 30000, 40, 0, 1080,
+                                0, 0, 'MD')
+        engine = ZoneEngine([Zone.sector(-np.pi, np.pi, 1000, name='stop')],
+                            debounce=2, release=2, min_beams=3)
+        near = np.full(1081, 5000, np.uint32)
+        near[:3] = 500
+        far = np.full(1081, 5000, np.uint32)
+        states = [engine.update(dist, config)[0]
+                  for dist in (near, far, near, near, far, near, far, far)]
+        self.assertEqual(states, [False, False, False, True, True, True,
+                                  True, False])
+        self.assertEqual(engine.active(), [])
+        self.assertRaises(HokuyoException, engine.inside, near)
+        self.assertRaises(HokuyoException, engine.inside, near[:10], config)
+
+
+if __name__ == '__main__':
+    unittest.main()